@@ -1,133 +1,167 @@
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, Response, current_app, g, request, jsonify, stream_with_context
 from flask_cors import CORS
-from flask_socketio import SocketIO
+from flask_socketio import SocketIO, join_room, leave_room
 from dotenv import load_dotenv
 import os
 import json
+import atexit
+import hmac
 import threading
-import paho.mqtt.client as mqtt
-import tensorflow as tf
-import numpy as np
-from config.database import DatabaseConfig
-from models.loan import Loan
-from hedera import (
-    AccountId,
-    PrivateKey,
-    Client,
-    ContractExecuteTransaction,
-    ContractFunctionParams,
-)
+import time
+from models.loan import Loan, LIST_FIELDS, REQUIRED_FIELDS
+from models.milestone import DEFAULT_METRIC, Milestone
+from models.portfolio import Portfolio
+from runtime import BackendRuntime
+from services.scoring import build_reading_sequence
+from services.rescoring import score_loan_ids
+from services.loan_import import IMPORT_FORMATS, LoanImporter, detect_format, text_stream
+from services.realtime import loan_room, portfolio_room
+from services.portfolio import summarize
+from services.metrics import HistogramVec, stages
+from services.prometheus import CONTENT_TYPE as PROMETHEUS_CONTENT_TYPE, Registry
+from services.profiler import SamplingProfiler
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Flask app
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
-CORS(app)
-socketio = SocketIO(app, cors_allowed_origins="*")
+# Bound to the app in create_app(); a Redis message queue lets every backend
+# worker emit to every connected client
+socketio = SocketIO()
+api = Blueprint('api', __name__)
 
-# Hedera SDK Setup
-network = os.getenv('HEDERA_NETWORK', 'testnet')
-account_id = AccountId.fromString(os.getenv('HEDERA_ACCOUNT_ID'))
-private_key = PrivateKey.fromString(os.getenv('HEDERA_PRIVATE_KEY'))
-ECO_CONTRACT_ID = AccountId.fromString(os.getenv('ECO_CONTRACT_ID'))
+# Upper bound on loans per synchronous batch-score request; use
+# rescore_portfolio.py for the whole book
+BATCH_SCORE_MAX_LOANS = int(os.getenv('BATCH_SCORE_MAX_LOANS', 10000))
 
-client = Client.forName(network)
-client.setOperator(account_id, private_key)
+# Bulk import: rows per COPY chunk and errors returned inline
+IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', 10000))
+IMPORT_MAX_ERRORS = int(os.getenv('IMPORT_MAX_ERRORS', 1000))
 
-# Load ML Model
-model = tf.keras.models.load_model(os.getenv('MODEL_PATH'))
+# Page size bounds for GET /api/loans
+LOANS_PAGE_DEFAULT = 100
+LOANS_PAGE_MAX = 1000
 
-# --- MQTT Setup & Threading ---
 
-def on_message(client_mqtt, userdata, msg):
-    """Handle incoming IoT data updates via MQTT"""
-    try:
-        data = json.loads(msg.payload)
-        loan_id = data.get('loan_id')
-        new_carbon_val = data.get('predicted_carbon_reduction', 0)
-        
-        loan = Loan.get_by_id(loan_id)
-        if loan:
-            # Prepare features for ML re-prediction
-            # Using current loan amount and new carbon data from IoT
-            features = [loan['loan_amount'], new_carbon_val, 
-                        1 if loan['project_type'] == 'solar' else 0]
-            # Reshape for LSTM (1 sample, 12 time steps, N features)
-            seq_data = np.array([features] * 12).reshape(1, 12, len(features))
-            
-            # Re-calculate score
-            eco_score = float(model.predict(seq_data)[0][0] * 100)
-            
-            # Update Database
-            Loan.update_score(loan_id, eco_score, new_carbon_val)
-            
-            # Real-time Blockchain Certification if score crosses threshold
-            tx_id = None
-            if eco_score > 80:
-                try:
-                    borrower_addr = loan.get('borrower_address') or '0x0000000000000000000000000000000000000000'
-                    params = ContractFunctionParams()
-                    params.addUInt256(int(loan_id))
-                    params.addUInt256(int(eco_score))
-                    params.addAddress(borrower_addr)
-                    
-                    tx = ContractExecuteTransaction().setContractId(ECO_CONTRACT_ID).setGas(200000).setFunction("certifyLoan", params)
-                    resp = tx.execute(client)
-                    tx_id = resp.transactionId.toString()
-                    
-                    socketio.emit('loan_certified', {'loan_id': loan_id, 'eco_score': eco_score, 'tx_id': tx_id})
-                except Exception as b_err:
-                    print(f"Blockchain auto-certification failed: {b_err}")
-
-            # Notify frontend of IoT update
-            socketio.emit('iot_update', {
-                'loan_id': loan_id, 
-                'eco_score': eco_score, 
-                'carbon_reduction': new_carbon_val,
-                'tx_id': tx_id
-            })
-            print(f"✅ IoT Update processed for Loan {loan_id}: New Score {eco_score:.2f}")
+def create_app(start=True):
+    """Application factory.
 
-    except Exception as e:
-        print(f"Error in MQTT callback: {e}")
+    Building the app only wires objects together; nothing connects, loads a
+    model or runs DDL. With start=True the runtime's background services are
+    started too (MQTT and Mongo connect from a background thread); otherwise
+    call app.extensions['ecoscore'].start() when the process is ready, e.g.
+    after a prefork server has forked its workers.
+    """
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
+    CORS(app)
+    socketio.init_app(app, cors_allowed_origins="*", message_queue=os.getenv('SOCKETIO_MESSAGE_QUEUE') or None)
+
+    runtime = BackendRuntime(socketio)
+    app.extensions['ecoscore'] = runtime
+
+    # Prometheus metrics: per-route latency, per-stage timings, and every
+    # component's metrics() as gauges
+    registry = Registry()
+    http_request_ms = registry.register(
+        'http_request_duration_ms',
+        HistogramVec([1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000], ('method', 'route', 'status')),
+        'HTTP request latency by route'
+    )
+    registry.register('stage_duration_ms', stages.latency_ms, 'Latency of each processing stage')
+    registry.register('stage_errors', stages.errors, 'Exceptions raised per processing stage')
+    registry.register_collector('', runtime.metrics)
+    app.extensions['ecoscore_metrics'] = registry
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request_latency(response):
+        started = g.pop('request_started', None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            http_request_ms.labels(request.method, route, str(response.status_code)).observe(
+                (time.perf_counter() - started) * 1000
+            )
+        return response
+
+    app.register_blueprint(api)
+    # Opt-in sampling profiler: GET /debug/profile?seconds=10 samples every
+    # thread's stack under live load and returns the hot stacks (admin only)
+    if os.getenv('PROFILER_ENABLED') == '1':
+        app.add_url_rule('/debug/profile', view_func=sample_profile, methods=['GET'])
+
+    if start:
+        runtime.start()
+        atexit.register(runtime.stop)
+    return app
+
+
+def current_runtime():
+    return current_app.extensions['ecoscore']
+
+
+@api.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus scrape endpoint (text exposition format)"""
+    return Response(current_app.extensions['ecoscore_metrics'].render(), content_type=PROMETHEUS_CONTENT_TYPE)
 
-# Initialize MQTT Client
-mqtt_client = mqtt.Client()
-mqtt_client.on_message = on_message
+profile_lock = threading.Lock()
 
-try:
-    mqtt_client.connect(os.getenv('MQTT_BROKER', 'localhost'), int(os.getenv('MQTT_PORT', 1883)))
-    mqtt_client.subscribe('ecoscore/iot/updates')
-    # Start MQTT loop in a background thread to prevent blocking Flask
-    mqtt_thread = threading.Thread(target=mqtt_client.loop_forever, daemon=True)
-    mqtt_thread.start()
-    print("📡 MQTT Thread started and subscribed to ecoscore/iot/updates")
-except Exception as e:
-    print(f"❌ Failed to connect to MQTT Broker: {e}")
+def sample_profile():
+    """Query params: seconds (max 120), interval_ms, idle=1,
+    format=top (JSON, default) or folded (flamegraph.pl / speedscope).
+    Requires the admin token: stacks expose code paths and local state."""
+    if not admin_authorized():
+        return jsonify({'error': 'Unauthorized'}), 401
+    seconds = min(request.args.get('seconds', 10, type=float), 120.0)
+    if not profile_lock.acquire(blocking=False):
+        return jsonify({'error': 'A profile is already running'}), 409
+    try:
+        profiler = SamplingProfiler(
+            interval_ms=request.args.get('interval_ms', float(os.getenv('PROFILER_INTERVAL_MS', 5)), type=float),
+            include_idle=request.args.get('idle') == '1'
+        ).run_for(seconds)
+    finally:
+        profile_lock.release()
+    if request.args.get('format') == 'folded':
+        return Response(profiler.folded(), mimetype='text/plain')
+    return jsonify(profiler.top(request.args.get('limit', 25, type=int))), 200
 
-# --- End MQTT Setup ---
+@api.route('/health/live', methods=['GET'])
+def liveness_check():
+    """Liveness: the process is up and serving requests (no dependency checks)"""
+    return jsonify(current_runtime().liveness()), 200
 
-# Initialize database tables
-print("Initializing database...")
-DatabaseConfig.init_postgres_tables()
+@api.route('/health/ready', methods=['GET'])
+def readiness_check():
+    """Readiness: background services started, schema migrated, MQTT
+    connected and the model loaded (when MODEL_WARMUP=1); 503 otherwise"""
+    ready, checks = current_runtime().readiness()
+    return jsonify({'ready': ready, 'checks': checks}), 200 if ready else 503
 
-@app.route('/health', methods=['GET'])
+@api.route('/health', methods=['GET'])
 def health_check():
+    rt = current_runtime()
+    ready, checks = rt.readiness()
+    model = rt.model_backend
     return jsonify({
         'status': 'healthy',
         'service': 'EcoScore Finance Backend',
-        'mqtt_active': mqtt_thread.is_alive(),
+        'ready': ready,
+        'checks': checks,
+        'mqtt_active': checks['mqtt'],
+        **rt.metrics(),
+        'model': {'backend': model.name, 'loaded': model.loaded, 'version': model.version},
         'version': '1.0.0'
     }), 200
 
-@app.route('/api/loans', methods=['POST'])
+@api.route('/api/loans', methods=['POST'])
 def create_loan():
     try:
         data = request.get_json()
-        required_fields = ['loan_id', 'borrower_name', 'loan_amount', 'project_type', 'description']
-        for field in required_fields:
+        for field in REQUIRED_FIELDS:
             if field not in data:
                 return jsonify({'error': f'Missing required field: {field}'}), 400
         
@@ -138,15 +172,106 @@ def create_loan():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/loans', methods=['GET'])
+@api.route('/api/loans', methods=['GET'])
 def get_all_loans():
+    """List loans newest first, keyset-paginated.
+    
+    Query params: limit, cursor, fields (comma-separated), status,
+    project_type, min_score, max_score, format=ndjson (streams everything)
+    """
+    try:
+        args = request.args
+        fields = None
+        if args.get('fields'):
+            fields = [field.strip() for field in args['fields'].split(',') if field.strip()]
+            unknown = [field for field in fields if field not in LIST_FIELDS]
+            if unknown:
+                return jsonify({'error': f"Unknown fields: {', '.join(unknown)}"}), 400
+        filters = {
+            'status': args.get('status'),
+            'project_type': args.get('project_type'),
+            'min_score': args.get('min_score', type=float),
+            'max_score': args.get('max_score', type=float),
+        }
+        
+        if args.get('format') == 'ndjson':
+            def generate():
+                for loan in Loan.stream_all(fields=fields, **filters):
+                    yield json.dumps(loan) + '\n'
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+        
+        limit = args.get('limit', LOANS_PAGE_DEFAULT, type=int)
+        if limit < 1 or limit > LOANS_PAGE_MAX:
+            return jsonify({'error': f'limit must be between 1 and {LOANS_PAGE_MAX}'}), 400
+        
+        loans, next_cursor = Loan.get_all(limit=limit, cursor=args.get('cursor'), fields=fields, **filters)
+        return jsonify({'loans': loans, 'count': len(loans), 'next_cursor': next_cursor}), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/loans/import', methods=['POST'])
+def import_loans():
+    """Bulk upsert loans from a CSV or NDJSON upload (raw body or multipart 'file').
+    
+    Query params: format=csv|ndjson (otherwise inferred from the file name or
+    content type), score=1 to score the imported loans in the background
+    """
     try:
-        loans = Loan.get_all()
-        return jsonify({'loans': loans, 'count': len(loans)}), 200
+        rt = current_runtime()
+        if request.mimetype == 'multipart/form-data':
+            upload = request.files.get('file')
+            if upload is None:
+                return jsonify({'error': "Missing 'file' upload"}), 400
+            stream, fmt = upload.stream, detect_format(upload.filename, upload.mimetype)
+        else:
+            stream, fmt = request.stream, detect_format(content_type=request.mimetype)
+        fmt = request.args.get('format') or fmt
+        if fmt not in IMPORT_FORMATS:
+            return jsonify({'error': f"format must be one of {', '.join(IMPORT_FORMATS)}"}), 400
+        
+        importer = LoanImporter(chunk_size=IMPORT_CHUNK_SIZE, max_errors=IMPORT_MAX_ERRORS)
+        report = importer.run(text_stream(stream), fmt)
+        
+        report['scoring'] = None
+        if request.args.get('score') == '1' and importer.loan_ids:
+            # 'busy': the import committed, but too many scoring jobs are queued
+            report['scoring'] = 'started' if rt.score_imported_async(importer.loan_ids) else 'busy'
+        return jsonify(report), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/loans/score:batch', methods=['POST'])
+def calculate_scores_batch():
+    """Score many loans with one batched inference and one bulk update"""
+    try:
+        rt = current_runtime()
+        data = request.get_json() or {}
+        loan_ids = data.get('loan_ids')
+        if not isinstance(loan_ids, list) or not loan_ids:
+            return jsonify({'error': 'loan_ids must be a non-empty list'}), 400
+        if len(loan_ids) > BATCH_SCORE_MAX_LOANS:
+            return jsonify({'error': f'At most {BATCH_SCORE_MAX_LOANS} loans per request'}), 400
+        
+        loan_ids = [str(loan_id) for loan_id in loan_ids]
+        if rt.score_writer is not None:
+            # Buffered IoT scores must not overwrite these afterwards
+            rt.score_writer.discard(loan_ids)
+        results = score_loan_ids(rt.predict_scores, loan_ids, rt.reading_window.sequence)
+        rt.certification_queue.enqueue_many((loan_id, eco_score) for loan_id, eco_score, _ in results)
+        scored = {loan_id for loan_id, _, _ in results}
+        return jsonify({
+            'results': [{'loan_id': loan_id, 'eco_score': eco_score} for loan_id, eco_score, _ in results],
+            'count': len(results),
+            'missing': [loan_id for loan_id in loan_ids if loan_id not in scored]
+        }), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/loans/<loan_id>', methods=['GET'])
+@api.route('/api/loans/<loan_id>', methods=['GET'])
 def get_loan(loan_id):
     try:
         loan = Loan.get_by_id(loan_id)
@@ -156,53 +281,127 @@ def get_loan(loan_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/loans/<loan_id>/score', methods=['POST'])
+@api.route('/api/loans/<loan_id>/score', methods=['POST'])
 def calculate_score(loan_id):
     """Manually trigger calculation for a loan"""
     try:
-        loan = Loan.get_by_id(loan_id)
+        rt = current_runtime()
+        with stages.time('api_loan_read'):
+            loan = Loan.get_by_id(loan_id)
         if not loan:
             return jsonify({'error': 'Loan not found'}), 404
         
         # Prepare features for ML
         carbon_val = loan.get('predicted_carbon_reduction') or 0
-        features = [loan['loan_amount'], carbon_val, 1 if loan['project_type'] == 'solar' else 0]
-        seq_data = np.array([features] * 12).reshape(1, 12, len(features))
+        seq_data = build_reading_sequence(loan, rt.reading_window.sequence(loan_id) or [carbon_val])
         
-        eco_score = float(model.predict(seq_data)[0][0] * 100)
+        with stages.time('api_inference'):
+            eco_score = rt.scoring_engine.score(seq_data)
         
-        success = Loan.update_score(loan_id, eco_score, carbon_val)
+        # Callers read the loan back right after, so never leave this buffered
+        with stages.time('api_score_write'):
+            success = rt.save_score(loan_id, eco_score, carbon_val, sync=True)
         if not success:
             return jsonify({'error': 'Failed to update score'}), 500
 
-        certified = False
-        tx_id = None
-        if eco_score > 80:
-            try:
-                borrower_addr = loan.get('borrower_address') or '0x0000000000000000000000000000000000000000'
-                params = ContractFunctionParams()
-                params.addUInt256(int(loan_id))
-                params.addUInt256(int(eco_score))
-                params.addAddress(borrower_addr)
-                
-                tx = ContractExecuteTransaction().setContractId(ECO_CONTRACT_ID).setGas(200000).setFunction("certifyLoan", params)
-                resp = tx.execute(client)
-                tx_id = resp.transactionId.toString()
-                certified = True
-                socketio.emit('loan_certified', {'loan_id': loan_id, 'eco_score': eco_score, 'tx_id': tx_id})
-            except Exception as e:
-                print(f"Blockchain certification failed: {e}")
+        with stages.time('api_certification_enqueue'):
+            certification_queued = rt.certification_queue.enqueue(loan_id, eco_score) > 0
 
         return jsonify({
             'loan_id': loan_id,
             'eco_score': eco_score,
-            'certified': certified,
-            'tx_id': tx_id,
+            'certification_queued': certification_queued,
             'message': 'Score calculated successfully'
         }), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@api.route('/api/loans/<loan_id>/milestones', methods=['GET'])
+def get_milestones(loan_id):
+    try:
+        milestones = Milestone.get_for_loan(loan_id)
+        if milestones is None:
+            return jsonify({'error': 'Database unavailable'}), 503
+        return jsonify({'loan_id': loan_id, 'milestones': milestones}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/loans/<loan_id>/milestones', methods=['POST'])
+def create_milestone(loan_id):
+    """Add a target on a reading field (predicted_carbon_reduction by default);
+    milestone_achieved is emitted when a reading reaches it"""
+    try:
+        data = request.get_json() or {}
+        for field in ('milestone_name', 'target_value'):
+            if data.get(field) is None:
+                return jsonify({'error': f'Missing required field: {field}'}), 400
+        loan = Loan.get_by_id(loan_id)
+        if not loan:
+            return jsonify({'error': 'Loan not found'}), 404
+
+        milestone = Milestone.create(loan_id, data['milestone_name'], float(data['target_value']),
+                                     data.get('metric') or DEFAULT_METRIC)
+        if not milestone:
+            return jsonify({'error': 'Failed to create milestone'}), 500
+        # Index it here at once; other backend processes pick it up on their next refresh
+        rt = current_runtime()
+        if rt.milestones is not None:
+            rt.milestones.add(milestone['id'], loan_id, milestone['metric'], milestone['target_value'],
+                              milestone['milestone_name'], loan['project_type'])
+        return jsonify(milestone), 201
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/portfolio/summary', methods=['GET'])
+def get_portfolio_summary():
+    """Portfolio ESG rollups by project_type and status, read from the
+    materialized rollups (one row per group, whatever the number of loans)"""
+    try:
+        rows = Portfolio.get_rollups()
+        if rows is None:
+            return jsonify({'error': 'Database unavailable'}), 503
+        return jsonify(summarize(rows)), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def admin_authorized():
+    """Bearer ADMIN_TOKEN; admin endpoints are disabled while it is unset"""
+    token = os.getenv('ADMIN_TOKEN')
+    supplied = request.headers.get('Authorization', '')
+    return bool(token) and hmac.compare_digest(supplied.encode(), f'Bearer {token}'.encode())
+
+def resolve_model_path(name):
+    """A file inside MODEL_DIR (default: MODEL_PATH's directory), or None"""
+    model_dir = os.path.realpath(os.getenv('MODEL_DIR') or os.path.dirname(os.getenv('MODEL_PATH') or '.'))
+    path = os.path.realpath(os.path.join(model_dir, name))
+    if os.path.commonpath([model_dir, path]) != model_dir or not os.path.isfile(path):
+        return None
+    return path
+
+@api.route('/api/model/reload', methods=['POST'])
+def reload_model():
+    """Load a new model artifact; cached predictions for the old one are dropped.
+
+    Admin only. `path` names an artifact inside MODEL_DIR; without it the
+    configured artifact is reloaded from disk.
+    """
+    if not admin_authorized():
+        return jsonify({'error': 'Unauthorized'}), 401
+    try:
+        rt = current_runtime()
+        data = request.get_json(silent=True) or {}
+        path = None
+        if data.get('path'):
+            path = resolve_model_path(str(data['path']))
+            if path is None:
+                return jsonify({'error': 'path must name a model file inside MODEL_DIR'}), 400
+        version = rt.model_backend.reload(path)
+        return jsonify({'message': 'Model reloaded', 'version': version}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @socketio.on('connect')
 def handle_connect():
     print('Client connected')
@@ -211,6 +410,29 @@ def handle_connect():
 def handle_disconnect():
     print('Client disconnected')
 
+@socketio.on('subscribe')
+def handle_subscribe(data):
+    """Join a loan room ({'loan_id': ...}) or a portfolio room ({'portfolio': 'solar' | 'all'})"""
+    if not isinstance(data, dict):
+        return
+    if data.get('loan_id'):
+        join_room(loan_room(data['loan_id']))
+    if data.get('portfolio'):
+        join_room(portfolio_room(data['portfolio']))
+
+@socketio.on('unsubscribe')
+def handle_unsubscribe(data):
+    if not isinstance(data, dict):
+        return
+    if data.get('loan_id'):
+        leave_room(loan_room(data['loan_id']))
+    if data.get('portfolio'):
+        leave_room(portfolio_room(data['portfolio']))
+
+# WSGI entry point (`app:app`); BACKEND_AUTOSTART=0 builds it without
+# starting background services
+app = create_app(start=os.getenv('BACKEND_AUTOSTART', '1') == '1')
+
 if __name__ == '__main__':
     port = int(os.getenv('FLASK_PORT', 5000))
     print(f"🚀 EcoScore Finance Backend starting on port {port}...")
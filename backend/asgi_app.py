@@ -0,0 +1,294 @@
+"""Async (ASGI) serving mode for the loan API.
+
+Serves the same /api/loans and /api/loans/<loan_id>/score contract as
+app.py, but handlers never block a worker on I/O: Postgres goes through an
+asyncpg pool, inference is awaited on the scoring engine's batching thread
+and certification is only enqueued (the chain call happens on the
+certification workers); the remaining blocking calls (Redis, MongoDB) run
+in threads. MQTT ingestion stays in app.py, so /score reads the loan's
+reading window from the MongoDB reading store rather than from memory; it
+can trail app.py's window by the store's flush interval.
+
+Run: hypercorn asgi_app:app --bind 0.0.0.0:8000
+"""
+import asyncio
+import json
+import os
+import time
+
+from dotenv import load_dotenv
+from quart import Quart, Response, g, jsonify, request
+
+from config.database import DatabaseConfig
+from models.async_loan import AsyncLoan
+from models.loan import IMPORT_FIELDS, LIST_FIELDS, Loan
+from models.portfolio import Portfolio, portfolio_rollups
+from services.certification import CertificationBatcher, CertificationQueue
+from services.fakes import FakeHederaCertifier
+from services.hedera import HederaCertifier
+from services.inference import create_backend
+from services.loan_cache import loan_caches
+from services.loan_import import validate_record
+from services.metrics import HistogramVec, stages
+from services.portfolio import summarize
+from services.prediction_cache import PredictionCache
+from services.prometheus import CONTENT_TYPE as PROMETHEUS_CONTENT_TYPE, Registry
+from services.realtime import rooms_for_loan
+from services.scoring import ScoringEngine, build_reading_sequence
+from services.timeseries import ReadingStore
+
+load_dotenv()
+
+app = Quart(__name__)
+app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
+
+LOANS_PAGE_DEFAULT = 100
+LOANS_PAGE_MAX = 1000
+
+model_backend = create_backend()
+prediction_cache = None
+if os.getenv('PREDICTION_CACHE_ENABLED', '1') == '1':
+    prediction_cache = PredictionCache(
+        lambda: model_backend.version,
+        redis_client=DatabaseConfig.get_redis_client() if os.getenv('PREDICTION_CACHE_REDIS', '1') == '1' else None,
+        max_size=int(os.getenv('PREDICTION_CACHE_SIZE', 100000)),
+        ttl=int(os.getenv('PREDICTION_CACHE_TTL', 3600)),
+        quantum=float(os.getenv('PREDICTION_CACHE_QUANTUM', 0.01))
+    )
+scoring_engine = ScoringEngine(
+    model_backend.predict,
+    max_batch_size=int(os.getenv('SCORING_MAX_BATCH', 64)),
+    max_wait_ms=float(os.getenv('SCORING_MAX_WAIT_MS', 20)),
+    cache=prediction_cache
+)
+
+# Read-only: app.py's MQTT ingestion writes the readings
+reading_store = None
+if os.getenv('IOT_STORE_ENABLED', '1') == '1':
+    mongo_db = DatabaseConfig.get_mongodb_client()
+    if mongo_db is not None:
+        reading_store = ReadingStore(mongo_db)
+
+# Socket events are published through the Socket.IO message queue and
+# delivered by the app.py workers that hold the client connections
+socket_publisher = None
+if os.getenv('SOCKETIO_MESSAGE_QUEUE'):
+    import socketio
+    socket_publisher = socketio.RedisManager(os.getenv('SOCKETIO_MESSAGE_QUEUE'), write_only=True)
+
+
+def emit_certified(loan_id, eco_score, tx_id):
+    """on_certified hook; runs on a certification worker thread, so the
+    blocking loan lookup (for the portfolio room) is fine here"""
+    if socket_publisher is None:
+        return
+    loan = Loan.get_by_id(loan_id)
+    for room in rooms_for_loan(loan_id, loan['project_type'] if loan else None):
+        socket_publisher.emit('loan_certified', {'loan_id': loan_id, 'eco_score': eco_score, 'tx_id': tx_id}, room=room)
+
+
+certification_queue = CertificationQueue(
+    FakeHederaCertifier() if os.getenv('HEDERA_FAKE') == '1' else HederaCertifier.from_env(),
+    workers=int(os.getenv('CERTIFICATION_WORKERS', 4)),
+    max_attempts=int(os.getenv('CERTIFICATION_MAX_ATTEMPTS', 8)),
+    on_certified=emit_certified,
+    batcher=CertificationBatcher.from_env()
+)
+
+
+@app.before_serving
+async def startup():
+    await DatabaseConfig.get_async_postgres_pool()
+    scoring_engine.start()
+    await asyncio.to_thread(certification_queue.start)
+    portfolio_rollups.start()
+
+
+@app.after_serving
+async def shutdown():
+    scoring_engine.stop()
+    await asyncio.to_thread(certification_queue.stop)
+    await asyncio.to_thread(portfolio_rollups.stop)
+    await DatabaseConfig.close_async_postgres_pool()
+
+
+metrics_registry = Registry()
+http_request_ms = metrics_registry.register(
+    'http_request_duration_ms',
+    HistogramVec([1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000], ('method', 'route', 'status')),
+    'HTTP request latency by route'
+)
+metrics_registry.register('stage_duration_ms', stages.latency_ms, 'Latency of each processing stage')
+metrics_registry.register('stage_errors', stages.errors, 'Exceptions raised per processing stage')
+metrics_registry.register_collector('scoring', scoring_engine.metrics)
+metrics_registry.register_collector('certification', certification_queue.metrics)
+metrics_registry.register_collector('portfolio_rollups', portfolio_rollups.metrics)
+metrics_registry.register_collector('loan_cache', loan_caches.metrics)
+
+
+@app.before_request
+async def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+async def record_request_latency(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        http_request_ms.labels(request.method, route, str(response.status_code)).observe(
+            (time.perf_counter() - started) * 1000
+        )
+    return response
+
+
+@app.route('/metrics', methods=['GET'])
+async def prometheus_metrics():
+    """Prometheus scrape endpoint (text exposition format)"""
+    return Response(metrics_registry.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@app.route('/health/live', methods=['GET'])
+async def liveness_check():
+    """Liveness: the event loop is serving requests (no dependency checks)"""
+    return jsonify({'alive': True}), 200
+
+
+@app.route('/health/ready', methods=['GET'])
+async def readiness_check():
+    """Readiness: schema migrated (python migrate.py) and the scoring engine running"""
+    checks = {
+        'postgres_schema': await asyncio.to_thread(DatabaseConfig.schema_ready),
+        'scoring_engine': scoring_engine.running,
+    }
+    ready = all(checks.values())
+    return jsonify({'ready': ready, 'checks': checks}), 200 if ready else 503
+
+
+@app.route('/health', methods=['GET'])
+async def health_check():
+    return jsonify({
+        'status': 'healthy',
+        'service': 'EcoScore Finance Backend (async)',
+        'scoring': scoring_engine.metrics(),
+        'certification': certification_queue.metrics(),
+        'portfolio_rollups': portfolio_rollups.metrics(),
+        'version': '1.0.0'
+    }), 200
+
+
+@app.route('/api/loans', methods=['POST'])
+async def create_loan():
+    try:
+        data = await request.get_json()
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
+        # asyncpg binds values as-is: normalize types the way bulk import does
+        loan_data = dict(zip(IMPORT_FIELDS, validate_record(data)))
+
+        loan_id = await AsyncLoan.create(loan_data)
+        if loan_id:
+            return jsonify({'message': 'Loan created successfully', 'loan_id': loan_data['loan_id']}), 201
+        return jsonify({'error': 'Failed to create loan'}), 500
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/loans', methods=['GET'])
+async def get_all_loans():
+    try:
+        args = request.args
+        fields = None
+        if args.get('fields'):
+            fields = [field.strip() for field in args['fields'].split(',') if field.strip()]
+            unknown = [field for field in fields if field not in LIST_FIELDS]
+            if unknown:
+                return jsonify({'error': f"Unknown fields: {', '.join(unknown)}"}), 400
+        filters = {
+            'status': args.get('status'),
+            'project_type': args.get('project_type'),
+            'min_score': args.get('min_score', type=float),
+            'max_score': args.get('max_score', type=float),
+        }
+
+        if args.get('format') == 'ndjson':
+            async def generate():
+                async for loan in AsyncLoan.stream_all(fields=fields, **filters):
+                    yield (json.dumps(loan) + '\n').encode()
+            return Response(generate(), mimetype='application/x-ndjson')
+
+        limit = args.get('limit', LOANS_PAGE_DEFAULT, type=int)
+        if limit < 1 or limit > LOANS_PAGE_MAX:
+            return jsonify({'error': f'limit must be between 1 and {LOANS_PAGE_MAX}'}), 400
+
+        loans, next_cursor = await AsyncLoan.get_all(limit=limit, cursor=args.get('cursor'), fields=fields, **filters)
+        return jsonify({'loans': loans, 'count': len(loans), 'next_cursor': next_cursor}), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/loans/<loan_id>', methods=['GET'])
+async def get_loan(loan_id):
+    try:
+        loan = await AsyncLoan.get_by_id(loan_id)
+        if loan:
+            return jsonify(loan), 200
+        return jsonify({'error': 'Loan not found'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/loans/<loan_id>/score', methods=['POST'])
+async def calculate_score(loan_id):
+    """Manually trigger calculation for a loan"""
+    try:
+        loan = await AsyncLoan.get_by_id(loan_id)
+        if not loan:
+            return jsonify({'error': 'Loan not found'}), 404
+
+        carbon_val = loan.get('predicted_carbon_reduction') or 0
+        readings = []
+        if reading_store is not None:
+            try:
+                readings = await asyncio.to_thread(reading_store.sequence, loan_id)
+            except Exception as e:
+                print(f"Reading window lookup failed for {loan_id}: {e}")
+        seq_data = build_reading_sequence(loan, readings or [carbon_val])
+        # submit() may check the Redis prediction cache and wait on a full
+        # queue, so it runs in a thread; the result is awaited, not blocked on
+        future = await asyncio.to_thread(scoring_engine.submit, seq_data)
+        eco_score = await asyncio.wrap_future(future)
+
+        success = await AsyncLoan.update_score(loan_id, eco_score, carbon_val)
+        if not success:
+            return jsonify({'error': 'Failed to update score'}), 500
+
+        queued = await asyncio.to_thread(certification_queue.enqueue, loan_id, eco_score)
+
+        return jsonify({
+            'loan_id': loan_id,
+            'eco_score': eco_score,
+            'certification_queued': queued > 0,
+            'message': 'Score calculated successfully'
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/portfolio/summary', methods=['GET'])
+async def get_portfolio_summary():
+    try:
+        rows = await asyncio.to_thread(Portfolio.get_rollups)
+        if rows is None:
+            return jsonify({'error': 'Database unavailable'}), 503
+        return jsonify(summarize(rows)), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+if __name__ == '__main__':
+    app.run(host='0.0.0.0', port=int(os.getenv('ASGI_PORT', 8000)))
@@ -1,3 +1,4 @@
 from .database import DatabaseConfig
+from .pool import PostgresPool, PoolTimeout
 
-__all__ = ['DatabaseConfig']
+__all__ = ['DatabaseConfig', 'PostgresPool', 'PoolTimeout']
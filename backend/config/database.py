@@ -1,17 +1,25 @@
 import os
+import threading
+from contextlib import contextmanager
 from dotenv import load_dotenv
 import psycopg2
-from pymongo import MongoClient
-import redis
+from .pool import PostgresPool, PoolTimeout
 
 load_dotenv()
 
+# Tables created by init_postgres_tables(); readiness requires all of them
+SCHEMA_TABLES = ('loans', 'incentives', 'portfolio_rollups', 'milestones')
+
 class DatabaseConfig:
     """Database configuration and connection management"""
+
+    _postgres_pool = None
+    _async_postgres_pool = None
+    _pool_lock = threading.Lock()
     
     @staticmethod
     def get_postgres_connection():
-        """Get PostgreSQL connection"""
+        """Open a new, unpooled PostgreSQL connection"""
         try:
             conn = psycopg2.connect(
                 host=os.getenv('POSTGRES_HOST', 'localhost'),
@@ -25,10 +33,78 @@ class DatabaseConfig:
             print(f"PostgreSQL connection error: {e}")
             return None
     
+    @staticmethod
+    def get_postgres_pool():
+        """Get the process-wide PostgreSQL connection pool"""
+        if DatabaseConfig._postgres_pool is None:
+            with DatabaseConfig._pool_lock:
+                if DatabaseConfig._postgres_pool is None:
+                    DatabaseConfig._postgres_pool = PostgresPool(
+                        DatabaseConfig.get_postgres_connection,
+                        min_size=int(os.getenv('POSTGRES_POOL_MIN', 1)),
+                        max_size=int(os.getenv('POSTGRES_POOL_MAX', 10)),
+                        timeout=float(os.getenv('POSTGRES_POOL_TIMEOUT', 5)),
+                        health_check_interval=float(os.getenv('POSTGRES_POOL_HEALTH_CHECK_INTERVAL', 30))
+                    )
+        return DatabaseConfig._postgres_pool
+
+    @staticmethod
+    @contextmanager
+    def postgres_connection():
+        """Borrow a pooled PostgreSQL connection (None if unavailable)"""
+        pool = DatabaseConfig.get_postgres_pool()
+        try:
+            conn = pool.getconn()
+        except PoolTimeout as e:
+            print(f"PostgreSQL pool error: {e}")
+            conn = None
+
+        discard = False
+        try:
+            yield conn
+        except (psycopg2.InterfaceError, psycopg2.OperationalError):
+            # Broken connections must not go back into the pool
+            discard = True
+            raise
+        finally:
+            pool.putconn(conn, discard=discard)
+
+    @staticmethod
+    def close_postgres_pool():
+        """Close the PostgreSQL pool, e.g. on shutdown"""
+        with DatabaseConfig._pool_lock:
+            if DatabaseConfig._postgres_pool is not None:
+                DatabaseConfig._postgres_pool.close()
+                DatabaseConfig._postgres_pool = None
+
+    @staticmethod
+    async def get_async_postgres_pool():
+        """Get the asyncpg pool for the ASGI server (created on first use)"""
+        if DatabaseConfig._async_postgres_pool is None:
+            import asyncpg
+            DatabaseConfig._async_postgres_pool = await asyncpg.create_pool(
+                host=os.getenv('POSTGRES_HOST', 'localhost'),
+                port=int(os.getenv('POSTGRES_PORT', '5432')),
+                database=os.getenv('POSTGRES_DB', 'ecoscore_finance'),
+                user=os.getenv('POSTGRES_USER', 'postgres'),
+                password=os.getenv('POSTGRES_PASSWORD', ''),
+                min_size=int(os.getenv('POSTGRES_POOL_MIN', 1)),
+                max_size=int(os.getenv('POSTGRES_POOL_MAX', 10)),
+                timeout=float(os.getenv('POSTGRES_POOL_TIMEOUT', 5))
+            )
+        return DatabaseConfig._async_postgres_pool
+
+    @staticmethod
+    async def close_async_postgres_pool():
+        if DatabaseConfig._async_postgres_pool is not None:
+            await DatabaseConfig._async_postgres_pool.close()
+            DatabaseConfig._async_postgres_pool = None
+
     @staticmethod
     def get_mongodb_client():
         """Get MongoDB client"""
         try:
+            from pymongo import MongoClient
             client = MongoClient(
                 os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
             )
@@ -41,17 +117,41 @@ class DatabaseConfig:
     def get_redis_client():
         """Get Redis client for caching"""
         try:
+            import redis
             client = redis.Redis(
                 host=os.getenv('REDIS_HOST', 'localhost'),
                 port=int(os.getenv('REDIS_PORT', 6379)),
                 db=0,
-                decode_responses=True
+                decode_responses=True,
+                # Fail fast so an unreachable Redis degrades to a cache miss
+                socket_timeout=float(os.getenv('REDIS_SOCKET_TIMEOUT', 0.25)),
+                socket_connect_timeout=float(os.getenv('REDIS_CONNECT_TIMEOUT', 0.25))
             )
             return client
         except Exception as e:
             print(f"Redis connection error: {e}")
             return None
 
+    @staticmethod
+    def schema_ready():
+        """True when Postgres is reachable and every SCHEMA_TABLES table exists"""
+        try:
+            with DatabaseConfig.postgres_connection() as conn:
+                if conn is None:
+                    return False
+                cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT count(to_regclass(name)) FROM unnest(%s::text[]) AS name",
+                    (list(SCHEMA_TABLES),)
+                )
+                found = cursor.fetchone()[0]
+                conn.rollback()
+                cursor.close()
+                return found == len(SCHEMA_TABLES)
+        except Exception as e:
+            print(f"PostgreSQL readiness check failed: {e}")
+            return False
+
     @staticmethod
     def init_postgres_tables():
         """Initialize PostgreSQL tables"""
@@ -78,6 +178,29 @@ class DatabaseConfig:
             )
         """)
         
+        # Columns added after the initial schema
+        cursor.execute("""
+            ALTER TABLE loans ADD COLUMN IF NOT EXISTS borrower_address VARCHAR(42)
+        """)
+        
+        # Indexes for keyset-paginated, filtered loan listings
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_loans_created_id
+            ON loans (created_at DESC, id DESC)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_loans_status_created_id
+            ON loans (status, created_at DESC, id DESC)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_loans_project_type_created_id
+            ON loans (project_type, created_at DESC, id DESC)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_loans_eco_score
+            ON loans (eco_score)
+        """)
+        
         # Create incentives table
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS incentives (
@@ -91,6 +214,47 @@ class DatabaseConfig:
             )
         """)
         
+        # Certification queue columns on incentives
+        cursor.execute("""
+            ALTER TABLE incentives
+                ADD COLUMN IF NOT EXISTS eco_score DECIMAL(5, 2),
+                ADD COLUMN IF NOT EXISTS attempts INTEGER DEFAULT 0,
+                ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                ADD COLUMN IF NOT EXISTS last_error TEXT,
+                ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        """)
+        cursor.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_incentives_pending_certification
+            ON incentives (loan_id)
+            WHERE incentive_type = 'certification' AND status = 'pending'
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_incentives_certification_queue
+            ON incentives (status, next_attempt_at)
+            WHERE incentive_type = 'certification'
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_incentives_loan
+            ON incentives (loan_id, incentive_type, status)
+        """)
+
+        # Portfolio rollups, maintained incrementally and reconciled periodically
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS portfolio_rollups (
+                project_type VARCHAR(100) NOT NULL,
+                status VARCHAR(50) NOT NULL,
+                loan_count BIGINT DEFAULT 0,
+                scored_count BIGINT DEFAULT 0,
+                eco_score_sum DECIMAL(20, 2) DEFAULT 0,
+                carbon_sum DECIMAL(20, 2) DEFAULT 0,
+                loan_amount_sum DECIMAL(20, 2) DEFAULT 0,
+                certified_count BIGINT DEFAULT 0,
+                reconciled_at TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (project_type, status)
+            )
+        """)
+
         # Create milestones table
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS milestones (
@@ -104,6 +268,17 @@ class DatabaseConfig:
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
+
+        # Milestones track one reading field; open ones are loaded by the milestone engine
+        cursor.execute("""
+            ALTER TABLE milestones
+                ADD COLUMN IF NOT EXISTS metric VARCHAR(64) DEFAULT 'predicted_carbon_reduction'
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_milestones_open
+            ON milestones (loan_id, metric)
+            WHERE NOT achieved
+        """)
         
         conn.commit()
         cursor.close()
@@ -0,0 +1,172 @@
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes available in time"""
+
+
+class PostgresPool:
+    """Thread-safe PostgreSQL connection pool with health checks and metrics"""
+
+    def __init__(self, connect, min_size=1, max_size=10, timeout=5.0,
+                 health_check_interval=30.0):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Invalid pool size: need 0 <= min_size <= max_size and max_size >= 1")
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+
+        self._idle = deque()  # (connection, last_used_monotonic)
+        self._in_use = 0
+        self._closed = False
+        self._cond = threading.Condition(threading.Lock())
+
+        # Metrics
+        self._checkouts = 0
+        self._timeouts = 0
+        self._discarded = 0
+        self._created = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+        for _ in range(min_size):
+            conn = self._connect()
+            if conn is None:
+                break
+            self._created += 1
+            self._idle.append((conn, time.monotonic()))
+
+    def _is_healthy(self, conn, last_used):
+        """Cheap liveness check, with a round trip only for long-idle connections"""
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def getconn(self, timeout=None):
+        """Check out a healthy connection, waiting up to `timeout` seconds"""
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed")
+                while not self._idle and self._in_use >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(
+                            f"No PostgreSQL connection available within {timeout:.2f}s "
+                            f"(max_size={self.max_size})"
+                        )
+                    self._cond.wait(remaining)
+                    if self._closed:
+                        raise PoolTimeout("Connection pool is closed")
+
+                entry = self._idle.pop() if self._idle else None
+                self._in_use += 1
+
+            # Health checks and connects happen outside the lock
+            conn = None
+            try:
+                if entry is not None:
+                    conn, last_used = entry
+                    if not self._is_healthy(conn, last_used):
+                        self._close_quietly(conn)
+                        with self._cond:
+                            self._discarded += 1
+                        conn = None
+                if conn is None:
+                    conn = self._connect()
+                    if conn is not None:
+                        with self._cond:
+                            self._created += 1
+            except Exception:
+                conn = None
+
+            if conn is None:
+                with self._cond:
+                    self._in_use -= 1
+                    self._cond.notify()
+                if entry is not None and time.monotonic() < deadline:
+                    continue  # stale idle connection dropped, try again
+                return None
+
+            waited = time.monotonic() - started
+            with self._cond:
+                self._checkouts += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+            return conn
+
+    def putconn(self, conn, discard=False):
+        """Return a connection to the pool"""
+        if conn is None:
+            return
+        if not discard and not conn.closed:
+            try:
+                # Never hand out a connection with an open transaction
+                conn.rollback()
+            except Exception:
+                discard = True
+
+        with self._cond:
+            self._in_use -= 1
+            if discard or conn.closed or self._closed or len(self._idle) >= self.max_size:
+                self._discarded += 1
+                close = True
+            else:
+                self._idle.append((conn, time.monotonic()))
+                close = False
+            self._cond.notify()
+
+        if close:
+            self._close_quietly(conn)
+
+    def close(self):
+        """Close all idle connections and refuse further checkouts"""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    def metrics(self):
+        """Snapshot of pool usage"""
+        with self._cond:
+            return {
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'created': self._created,
+                'discarded': self._discarded,
+                'wait_avg_ms': (self._wait_total / self._checkouts * 1000) if self._checkouts else 0.0,
+                'wait_max_ms': self._wait_max * 1000,
+            }
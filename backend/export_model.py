@@ -0,0 +1,80 @@
+"""Export a trained EcoScoreLSTM artifact for the TorchScript, ONNX or torch backends.
+
+The artifact's fitted scaler is folded into the exported graph, so the
+service can feed raw feature values. --format weights writes a directory
+of .npy tensors plus manifest.json (scaler included) that the torch
+backend memory-maps, so pre-forked workers share one copy of the weights.
+
+Usage: python export_model.py ecoscore_model.pth --format onnx --output ecoscore_model.onnx
+       python export_model.py ecoscore_model.pth --format weights --output ecoscore_model.weights
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from ml_model import load_artifact
+from services.scoring import SEQUENCE_LENGTH
+
+
+class ScaledModel(nn.Module):
+    """Applies the MinMaxScaler transform (x * scale_ + min_) before the LSTM"""
+
+    def __init__(self, model, scaler):
+        super().__init__()
+        self.model = model
+        self.register_buffer('scale', torch.tensor(scaler.scale_, dtype=torch.float32))
+        self.register_buffer('offset', torch.tensor(scaler.min_, dtype=torch.float32))
+
+    def forward(self, x):
+        return self.model(x * self.scale + self.offset)
+
+
+parser = argparse.ArgumentParser(description='Export EcoScoreLSTM to TorchScript or ONNX')
+parser.add_argument('artifact', help='artifact saved by train_model() or training.py')
+parser.add_argument('--format', choices=['torchscript', 'onnx', 'weights'], default='torchscript')
+parser.add_argument('--output', help='output path (default: artifact name with .pt/.onnx/.weights)')
+parser.add_argument('--seq-len', type=int, default=SEQUENCE_LENGTH)
+args = parser.parse_args()
+
+model, scaler = load_artifact(args.artifact)
+exported = ScaledModel(model, scaler).eval()
+input_size = model.lstm.input_size
+
+example = torch.zeros(1, args.seq_len, input_size)
+extension = {'torchscript': '.pt', 'onnx': '.onnx', 'weights': '.weights'}[args.format]
+output = args.output or args.artifact.rsplit('.', 1)[0] + extension
+
+if args.format == 'weights':
+    os.makedirs(output, exist_ok=True)
+    tensors = {}
+    for name, tensor in model.state_dict().items():
+        tensors[name] = f'{name}.npy'
+        np.save(os.path.join(output, tensors[name]), np.ascontiguousarray(tensor.detach().cpu().numpy()))
+    with open(os.path.join(output, 'manifest.json'), 'w') as f:
+        json.dump({
+            'config': {
+                'input_size': model.lstm.input_size,
+                'hidden_size': model.hidden_size,
+                'num_layers': model.num_layers,
+                'output_size': model.fc.out_features,
+            },
+            'tensors': tensors,
+            'scale': [float(value) for value in scaler.scale_],
+            'offset': [float(value) for value in scaler.min_],
+        }, f, indent=2)
+elif args.format == 'torchscript':
+    scripted = torch.jit.trace(exported, example)
+    scripted.save(output)
+else:
+    torch.onnx.export(
+        exported, example, output,
+        input_names=['sequences'], output_names=['eco_score'],
+        dynamic_axes={'sequences': {0: 'batch'}, 'eco_score': {0: 'batch'}},
+        opset_version=17
+    )
+
+print(f"✅ Exported {args.format} model ({input_size} features per step) to {output}")
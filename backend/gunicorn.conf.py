@@ -0,0 +1,59 @@
+"""Pre-forked serving: one master, WEB_CONCURRENCY worker processes.
+
+The master imports the app once (preload_app) and, for fork-safe model
+backends (torchscript, torch, fake), loads the model before forking, so
+every worker shares the same weight pages instead of holding its own copy.
+Each worker then gets MODEL_NUM_THREADS intra-op threads (default: CPUs /
+workers, so workers don't oversubscribe the cores) and starts its own
+background services. Keras and ONNX Runtime start thread pools when they
+load, so with those backends each worker loads its own copy after the fork.
+
+Socket.IO clients need sticky sessions across workers, and emits from one
+worker reach clients of another only through SOCKETIO_MESSAGE_QUEUE.
+
+Usage: gunicorn -c gunicorn.conf.py app:app
+"""
+import gc
+import os
+
+# Background services start in each worker (post_fork), never in the master
+os.environ['BACKEND_AUTOSTART'] = '0'
+
+bind = f"0.0.0.0:{os.getenv('FLASK_PORT', 5000)}"
+workers = int(os.getenv('WEB_CONCURRENCY', 4))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+preload_app = True
+
+
+def _runtime():
+    from app import app
+    return app.extensions['ecoscore']
+
+
+def worker_threads(worker_count):
+    """Intra-op threads per worker"""
+    if os.getenv('MODEL_NUM_THREADS'):
+        return int(os.getenv('MODEL_NUM_THREADS'))
+    return max(1, (os.cpu_count() or 1) // worker_count)
+
+
+def when_ready(server):
+    runtime = _runtime()
+    if runtime.model_backend.preload():
+        print(f"🧠 Model loaded once in the master ({runtime.model_backend.version}), shared by {server.cfg.workers} workers")
+    else:
+        print(f"🧠 {runtime.model_backend.name} backend is not fork-safe; each worker loads its own model")
+    # Keep the collector from touching (and so copying) the master's objects in every worker
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    runtime = _runtime()
+    runtime.model_backend.set_num_threads(worker_threads(server.cfg.workers))
+    runtime.start()
+
+
+def worker_exit(server, worker):
+    _runtime().stop()
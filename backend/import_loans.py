@@ -0,0 +1,61 @@
+"""Bulk-import a loan book from CSV or NDJSON.
+
+Usage: python import_loans.py loans.csv [--format csv|ndjson] [--chunk-size 10000]
+       [--errors import_errors.ndjson] [--score] [--no-certify]
+"""
+import argparse
+import json
+import sys
+
+from dotenv import load_dotenv
+
+from models.portfolio import portfolio_rollups
+from services.certification import CertificationQueue
+from services.inference import create_backend
+from services.loan_import import IMPORT_FORMATS, LoanImporter, detect_format, score_imported
+from services.rescoring import stored_reading_windows
+
+load_dotenv()
+
+parser = argparse.ArgumentParser(description='Upsert loans from a CSV or NDJSON file via COPY')
+parser.add_argument('path', help="input file ('-' for stdin)")
+parser.add_argument('--format', choices=IMPORT_FORMATS, help='default: from the file extension')
+parser.add_argument('--chunk-size', type=int, default=10000, help='rows per COPY + upsert transaction')
+parser.add_argument('--errors', default='import_errors.ndjson', help='per-row error report')
+parser.add_argument('--score', action='store_true', help='score the imported loans afterwards')
+parser.add_argument('--score-batch', type=int, default=1000, help='loans per scoring batch')
+parser.add_argument('--backend', help='keras, torchscript or onnx (default: MODEL_BACKEND)')
+parser.add_argument('--no-certify', action='store_true', help='do not queue on-chain certifications')
+args = parser.parse_args()
+
+fmt = args.format or detect_format(args.path)
+if fmt is None:
+    parser.error('cannot infer the format from the file name; pass --format')
+
+importer = LoanImporter(chunk_size=args.chunk_size)
+if args.path == '-':
+    report = importer.run(sys.stdin, fmt)
+else:
+    with open(args.path, newline='', encoding='utf-8-sig') as f:
+        report = importer.run(f, fmt)
+
+with open(args.errors, 'w') as f:
+    for error in report['errors']:
+        f.write(json.dumps(error) + '\n')
+
+print(f"✅ Imported {report['inserted']} new and {report['updated']} updated loans from {report['rows']} rows "
+      f"in {report['elapsed_s']:.1f}s ({report['rows_per_s'] or 0:,.0f} rows/s)")
+if report['rejected']:
+    print(f"⚠️ {report['rejected']} rows rejected, see {args.errors}")
+
+if args.score and importer.loan_ids:
+    model_backend = create_backend(args.backend)
+    # Enqueue only: the backend's certification workers submit the transactions
+    certification_queue = None if args.no_certify else CertificationQueue(certifier=None)
+    reading_window = stored_reading_windows()
+    score_imported(model_backend.predict, importer.loan_ids, batch_size=args.score_batch,
+                   certification_queue=certification_queue,
+                   readings=reading_window.sequence if reading_window is not None else None)
+
+# Rollup deltas were summed per portfolio group in memory; write them once
+portfolio_rollups.flush()
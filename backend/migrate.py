@@ -0,0 +1,29 @@
+"""Apply the PostgreSQL schema (tables and indexes), once per deploy.
+
+The backend no longer runs DDL when it starts; /health/ready reports
+not-ready until this has been run against POSTGRES_DB.
+
+Usage: python migrate.py [--check]
+"""
+import argparse
+import sys
+
+from dotenv import load_dotenv
+
+from config.database import SCHEMA_TABLES, DatabaseConfig
+
+load_dotenv()
+
+parser = argparse.ArgumentParser(description='Create or update the EcoScore PostgreSQL schema')
+parser.add_argument('--check', action='store_true', help='only report whether the schema is present')
+args = parser.parse_args()
+
+if args.check:
+    ready = DatabaseConfig.schema_ready()
+    print(f"{'✅' if ready else '❌'} Schema {'present' if ready else 'missing'} ({', '.join(SCHEMA_TABLES)})")
+    sys.exit(0 if ready else 1)
+
+print("Initializing database...")
+if not DatabaseConfig.init_postgres_tables():
+    print("❌ Could not connect to PostgreSQL")
+    sys.exit(1)
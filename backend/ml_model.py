@@ -1,10 +1,12 @@
+import threading
+import weakref
 import torch
 import torch.nn as nn
 import numpy as np
 from sklearn.preprocessing import MinMaxScaler
 
 class EcoScoreLSTM(nn.Module):
-    def __init__(self, input_size=5, hidden_size=50, num_layers=2, output_size=1):
+    def __init__(self, input_size=3, hidden_size=50, num_layers=2, output_size=1):
         super(EcoScoreLSTM, self).__init__()
         self.hidden_size = hidden_size
         self.num_layers = num_layers
@@ -20,12 +22,13 @@ class EcoScoreLSTM(nn.Module):
 
 # Function to train the model (use synthetic data for hackathon demo)
 def train_model():
-    # Synthetic data: 100 samples, 12 "months" sequence, 5 features (e.g., energy_use, carbon_est, loan_amt, duration, green_factor)
-    X = np.random.rand(100, 12, 5) * 100  # Random features
+    # Synthetic data: 100 samples, 12 "months" sequence, the 3 features the service builds
+    # (loan_amount, predicted_carbon_reduction, solar flag)
+    X = np.random.rand(100, 12, 3) * 100  # Random features
     y = np.mean(X, axis=(1,2)) * 0.5 + np.random.rand(100) * 10  # Simulated EcoScore (0-100)
     
     scaler = MinMaxScaler()
-    X = scaler.fit_transform(X.reshape(-1, 5)).reshape(100, 12, 5)
+    X = scaler.fit_transform(X.reshape(-1, 3)).reshape(100, 12, 3)
     
     X_tensor = torch.tensor(X, dtype=torch.float32)
     y_tensor = torch.tensor(y.reshape(-1, 1), dtype=torch.float32)
@@ -44,19 +47,111 @@ def train_model():
         if epoch % 10 == 0:
             print(f"Epoch {epoch}, Loss: {loss.item()}")
     
-    torch.save(model.state_dict(), 'ecoscore_model.pth')
+    save_artifact('ecoscore_model.pth', model, scaler)
     return model, scaler
 
+# Artifacts bundle the weights, the model shape and the fitted scaler, so a
+# service can load exactly what was trained instead of retraining on startup
+def save_artifact(path, model, scaler, metrics=None):
+    torch.save({
+        'config': {
+            'input_size': model.lstm.input_size,
+            'hidden_size': model.hidden_size,
+            'num_layers': model.num_layers,
+            'output_size': model.fc.out_features,
+        },
+        'state_dict': model.state_dict(),
+        'scaler': {
+            'min_': scaler.min_,
+            'scale_': scaler.scale_,
+            'data_min_': scaler.data_min_,
+            'data_max_': scaler.data_max_,
+            'data_range_': scaler.data_range_,
+            'n_samples_seen_': scaler.n_samples_seen_,
+        },
+        'metrics': metrics or {},
+    }, path)
+
+def load_artifact(path):
+    """Load (model, scaler) saved by save_artifact; model is in eval mode"""
+    artifact = torch.load(path, map_location='cpu', weights_only=False)
+    model = EcoScoreLSTM(**artifact['config'])
+    model.load_state_dict(artifact['state_dict'])
+    model.eval()
+    
+    scaler = MinMaxScaler()
+    for name, value in artifact['scaler'].items():
+        setattr(scaler, name, value)
+    scaler.n_features_in_ = len(scaler.scale_)
+    return model, scaler
+
+class BatchPredictor:
+    """Scores many sequences per forward pass.
+    
+    Sequences are grouped into exact-length buckets (padding would change
+    the LSTM's final state), scaled in one vectorized step and copied into
+    input tensors preallocated per sequence length, which are reused
+    across calls.
+    """
+    def __init__(self, model, scaler, max_batch=4096, num_threads=None):
+        if num_threads:
+            torch.set_num_threads(num_threads)  # process-wide intra-op thread count
+        self.num_threads = num_threads
+        self.model = model.eval()
+        self.scaler = scaler
+        self.scale = np.asarray(scaler.scale_, dtype=np.float32)
+        self.offset = np.asarray(scaler.min_, dtype=np.float32)
+        self.max_batch = max_batch
+        self._buffers = {}
+        self._lock = threading.Lock()
+    
+    def _buffer(self, seq_len):
+        buffer = self._buffers.get(seq_len)
+        if buffer is None:
+            buffer = self._buffers[seq_len] = torch.empty(self.max_batch, seq_len, len(self.scale))
+        return buffer
+    
+    def _run(self, block, out, positions):
+        """Score an (n, T, F) block of equal-length sequences into out[positions]"""
+        scaled = block.astype(np.float32, copy=False) * self.scale + self.offset
+        buffer = self._buffer(block.shape[1])
+        for start in range(0, len(scaled), self.max_batch):
+            chunk = scaled[start:start + self.max_batch]
+            inputs = buffer[:len(chunk)]
+            inputs.copy_(torch.from_numpy(np.ascontiguousarray(chunk)))
+            out[positions[start:start + len(chunk)]] = self.model(inputs)[:, 0].numpy()
+    
+    def predict(self, sequences):
+        """Scores for an (N, T, F) array or a list of (T_i, F) sequences -> (N,) in 0-100"""
+        with self._lock, torch.inference_mode():
+            if isinstance(sequences, np.ndarray) and sequences.ndim == 3:
+                out = np.empty(len(sequences), dtype=np.float32)
+                self._run(sequences, out, np.arange(len(sequences)))
+            else:
+                sequences = [np.asarray(seq, dtype=np.float32) for seq in sequences]
+                out = np.empty(len(sequences), dtype=np.float32)
+                buckets = {}
+                for index, seq in enumerate(sequences):
+                    buckets.setdefault(len(seq), []).append(index)
+                for indices in buckets.values():
+                    self._run(np.stack([sequences[i] for i in indices]), out, np.asarray(indices))
+        return np.clip(out, 0, 100)  # Clamp to 0-100
+
+_predictors = weakref.WeakKeyDictionary()
+
+# Function to predict EcoScore for many sequences at once
+def predict_ecoscore_batch(model, scaler, sequences, num_threads=None):
+    predictor = _predictors.get(model)
+    # Rebuilt for a new scaler or thread count; the buffers are kept otherwise
+    if (predictor is None or predictor.scaler is not scaler
+            or (num_threads and num_threads != predictor.num_threads)):
+        predictor = _predictors[model] = BatchPredictor(model, scaler, num_threads=num_threads)
+    return predictor.predict(sequences)
+
 # Function to predict EcoScore
 def predict_ecoscore(model, scaler, input_data):
     # input_data: list of sequences, e.g., [[energy_use_month1, carbon_est1, ...], ...] for 12 months
-    input_array = np.array(input_data).reshape(1, len(input_data), -1)
-    input_scaled = scaler.transform(input_array.reshape(-1, input_array.shape[2])).reshape(input_array.shape)
-    input_tensor = torch.tensor(input_scaled, dtype=torch.float32)
-    model.eval()
-    with torch.no_grad():
-        score = model(input_tensor).item()
-    return min(max(score, 0), 100)  # Clamp to 0-100
+    return float(predict_ecoscore_batch(model, scaler, [input_data])[0])
 
 # If using TensorFlow/Keras instead (as mentioned in README):
 # from tensorflow.keras.models import Sequential
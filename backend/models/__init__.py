@@ -1,3 +1,6 @@
 from .loan import Loan
+from .incentive import Incentive
+from .portfolio import Portfolio
+from .milestone import Milestone
 
-__all__ = ['Loan']
+__all__ = ['Loan', 'Incentive', 'Portfolio', 'Milestone']
@@ -0,0 +1,132 @@
+import asyncio
+import re
+
+from config.database import DatabaseConfig
+from .loan import Loan, DEFAULT_LIST_FIELDS
+from .portfolio import portfolio_rollups
+
+
+def _numbered(query):
+    """Rewrite psycopg2 %s placeholders as asyncpg $1..$n"""
+    counter = iter(range(1, 1000))
+    return re.sub(r'%s', lambda _: f'${next(counter)}', query)
+
+
+class AsyncLoan:
+    """asyncpg versions of the Loan queries used by the ASGI server.
+
+    Reads go straight to Postgres (the read-through cache is synchronous);
+    writes still invalidate the shared cache so sync workers never serve
+    stale loans, from a thread since the cache talks to Redis. asyncpg does
+    not coerce parameters, so callers pass loan_id as a string and numbers
+    as numbers (see services.loan_import.validate_record).
+    """
+
+    @staticmethod
+    async def create(loan_data):
+        pool = await DatabaseConfig.get_async_postgres_pool()
+        try:
+            row_id = await pool.fetchval("""
+                INSERT INTO loans
+                (loan_id, borrower_name, loan_amount, project_type, description,
+                 eco_score, predicted_carbon_reduction, borrower_address, status)
+                VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+                RETURNING id
+            """,
+                loan_data['loan_id'],
+                loan_data['borrower_name'],
+                loan_data['loan_amount'],
+                loan_data['project_type'],
+                loan_data['description'],
+                loan_data.get('eco_score'),
+                loan_data.get('predicted_carbon_reduction'),
+                loan_data.get('borrower_address'),
+                'pending'
+            )
+        except Exception as e:
+            print(f"Error creating loan: {e}")
+            return None
+        await asyncio.to_thread(Loan.changed, [loan_data['loan_id']], True)
+        portfolio_rollups.record_created(
+            loan_data['project_type'], 'pending', loan_data['loan_amount'],
+            loan_data.get('eco_score'), loan_data.get('predicted_carbon_reduction')
+        )
+        return row_id
+
+    @staticmethod
+    async def get_by_id(loan_id):
+        pool = await DatabaseConfig.get_async_postgres_pool()
+        row = await pool.fetchrow("""
+            SELECT loan_id, borrower_name, loan_amount, project_type,
+                   description, eco_score, predicted_carbon_reduction,
+                   borrower_address, status, created_at
+            FROM loans WHERE loan_id = $1
+        """, str(loan_id))
+        if row is None:
+            return None
+        return {
+            'loan_id': row['loan_id'],
+            'borrower_name': row['borrower_name'],
+            'loan_amount': float(row['loan_amount']),
+            'project_type': row['project_type'],
+            'description': row['description'],
+            'eco_score': float(row['eco_score']) if row['eco_score'] is not None else None,
+            'predicted_carbon_reduction': float(row['predicted_carbon_reduction']) if row['predicted_carbon_reduction'] is not None else None,
+            'borrower_address': row['borrower_address'],
+            'status': row['status'],
+            'created_at': row['created_at'].isoformat() if row['created_at'] else None
+        }
+
+    @staticmethod
+    async def get_all(limit=100, cursor=None, fields=None, **filters):
+        """Same contract as Loan.get_all: (loans, next_cursor)"""
+        fields = fields or DEFAULT_LIST_FIELDS
+        query, params = Loan._list_query(fields, cursor=cursor, **filters)
+        pool = await DatabaseConfig.get_async_postgres_pool()
+        rows = await pool.fetch(_numbered(query + " LIMIT %s"), *params, limit + 1)
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = Loan.encode_cursor(rows[-1]['created_at'], rows[-1]['id'])
+        return [Loan._row_to_dict(fields, tuple(row)) for row in rows], next_cursor
+
+    @staticmethod
+    async def stream_all(fields=None, chunk_size=5000, **filters):
+        """Async generator over a server-side cursor, newest first"""
+        fields = fields or DEFAULT_LIST_FIELDS
+        query, params = Loan._list_query(fields, **filters)
+        pool = await DatabaseConfig.get_async_postgres_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                async for row in conn.cursor(_numbered(query), *params, prefetch=chunk_size):
+                    yield Loan._row_to_dict(fields, tuple(row))
+
+    @staticmethod
+    async def update_score(loan_id, eco_score, predicted_carbon_reduction):
+        pool = await DatabaseConfig.get_async_postgres_pool()
+        try:
+            row = await pool.fetchrow("""
+                UPDATE loans
+                SET eco_score = $1,
+                    predicted_carbon_reduction = $2,
+                    updated_at = CURRENT_TIMESTAMP
+                FROM (
+                    SELECT id, eco_score, predicted_carbon_reduction
+                    FROM loans WHERE loan_id = $3 FOR UPDATE
+                ) AS old
+                WHERE loans.id = old.id
+                RETURNING loans.project_type, loans.status,
+                          old.eco_score AS old_eco_score,
+                          old.predicted_carbon_reduction AS old_carbon
+            """, float(eco_score), float(predicted_carbon_reduction), str(loan_id))
+        except Exception as e:
+            print(f"Error updating score: {e}")
+            return False
+        await asyncio.to_thread(Loan.changed, [loan_id])
+        if row is not None:
+            portfolio_rollups.record_rescored(
+                row['project_type'], row['status'], row['old_eco_score'], eco_score,
+                row['old_carbon'], predicted_carbon_reduction
+            )
+        return True
@@ -0,0 +1,256 @@
+from psycopg2 import errors
+from psycopg2.extras import execute_values
+from config.database import DatabaseConfig
+from .portfolio import portfolio_rollups
+
+
+class Incentive:
+    """Incentive rows; certification rows double as a durable work queue.
+
+    Lifecycle of a 'certification' row: pending -> processing -> certified,
+    or back to pending with a later next_attempt_at on failure, and finally
+    failed once retries are exhausted. A loan has at most one pending row:
+    a processing row that would go back to pending while a newer score is
+    already queued for the loan becomes 'superseded' instead.
+    """
+
+    # Status of a row returning to the queue: pending, unless the loan already
+    # has a pending row (a newer score) or a newer row returning at the same time
+    REQUEUE_STATUS = """
+        CASE WHEN EXISTS (
+            SELECT 1 FROM incentives p
+            WHERE p.loan_id = incentives.loan_id
+              AND p.incentive_type = 'certification'
+              AND p.status = 'pending'
+              AND p.id <> incentives.id
+        ) THEN 'superseded' ELSE 'pending' END
+    """
+
+    @staticmethod
+    def enqueue_certifications(entries):
+        """Queue (loan_id, eco_score) certifications, deduplicated per loan.
+
+        A loan keeps at most one pending row (a newer score replaces it), and
+        nothing is queued when the on-chain score would not change, i.e. the
+        loan's in-flight or last certified score has the same integer value.
+        Returns the number of rows inserted or updated.
+        """
+        latest = {}
+        for loan_id, eco_score in entries:
+            latest[str(loan_id)] = eco_score
+        if not latest:
+            return 0
+
+        with DatabaseConfig.postgres_connection() as conn:
+            if not conn:
+                return 0
+
+            cursor = conn.cursor()
+            try:
+                execute_values(cursor, """
+                    INSERT INTO incentives
+                    (loan_id, incentive_type, eco_score, status, next_attempt_at, updated_at)
+                    SELECT v.loan_id, 'certification', v.eco_score, 'pending',
+                           CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
+                    FROM (VALUES %s) AS v(loan_id, eco_score)
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM incentives p
+                        WHERE p.loan_id = v.loan_id
+                          AND p.incentive_type = 'certification'
+                          AND p.status = 'processing'
+                          AND FLOOR(p.eco_score) = FLOOR(v.eco_score)
+                    )
+                    AND NOT EXISTS (
+                        SELECT 1 FROM (
+                            SELECT c.eco_score FROM incentives c
+                            WHERE c.loan_id = v.loan_id
+                              AND c.incentive_type = 'certification'
+                              AND c.status = 'certified'
+                            ORDER BY c.updated_at DESC
+                            LIMIT 1
+                        ) last_certified
+                        WHERE FLOOR(last_certified.eco_score) = FLOOR(v.eco_score)
+                    )
+                    ON CONFLICT (loan_id) WHERE incentive_type = 'certification' AND status = 'pending'
+                    DO UPDATE SET eco_score = EXCLUDED.eco_score,
+                                  updated_at = CURRENT_TIMESTAMP
+                """, list(latest.items()), template="(%s, %s::numeric)", page_size=len(latest))
+                # One page, so rowcount covers every row rather than the last 100
+                queued = cursor.rowcount
+                conn.commit()
+                return queued
+            except Exception as e:
+                print(f"Error queueing certifications: {e}")
+                conn.rollback()
+                return 0
+            finally:
+                cursor.close()
+
+    @staticmethod
+    def claim_certifications(limit):
+        """Atomically move up to `limit` due pending rows to processing.
+
+        Loans that already have a submission in flight are skipped so updates
+        for one loan reach the chain in order. SKIP LOCKED lets several
+        workers or processes claim concurrently.
+        """
+        with DatabaseConfig.postgres_connection() as conn:
+            if not conn:
+                return []
+
+            cursor = conn.cursor()
+            try:
+                cursor.execute("""
+                    UPDATE incentives i
+                    SET status = 'processing',
+                        attempts = i.attempts + 1,
+                        updated_at = CURRENT_TIMESTAMP
+                    FROM loans l
+                    WHERE l.loan_id = i.loan_id
+                      AND i.id IN (
+                        SELECT q.id FROM incentives q
+                        WHERE q.incentive_type = 'certification'
+                          AND q.status = 'pending'
+                          AND q.next_attempt_at <= CURRENT_TIMESTAMP
+                          AND NOT EXISTS (
+                              SELECT 1 FROM incentives p
+                              WHERE p.loan_id = q.loan_id
+                                AND p.incentive_type = 'certification'
+                                AND p.status = 'processing'
+                          )
+                        ORDER BY q.next_attempt_at
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                      )
+                    RETURNING i.id, i.loan_id, i.eco_score, l.borrower_address, i.attempts
+                """, (limit,))
+                rows = cursor.fetchall()
+                conn.commit()
+            except Exception as e:
+                print(f"Error claiming certifications: {e}")
+                conn.rollback()
+                return []
+            finally:
+                cursor.close()
+
+        return [
+            {
+                'id': row[0],
+                'loan_id': row[1],
+                'eco_score': float(row[2]),
+                'borrower_address': row[3],
+                'attempts': row[4]
+            }
+            for row in rows
+        ]
+
+    @staticmethod
+    def mark_certified(incentive_id, tx_id):
+        """Record a successful on-chain certification"""
+        return Incentive.mark_certified_many([incentive_id], tx_id)
+
+    @staticmethod
+    def mark_certified_many(incentive_ids, tx_id):
+        """Record certifications that landed in one transaction (a certifyLoans
+        batch): every row gets the transaction id"""
+        with DatabaseConfig.postgres_connection() as conn:
+            if not conn:
+                return False
+
+            cursor = conn.cursor()
+            try:
+                # first_certification: no other certified row for this loan yet
+                cursor.execute("""
+                    UPDATE incentives
+                    SET status = 'certified', blockchain_tx_id = %s,
+                        last_error = NULL, updated_at = CURRENT_TIMESTAMP
+                    FROM loans
+                    WHERE incentives.id = ANY(%s) AND loans.loan_id = incentives.loan_id
+                    RETURNING loans.project_type, loans.status, NOT EXISTS (
+                        SELECT 1 FROM incentives c
+                        WHERE c.loan_id = incentives.loan_id
+                          AND c.incentive_type = 'certification'
+                          AND c.status = 'certified'
+                          AND c.id <> incentives.id
+                    ) AS first_certification
+                """, (tx_id, list(incentive_ids)))
+                rows = cursor.fetchall()
+                conn.commit()
+            except Exception as e:
+                print(f"Error updating incentive: {e}")
+                conn.rollback()
+                return False
+            finally:
+                cursor.close()
+
+        for project_type, status, first_certification in rows:
+            if first_certification:
+                portfolio_rollups.record_certified(project_type, status)
+        return True
+
+    @staticmethod
+    def mark_failed(incentive_id, error, retry_in_seconds=None):
+        """Schedule a retry after `retry_in_seconds`, or give up if None"""
+        if retry_in_seconds is None:
+            return Incentive._execute("""
+                UPDATE incentives
+                SET status = 'failed', last_error = %s, updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s
+            """, (str(error)[:1000], incentive_id))
+        return Incentive._execute(f"""
+            UPDATE incentives
+            SET status = {Incentive.REQUEUE_STATUS}, last_error = %s,
+                next_attempt_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second',
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s
+        """, (str(error)[:1000], retry_in_seconds, incentive_id), retry_conflicts=True)
+
+    @staticmethod
+    def requeue_stale(lease_seconds):
+        """Return rows stuck in processing (e.g. after a crash) to pending.
+
+        Rows of loans that already have a pending row, and all but the newest
+        stale row of a loan, are superseded instead, so one loan can never
+        make the whole statement fail on the pending-row unique index.
+        """
+        return Incentive._execute(f"""
+            UPDATE incentives
+            SET status = CASE WHEN EXISTS (
+                    SELECT 1 FROM incentives s
+                    WHERE s.loan_id = incentives.loan_id
+                      AND s.incentive_type = 'certification'
+                      AND s.status = 'processing'
+                      AND s.updated_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 second'
+                      AND s.id > incentives.id
+                ) THEN 'superseded' ELSE {Incentive.REQUEUE_STATUS} END,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE incentive_type = 'certification'
+              AND status = 'processing'
+              AND updated_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 second'
+        """, (lease_seconds, lease_seconds), retry_conflicts=True)
+
+    @staticmethod
+    def _execute(query, params, retry_conflicts=False):
+        """Run one UPDATE. With retry_conflicts, a pending row queued concurrently
+        (a unique violation) makes it run once more, now seeing that row."""
+        with DatabaseConfig.postgres_connection() as conn:
+            if not conn:
+                return False
+
+            cursor = conn.cursor()
+            try:
+                for attempt in range(2 if retry_conflicts else 1):
+                    try:
+                        cursor.execute(query, params)
+                        conn.commit()
+                        return True
+                    except errors.UniqueViolation:
+                        conn.rollback()
+                        if attempt or not retry_conflicts:
+                            raise
+            except Exception as e:
+                print(f"Error updating incentive: {e}")
+                conn.rollback()
+                return False
+            finally:
+                cursor.close()
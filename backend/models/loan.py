@@ -1,9 +1,57 @@
+import base64
+import csv
+import io
+import json
 from datetime import datetime
+from decimal import Decimal
+from psycopg2.extras import execute_values
+import os
 from config.database import DatabaseConfig
+from .portfolio import portfolio_rollups
+
+# Fields every new loan must carry (single create and bulk import)
+REQUIRED_FIELDS = ['loan_id', 'borrower_name', 'loan_amount', 'project_type', 'description']
+
+# Column order of bulk-import rows
+IMPORT_FIELDS = [
+    'loan_id', 'borrower_name', 'loan_amount', 'project_type', 'description',
+    'eco_score', 'predicted_carbon_reduction', 'borrower_address'
+]
+
+# Projectable fields for list/export reads -> SQL column
+LIST_FIELDS = {
+    'loan_id': 'loan_id',
+    'borrower_name': 'borrower_name',
+    'loan_amount': 'loan_amount',
+    'project_type': 'project_type',
+    'description': 'description',
+    'eco_score': 'eco_score',
+    'predicted_carbon_reduction': 'predicted_carbon_reduction',
+    'borrower_address': 'borrower_address',
+    'status': 'status',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+DEFAULT_LIST_FIELDS = [
+    'loan_id', 'borrower_name', 'loan_amount', 'project_type',
+    'eco_score', 'borrower_address', 'status', 'created_at'
+]
+
+def _serialize(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
 
 class Loan:
     """Loan data model"""
     
+    # Read-through caches (services.loan_cache.LoanCaches) once installed;
+    # without them every read goes to Postgres
+    caches = None
+    
     def __init__(self, loan_id, borrower_name, loan_amount, project_type, 
                  description, eco_score=None, predicted_carbon_reduction=None, borrower_address=None):
         self.loan_id = loan_id
@@ -20,60 +68,76 @@ class Loan:
     @staticmethod
     def create(loan_data):
         """Create a new loan in the database"""
-        conn = DatabaseConfig.get_postgres_connection()
-        if not conn:
-            return None
-        
-        cursor = conn.cursor()
-        try:
-            cursor.execute("""
-                INSERT INTO loans 
-                (loan_id, borrower_name, loan_amount, project_type, description, 
-                 eco_score, predicted_carbon_reduction, borrower_address, status)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                RETURNING id
-            """, (
-                loan_data['loan_id'],
-                loan_data['borrower_name'],
-                loan_data['loan_amount'],
-                loan_data['project_type'],
-                loan_data['description'],
-                loan_data.get('eco_score'),
-                loan_data.get('predicted_carbon_reduction'),
-                loan_data.get('borrower_address'),  # New field
-                'pending'
-            ))
+        with DatabaseConfig.postgres_connection() as conn:
+            if not conn:
+                return None
             
-            loan_id = cursor.fetchone()[0]
-            conn.commit()
-            cursor.close()
-            conn.close()
-            return loan_id
-        except Exception as e:
-            print(f"Error creating loan: {e}")
-            conn.rollback()
-            cursor.close()
-            conn.close()
-            return None
+            cursor = conn.cursor()
+            try:
+                cursor.execute("""
+                    INSERT INTO loans 
+                    (loan_id, borrower_name, loan_amount, project_type, description, 
+                     eco_score, predicted_carbon_reduction, borrower_address, status)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    RETURNING id
+                """, (
+                    loan_data['loan_id'],
+                    loan_data['borrower_name'],
+                    loan_data['loan_amount'],
+                    loan_data['project_type'],
+                    loan_data['description'],
+                    loan_data.get('eco_score'),
+                    loan_data.get('predicted_carbon_reduction'),
+                    loan_data.get('borrower_address'),  # New field
+                    'pending'
+                ))
+                
+                loan_id = cursor.fetchone()[0]
+                conn.commit()
+                Loan.changed([loan_data['loan_id']], listed=True)
+                portfolio_rollups.record_created(
+                    loan_data['project_type'], 'pending', loan_data['loan_amount'],
+                    loan_data.get('eco_score'), loan_data.get('predicted_carbon_reduction')
+                )
+                return loan_id
+            except Exception as e:
+                print(f"Error creating loan: {e}")
+                conn.rollback()
+                return None
+            finally:
+                cursor.close()
+    
+    @staticmethod
+    def changed(loan_ids, listed=False):
+        """Invalidate cached loans after a committed write; `listed` when the
+        write adds or removes loans or changes a status (list membership)"""
+        if Loan.caches is not None:
+            Loan.caches.invalidate(loan_ids, listed=listed)
     
     @staticmethod
     def get_by_id(loan_id):
-        """Get loan by ID"""
-        conn = DatabaseConfig.get_postgres_connection()
-        if not conn:
-            return None
-        
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT loan_id, borrower_name, loan_amount, project_type, 
-                   description, eco_score, predicted_carbon_reduction, 
-                   borrower_address, status, created_at
-            FROM loans WHERE loan_id = %s
-        """, (loan_id,))
-        
-        row = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        """Get loan by ID (cached)"""
+        if Loan.caches is None:
+            return Loan._fetch_by_id(loan_id)
+        return Loan.caches.get_loan(loan_id, lambda: Loan._fetch_by_id(loan_id))
+    
+    @staticmethod
+    def _fetch_by_id(loan_id):
+        with DatabaseConfig.postgres_connection() as conn:
+            if not conn:
+                return None
+            
+            cursor = conn.cursor()
+            try:
+                cursor.execute("""
+                    SELECT loan_id, borrower_name, loan_amount, project_type, 
+                           description, eco_score, predicted_carbon_reduction, 
+                           borrower_address, status, created_at
+                    FROM loans WHERE loan_id = %s
+                """, (loan_id,))
+                row = cursor.fetchone()
+            finally:
+                cursor.close()
         
         if row:
             return {
@@ -91,62 +155,330 @@ class Loan:
         return None
     
     @staticmethod
-    def get_all():
-        """Get all loans"""
-        conn = DatabaseConfig.get_postgres_connection()
-        if not conn:
-            return []
+    def _list_query(fields, status=None, project_type=None, min_score=None, max_score=None, cursor=None):
+        """Build the SELECT for list/stream reads; id and created_at are always
+        selected (last two columns) because they form the keyset"""
+        columns = [LIST_FIELDS[field] for field in fields] + ['id', 'created_at']
+        conditions, params = [], []
+        if status is not None:
+            conditions.append("status = %s")
+            params.append(status)
+        if project_type is not None:
+            conditions.append("project_type = %s")
+            params.append(project_type)
+        if min_score is not None:
+            conditions.append("eco_score >= %s")
+            params.append(min_score)
+        if max_score is not None:
+            conditions.append("eco_score <= %s")
+            params.append(max_score)
+        if cursor is not None:
+            created_at, row_id = Loan.decode_cursor(cursor)
+            conditions.append("(created_at, id) < (%s, %s)")
+            params.extend([created_at, row_id])
         
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT loan_id, borrower_name, loan_amount, project_type, 
-                   eco_score, borrower_address, status, created_at
-            FROM loans ORDER BY created_at DESC
-        """)
+        query = f"SELECT {', '.join(columns)} FROM loans"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY created_at DESC, id DESC"
+        return query, params
+    
+    @staticmethod
+    def _row_to_dict(fields, row):
+        return {field: _serialize(value) for field, value in zip(fields, row)}
+    
+    @staticmethod
+    def encode_cursor(created_at, row_id):
+        raw = json.dumps([created_at.isoformat(), row_id]).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+    
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            return datetime.fromisoformat(created_at), int(row_id)
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"Invalid cursor: {cursor}") from e
+    
+    @staticmethod
+    def get_all(limit=100, cursor=None, fields=None, **filters):
+        """Get one page of loans, newest first.
         
-        rows = cursor.fetchall()
-        cursor.close()
-        conn.close()
+        Returns (loans, next_cursor); next_cursor is None on the last page.
+        Filters: status, project_type, min_score, max_score.
+        """
+        fields = fields or DEFAULT_LIST_FIELDS
+        if Loan.caches is None:
+            page = Loan._fetch_page(limit, cursor, fields, filters)
+        else:
+            page = Loan.caches.get_page(
+                limit, cursor, fields, filters, lambda: Loan._fetch_page(limit, cursor, fields, filters)
+            )
+        if page is None:
+            return [], None
+        return page[0], page[1]
+    
+    @staticmethod
+    def _fetch_page(limit, cursor, fields, filters):
+        query, params = Loan._list_query(fields, cursor=cursor, **filters)
         
-        loans = []
-        for row in rows:
-            loans.append({
-                'loan_id': row[0],
-                'borrower_name': row[1],
-                'loan_amount': float(row[2]),
-                'project_type': row[3],
-                'eco_score': float(row[4]) if row[4] else None,
-                'borrower_address': row[5],  # New
-                'status': row[6],
-                'created_at': row[7].isoformat() if row[7] else None
-            })
+        with DatabaseConfig.postgres_connection() as conn:
+            if not conn:
+                return None
+            
+            db_cursor = conn.cursor()
+            try:
+                # Fetch one extra row to learn whether another page exists
+                db_cursor.execute(query + " LIMIT %s", params + [limit + 1])
+                rows = db_cursor.fetchall()
+            finally:
+                db_cursor.close()
         
-        return loans
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = Loan.encode_cursor(rows[-1][-1], rows[-1][-2])
+        
+        return [[Loan._row_to_dict(fields, row) for row in rows], next_cursor]
+    
+    @staticmethod
+    def stream_all(fields=None, chunk_size=5000, **filters):
+        """Yield loans newest first from a server-side cursor (for large exports)"""
+        fields = fields or DEFAULT_LIST_FIELDS
+        query, params = Loan._list_query(fields, **filters)
+        
+        with DatabaseConfig.postgres_connection() as conn:
+            if not conn:
+                return
+            
+            cursor = conn.cursor(name='loan_export_stream')
+            cursor.itersize = chunk_size
+            try:
+                cursor.execute(query, params)
+                for row in cursor:
+                    yield Loan._row_to_dict(fields, row)
+            finally:
+                cursor.close()
+                conn.rollback()
     
     @staticmethod
     def update_score(loan_id, eco_score, predicted_carbon_reduction):
         """Update loan's environmental score"""
-        conn = DatabaseConfig.get_postgres_connection()
-        if not conn:
-            return False
+        with DatabaseConfig.postgres_connection() as conn:
+            if not conn:
+                return False
+            
+            cursor = conn.cursor()
+            try:
+                # The locked subquery yields the pre-update values for the rollup delta
+                cursor.execute("""
+                    UPDATE loans 
+                    SET eco_score = %s, 
+                        predicted_carbon_reduction = %s,
+                        updated_at = CURRENT_TIMESTAMP
+                    FROM (
+                        SELECT id, eco_score, predicted_carbon_reduction
+                        FROM loans WHERE loan_id = %s FOR UPDATE
+                    ) AS old
+                    WHERE loans.id = old.id
+                    RETURNING loans.project_type, loans.status,
+                              old.eco_score, old.predicted_carbon_reduction
+                """, (eco_score, predicted_carbon_reduction, loan_id))
+                row = cursor.fetchone()
+                
+                conn.commit()
+                Loan.changed([loan_id])
+                if row:
+                    portfolio_rollups.record_rescored(
+                        row[0], row[1], row[2], eco_score, row[3], predicted_carbon_reduction
+                    )
+                return True
+            except Exception as e:
+                print(f"Error updating score: {e}")
+                conn.rollback()
+                return False
+            finally:
+                cursor.close()
+    
+    @staticmethod
+    def iter_scoring_rows(chunk_size=10000, after_loan_id=None):
+        """Stream (loan_id, loan_amount, predicted_carbon_reduction, project_type)
+        chunks in loan_id order through a server-side cursor"""
+        with DatabaseConfig.postgres_connection() as conn:
+            if not conn:
+                return
+            
+            cursor = conn.cursor(name='loan_scoring_stream')
+            cursor.itersize = chunk_size
+            try:
+                if after_loan_id is None:
+                    cursor.execute("""
+                        SELECT loan_id, loan_amount, predicted_carbon_reduction, project_type
+                        FROM loans ORDER BY loan_id
+                    """)
+                else:
+                    # Resume after a checkpoint; the loan_id unique index keeps this a range scan
+                    cursor.execute("""
+                        SELECT loan_id, loan_amount, predicted_carbon_reduction, project_type
+                        FROM loans WHERE loan_id > %s ORDER BY loan_id
+                    """, (after_loan_id,))
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield rows
+            finally:
+                cursor.close()
+                conn.rollback()
+    
+    @staticmethod
+    def get_scoring_rows(loan_ids):
+        """Fetch scoring inputs for a list of loan IDs in one query"""
+        with DatabaseConfig.postgres_connection() as conn:
+            if not conn:
+                return []
+            
+            cursor = conn.cursor()
+            try:
+                cursor.execute("""
+                    SELECT loan_id, loan_amount, predicted_carbon_reduction, project_type
+                    FROM loans WHERE loan_id = ANY(%s)
+                """, (list(loan_ids),))
+                return cursor.fetchall()
+            finally:
+                cursor.close()
+    
+    @staticmethod
+    def bulk_update_scores(updates, page_size=1000):
+        """Apply many (loan_id, eco_score, predicted_carbon_reduction) updates in one transaction"""
+        updates = list(updates)
+        if not updates:
+            return 0
         
-        cursor = conn.cursor()
-        try:
-            cursor.execute("""
-                UPDATE loans 
-                SET eco_score = %s, 
-                    predicted_carbon_reduction = %s,
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE loan_id = %s
-            """, (eco_score, predicted_carbon_reduction, loan_id))
+        with DatabaseConfig.postgres_connection() as conn:
+            if not conn:
+                return 0
             
-            conn.commit()
-            cursor.close()
-            conn.close()
-            return True
-        except Exception as e:
-            print(f"Error updating score: {e}")
-            conn.rollback()
-            cursor.close()
-            conn.close()
-            return False
+            cursor = conn.cursor()
+            try:
+                rows = execute_values(cursor, """
+                    UPDATE loans
+                    SET eco_score = old.new_eco_score,
+                        predicted_carbon_reduction = old.new_carbon,
+                        updated_at = CURRENT_TIMESTAMP
+                    FROM (
+                        SELECT l.id, l.eco_score, l.predicted_carbon_reduction,
+                               v.eco_score AS new_eco_score, v.predicted_carbon_reduction AS new_carbon
+                        FROM loans l
+                        JOIN (VALUES %s) AS v(loan_id, eco_score, predicted_carbon_reduction)
+                          ON l.loan_id = v.loan_id
+                        ORDER BY l.loan_id
+                        FOR UPDATE OF l
+                    ) AS old
+                    WHERE loans.id = old.id
+                    RETURNING loans.project_type, loans.status, old.eco_score, old.new_eco_score,
+                              old.predicted_carbon_reduction, old.new_carbon
+                """, updates, template="(%s, %s::numeric, %s::numeric)", page_size=page_size, fetch=True)
+                conn.commit()
+                Loan.changed([update[0] for update in updates])
+                for project_type, status, old_score, new_score, old_carbon, new_carbon in rows:
+                    portfolio_rollups.record_rescored(project_type, status, old_score, new_score, old_carbon, new_carbon)
+                return len(updates)
+            except Exception as e:
+                print(f"Error bulk updating scores: {e}")
+                conn.rollback()
+                return 0
+            finally:
+                cursor.close()
+    
+    @staticmethod
+    def bulk_import(rows):
+        """Upsert validated rows (tuples in IMPORT_FIELDS order) in one transaction.
+        
+        Rows are COPYed into a temporary staging table and merged into loans
+        with a single INSERT ... ON CONFLICT; the last row wins when a loan_id
+        repeats. Existing scores and addresses are kept when a row leaves
+        them empty. Returns (inserted, updated), or None without a
+        connection; database errors are raised after rolling back so the
+        caller can attribute them to rows.
+        """
+        if not rows:
+            return 0, 0
+        
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for seq, row in enumerate(rows):
+            writer.writerow((seq,) + tuple(row))
+        buffer.seek(0)
+        
+        with DatabaseConfig.postgres_connection() as conn:
+            if not conn:
+                return None
+            
+            cursor = conn.cursor()
+            try:
+                cursor.execute("""
+                    CREATE TEMP TABLE loan_import_staging (
+                        seq INTEGER,
+                        loan_id VARCHAR(50),
+                        borrower_name VARCHAR(255),
+                        loan_amount DECIMAL(15, 2),
+                        project_type VARCHAR(100),
+                        description TEXT,
+                        eco_score DECIMAL(5, 2),
+                        predicted_carbon_reduction DECIMAL(10, 2),
+                        borrower_address VARCHAR(42)
+                    ) ON COMMIT DROP
+                """)
+                cursor.copy_expert(
+                    f"COPY loan_import_staging (seq, {', '.join(IMPORT_FIELDS)}) FROM STDIN WITH (FORMAT csv)",
+                    buffer
+                )
+                
+                # Pre-import values of loans being replaced, for the rollup deltas
+                cursor.execute("""
+                    SELECT loan_id, project_type, status, loan_amount, eco_score, predicted_carbon_reduction
+                    FROM loans
+                    WHERE loan_id IN (SELECT loan_id FROM loan_import_staging)
+                    FOR UPDATE
+                """)
+                previous = {row[0]: row[1:] for row in cursor.fetchall()}
+                
+                cursor.execute("""
+                    INSERT INTO loans
+                    (loan_id, borrower_name, loan_amount, project_type, description,
+                     eco_score, predicted_carbon_reduction, borrower_address, status)
+                    SELECT DISTINCT ON (loan_id)
+                           loan_id, borrower_name, loan_amount, project_type, description,
+                           eco_score, predicted_carbon_reduction, borrower_address, 'pending'
+                    FROM loan_import_staging
+                    ORDER BY loan_id, seq DESC
+                    ON CONFLICT (loan_id) DO UPDATE SET
+                        borrower_name = EXCLUDED.borrower_name,
+                        loan_amount = EXCLUDED.loan_amount,
+                        project_type = EXCLUDED.project_type,
+                        description = EXCLUDED.description,
+                        eco_score = COALESCE(EXCLUDED.eco_score, loans.eco_score),
+                        predicted_carbon_reduction = COALESCE(EXCLUDED.predicted_carbon_reduction,
+                                                              loans.predicted_carbon_reduction),
+                        borrower_address = COALESCE(EXCLUDED.borrower_address, loans.borrower_address),
+                        updated_at = CURRENT_TIMESTAMP
+                    RETURNING loan_id, project_type, status, loan_amount, eco_score, predicted_carbon_reduction
+                """)
+                merged = cursor.fetchall()
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+        
+        Loan.changed([row[0] for row in merged], listed=True)
+        for loan_id, project_type, status, loan_amount, eco_score, carbon in merged:
+            old = previous.get(loan_id)
+            if old is not None:
+                portfolio_rollups.record_removed(*old)
+            portfolio_rollups.record_created(project_type, status, loan_amount, eco_score, carbon)
+        updated = sum(1 for row in merged if row[0] in previous)
+        return len(merged) - updated, updated
@@ -0,0 +1,162 @@
+from psycopg2.extras import execute_values
+from config.database import DatabaseConfig
+
+# Reading field a milestone tracks unless one is given
+DEFAULT_METRIC = 'predicted_carbon_reduction'
+
+MILESTONE_FIELDS = ('id', 'loan_id', 'milestone_name', 'metric', 'target_value', 'current_value',
+                    'achieved', 'achieved_at', 'created_at')
+
+
+def _milestone(row):
+    milestone = dict(zip(MILESTONE_FIELDS, row))
+    for field in ('target_value', 'current_value'):
+        if milestone[field] is not None:
+            milestone[field] = float(milestone[field])
+    for field in ('achieved_at', 'created_at'):
+        if milestone[field] is not None:
+            milestone[field] = milestone[field].isoformat()
+    return milestone
+
+
+class Milestone:
+    """Per-loan targets on a reading field (the milestones table).
+
+    A milestone is achieved the first time a reading's `metric` value
+    reaches `target_value`; current_value holds the latest reading.
+    """
+
+    @staticmethod
+    def create(loan_id, milestone_name, target_value, metric=DEFAULT_METRIC):
+        """Insert a milestone and return it, or None on failure"""
+        with DatabaseConfig.postgres_connection() as conn:
+            if not conn:
+                return None
+
+            cursor = conn.cursor()
+            try:
+                cursor.execute(f"""
+                    INSERT INTO milestones (loan_id, milestone_name, metric, target_value)
+                    VALUES (%s, %s, %s, %s)
+                    RETURNING {', '.join(MILESTONE_FIELDS)}
+                """, (loan_id, milestone_name, metric, target_value))
+                row = cursor.fetchone()
+                conn.commit()
+                return _milestone(row)
+            except Exception as e:
+                print(f"Error creating milestone: {e}")
+                conn.rollback()
+                return None
+            finally:
+                cursor.close()
+
+    @staticmethod
+    def get_for_loan(loan_id):
+        with DatabaseConfig.postgres_connection() as conn:
+            if not conn:
+                return None
+
+            cursor = conn.cursor()
+            try:
+                cursor.execute(f"""
+                    SELECT {', '.join(MILESTONE_FIELDS)} FROM milestones
+                    WHERE loan_id = %s
+                    ORDER BY target_value, id
+                """, (loan_id,))
+                return [_milestone(row) for row in cursor.fetchall()]
+            finally:
+                cursor.close()
+
+    @staticmethod
+    def load_open(after_id=0, itersize=10000):
+        """Open milestones with id > after_id, in id order, as
+        (id, loan_id, metric, target_value, milestone_name, project_type)"""
+        with DatabaseConfig.postgres_connection() as conn:
+            if not conn:
+                return None
+
+            # Server-side cursor: the whole fleet's milestones are never in one result buffer
+            cursor = conn.cursor(name='open_milestones')
+            cursor.itersize = itersize
+            try:
+                cursor.execute("""
+                    SELECT m.id, m.loan_id, m.metric, m.target_value,
+                           m.milestone_name, l.project_type
+                    FROM milestones m
+                    JOIN loans l ON l.loan_id = m.loan_id
+                    WHERE NOT m.achieved AND m.id > %s AND m.target_value IS NOT NULL
+                    ORDER BY m.id
+                """, (after_id,))
+                rows = [(row[0], row[1], row[2], float(row[3]), row[4], row[5]) for row in cursor]
+                conn.commit()
+                return rows
+            except Exception as e:
+                print(f"Error loading open milestones: {e}")
+                conn.rollback()
+                return None
+            finally:
+                cursor.close()
+
+    @staticmethod
+    def bulk_update_progress(updates, page_size=1000):
+        """Set current_value on every open milestone for many (loan_id, metric, value)
+        in one transaction; returns the number of updates applied (0 on failure)"""
+        updates = list(updates)
+        if not updates:
+            return 0
+
+        with DatabaseConfig.postgres_connection() as conn:
+            if not conn:
+                return 0
+
+            cursor = conn.cursor()
+            try:
+                execute_values(cursor, """
+                    UPDATE milestones m
+                    SET current_value = v.value
+                    FROM (VALUES %s) AS v(loan_id, metric, value)
+                    WHERE m.loan_id = v.loan_id
+                      AND m.metric = v.metric
+                      AND NOT m.achieved
+                """, updates, template="(%s, %s, %s::numeric)", page_size=page_size)
+                conn.commit()
+                return len(updates)
+            except Exception as e:
+                print(f"Error updating milestone progress: {e}")
+                conn.rollback()
+                return 0
+            finally:
+                cursor.close()
+
+    @staticmethod
+    def mark_achieved_many(achievements):
+        """Mark (milestone_id, value, achieved_at) rows achieved in one transaction.
+
+        Returns the ids that were still open (another process, or a deleted
+        row, accounts for the rest), or None on failure.
+        """
+        achievements = list(achievements)
+        if not achievements:
+            return []
+
+        with DatabaseConfig.postgres_connection() as conn:
+            if not conn:
+                return None
+
+            cursor = conn.cursor()
+            try:
+                rows = execute_values(cursor, """
+                    UPDATE milestones m
+                    SET achieved = TRUE, achieved_at = v.achieved_at, current_value = v.value
+                    FROM (VALUES %s) AS v(id, value, achieved_at)
+                    WHERE m.id = v.id AND NOT m.achieved
+                    RETURNING m.id
+                """, achievements, template="(%s, %s::numeric, %s::timestamp)", fetch=True)
+                conn.commit()
+                return [row[0] for row in rows]
+            except Exception as e:
+                print(f"Error marking milestones achieved: {e}")
+                conn.rollback()
+                return None
+            finally:
+                cursor.close()
@@ -0,0 +1,166 @@
+import os
+
+from psycopg2.extras import execute_values
+from config.database import DatabaseConfig
+from services.portfolio import MEASURES, UNSPECIFIED, PortfolioRollups
+
+# Serializes reconciliation across backend processes
+RECONCILE_LOCK_ID = 0x65636f70
+
+
+class Portfolio:
+    """Materialized portfolio rollups (the portfolio_rollups table)"""
+
+    @staticmethod
+    def apply_deltas(deltas):
+        """Add {(project_type, status, recorded_at): {measure: delta}} to the rollup rows.
+
+        Deltas recorded (epoch seconds) before the last reconcile are dropped:
+        the rebuild already counted their writes.
+        """
+        if not deltas:
+            return True
+        rows = [(project_type, status, recorded_at) + tuple(values[name] for name in MEASURES)
+                for (project_type, status, recorded_at), values in deltas.items()]
+
+        with DatabaseConfig.postgres_connection() as conn:
+            if not conn:
+                return False
+
+            cursor = conn.cursor()
+            try:
+                execute_values(cursor, """
+                    INSERT INTO portfolio_rollups
+                    (project_type, status, loan_count, scored_count, eco_score_sum,
+                     carbon_sum, loan_amount_sum, certified_count)
+                    SELECT v.project_type, v.status, SUM(v.loan_count), SUM(v.scored_count),
+                           SUM(v.eco_score_sum), SUM(v.carbon_sum), SUM(v.loan_amount_sum),
+                           SUM(v.certified_count)
+                    FROM (VALUES %s) AS v(project_type, status, recorded_at, loan_count, scored_count,
+                                          eco_score_sum, carbon_sum, loan_amount_sum, certified_count)
+                    WHERE to_timestamp(v.recorded_at) > COALESCE(
+                        (SELECT MAX(reconciled_at) FROM portfolio_rollups)::timestamptz, '-infinity'
+                    )
+                    GROUP BY v.project_type, v.status
+                    ORDER BY v.project_type, v.status
+                    ON CONFLICT (project_type, status) DO UPDATE SET
+                        loan_count = portfolio_rollups.loan_count + EXCLUDED.loan_count,
+                        scored_count = portfolio_rollups.scored_count + EXCLUDED.scored_count,
+                        eco_score_sum = portfolio_rollups.eco_score_sum + EXCLUDED.eco_score_sum,
+                        carbon_sum = portfolio_rollups.carbon_sum + EXCLUDED.carbon_sum,
+                        loan_amount_sum = portfolio_rollups.loan_amount_sum + EXCLUDED.loan_amount_sum,
+                        certified_count = portfolio_rollups.certified_count + EXCLUDED.certified_count,
+                        updated_at = CURRENT_TIMESTAMP
+                """, rows, template="(%s, %s, %s::float8, %s::bigint, %s::bigint, %s::numeric, %s::numeric, %s::numeric, %s::bigint)",
+                    page_size=max(len(rows), 1))
+                conn.commit()
+                return True
+            except Exception as e:
+                print(f"Error applying portfolio rollups: {e}")
+                conn.rollback()
+                return False
+            finally:
+                cursor.close()
+
+    @staticmethod
+    def reconcile(max_age=None):
+        """Rebuild every rollup row from loans and incentives in one transaction.
+
+        Skipped (returns False) when another process is reconciling or the
+        rollups were rebuilt less than `max_age` seconds ago. reconciled_at is
+        the rebuild statement's start, just before its snapshot; apply_deltas
+        drops buffered deltas recorded earlier, so a write is only counted
+        twice (or missed) if it lands within a STAMP_RESOLUTION slice of the
+        rebuild; process clocks are assumed NTP-synced with the database.
+        The next rebuild corrects either.
+        """
+        with DatabaseConfig.postgres_connection() as conn:
+            if not conn:
+                return False
+
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT pg_try_advisory_xact_lock(%s)", (RECONCILE_LOCK_ID,))
+                if not cursor.fetchone()[0]:
+                    conn.rollback()
+                    return False
+                if max_age is not None:
+                    cursor.execute("""
+                        SELECT MIN(reconciled_at) > CURRENT_TIMESTAMP - %s * INTERVAL '1 second'
+                        FROM portfolio_rollups
+                    """, (max_age,))
+                    if cursor.fetchone()[0]:
+                        conn.rollback()
+                        return False
+
+                # Writers' incremental upserts wait until the rebuild commits
+                cursor.execute("LOCK TABLE portfolio_rollups IN EXCLUSIVE MODE")
+                cursor.execute("DELETE FROM portfolio_rollups")
+                cursor.execute("""
+                    INSERT INTO portfolio_rollups
+                    (project_type, status, loan_count, scored_count, eco_score_sum,
+                     carbon_sum, loan_amount_sum, certified_count, reconciled_at, updated_at)
+                    SELECT COALESCE(l.project_type, %s), COALESCE(l.status, 'pending'),
+                           COUNT(*), COUNT(l.eco_score), COALESCE(SUM(l.eco_score), 0),
+                           COALESCE(SUM(l.predicted_carbon_reduction), 0), COALESCE(SUM(l.loan_amount), 0),
+                           COUNT(c.loan_id), statement_timestamp(), CURRENT_TIMESTAMP
+                    FROM loans l
+                    LEFT JOIN (
+                        SELECT DISTINCT loan_id FROM incentives
+                        WHERE incentive_type = 'certification' AND status = 'certified'
+                    ) c ON c.loan_id = l.loan_id
+                    GROUP BY 1, 2
+                """, (UNSPECIFIED,))
+                groups = cursor.rowcount
+                conn.commit()
+                print(f"📊 Reconciled portfolio rollups ({groups} groups)")
+                return True
+            except Exception as e:
+                print(f"Error reconciling portfolio rollups: {e}")
+                conn.rollback()
+                return False
+            finally:
+                cursor.close()
+
+    @staticmethod
+    def get_rollups():
+        """All rollup rows; one per (project_type, status), independent of loan count"""
+        with DatabaseConfig.postgres_connection() as conn:
+            if not conn:
+                return None
+
+            cursor = conn.cursor()
+            try:
+                cursor.execute("""
+                    SELECT project_type, status, loan_count, scored_count, eco_score_sum,
+                           carbon_sum, loan_amount_sum, certified_count, reconciled_at
+                    FROM portfolio_rollups
+                    ORDER BY project_type, status
+                """)
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+
+        return [
+            {
+                'project_type': row[0],
+                'status': row[1],
+                'loan_count': row[2],
+                'scored_count': row[3],
+                'eco_score_sum': float(row[4]),
+                'carbon_sum': float(row[5]),
+                'loan_amount_sum': float(row[6]),
+                'certified_count': row[7],
+                'reconciled_at': row[8].isoformat() if row[8] else None
+            }
+            for row in rows
+        ]
+
+
+# Deltas from every write path in this process, flushed by start()ed services
+portfolio_rollups = PortfolioRollups(
+    Portfolio.apply_deltas,
+    Portfolio.reconcile,
+    flush_interval=float(os.getenv('PORTFOLIO_FLUSH_INTERVAL', 1.0)),
+    reconcile_interval=float(os.getenv('PORTFOLIO_RECONCILE_INTERVAL', 900))
+)
@@ -1,12 +1,265 @@
-import paho.mqtt.client as mqtt
-import time
+"""IoT load generator: simulated devices publishing carbon readings over MQTT.
+
+Devices are spread across loans and worker processes; each process runs its
+own MQTT connection and paces publishes in 10 ms ticks, so one box can push
+tens of thousands of messages per second. Every payload carries `sent_at`,
+which the backend echoes in `iot_update` socket events; with --socket-url
+the generator subscribes to those events and reports end-to-end latency.
+
+Examples:
+    python mqtt_simulator.py                      # 10 devices, 1 msg/s, until Ctrl+C
+    python mqtt_simulator.py --devices 20000 --loans 5000 --rate 50000 \\
+        --processes 8 --duration 60 --socket-url http://localhost:5000
+    python mqtt_simulator.py --rate 2000 --burst-every 30 --burst-factor 10 \\
+        --burst-duration 5 --qos 1 --payload-bytes 512 --output run.json
+"""
+import argparse
 import json
+import multiprocessing as mp
 import random
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+TOPIC = 'ecoscore/iot/updates'
+TICK = 0.01
+
+
+def percentile(samples, pct):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def loan_ids_for(args):
+    if args.loan_ids:
+        return [loan_id.strip() for loan_id in args.loan_ids.split(',') if loan_id.strip()]
+    return [f'{args.loan_prefix}{index}' for index in range(1, args.loans + 1)]
+
+
+class CarbonWalk:
+    """Mean-reverting random walk per device, so readings drift like a real
+    sensor instead of jumping uniformly between bounds"""
+
+    def __init__(self, count, rng, low=1000.0, high=2000.0, volatility=0.02, reversion=0.05):
+        self.low = low
+        self.high = high
+        self.mean = (low + high) / 2
+        self.volatility = volatility * (high - low)
+        self.reversion = reversion
+        self.values = [rng.uniform(low, high) for _ in range(count)]
+        self.rng = rng
+
+    def step(self, index):
+        value = self.values[index]
+        value += self.reversion * (self.mean - value) + self.rng.gauss(0, self.volatility)
+        value = max(0.0, value)
+        self.values[index] = value
+        return value
+
+
+def rate_at(args, elapsed, share):
+    """Per-process target rate at `elapsed` seconds, including bursts"""
+    rate = args.rate * share
+    if args.burst_every and elapsed % args.burst_every < args.burst_duration:
+        rate *= args.burst_factor
+    return rate
+
+
+def publisher(index, args, devices, loan_ids, share, started_at, results):
+    """One worker process: its own MQTT connection and slice of the fleet"""
+    rng = random.Random(args.seed + index)
+    walk = CarbonWalk(len(devices), rng)
+    padding = 'x' * max(0, args.payload_bytes - 160) if args.payload_bytes else None
+
+    client = mqtt.Client(client_id=f'ecoscore-loadgen-{index}-{rng.getrandbits(32):08x}', clean_session=True)
+    client.max_inflight_messages_set(args.max_inflight)
+    client.max_queued_messages_set(0)
+    client.connect(args.broker, args.port, keepalive=60)
+    client.loop_start()
+    time.sleep(max(0.0, started_at - time.time()))
+
+    sent, errors, seq, cursor, carry = 0, 0, 0, 0, 0.0
+    per_second = {}
+    deadline = started_at + args.duration if args.duration else None
+    next_tick = started_at
+    try:
+        while deadline is None or time.time() < deadline:
+            now = time.time()
+            carry += rate_at(args, now - started_at, share) * TICK
+            burst, carry = int(carry), carry - int(carry)
+            published = 0
+            for _ in range(burst):
+                device = devices[cursor]
+                value = walk.step(cursor)
+                cursor = (cursor + 1) % len(devices)
+                seq += 1
+                payload = {
+                    'loan_id': loan_ids[device % len(loan_ids)],
+                    'device_id': f'device-{device}',
+                    'seq': seq,
+                    'carbon_est': value / 40,
+                    'predicted_carbon_reduction': round(value, 2),
+                    'sent_at': time.time(),
+                }
+                if padding:
+                    payload['padding'] = padding
+                info = client.publish(TOPIC, json.dumps(payload), qos=args.qos)
+                if info.rc == mqtt.MQTT_ERR_SUCCESS:
+                    published += 1
+                else:
+                    errors += 1
+            sent += published
+            second = int(now - started_at)
+            per_second[second] = per_second.get(second, 0) + published
+            next_tick += TICK
+            delay = next_tick - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -1:
+                next_tick = time.time()  # far behind: report the shortfall rather than spin
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.loop_stop()
+        client.disconnect()
+        results.put({'index': index, 'sent': sent, 'errors': errors, 'per_second': per_second})
+
+
+class LatencyProbe:
+    """Socket.IO client timing publish -> iot_update for every echoed sent_at"""
+
+    def __init__(self, url, portfolio='all'):
+        import socketio
+
+        self.latencies_ms = []
+        self.events = 0
+        self._lock = threading.Lock()
+        self.client = socketio.Client(reconnection=True)
+        # Portfolio rooms batch each interval's updates: {'updates': {loan_id: update}}
+        self.client.on('iot_update_batch', self._on_batch)
+        self.client.on('connect', lambda: self.client.emit('subscribe', {'portfolio': portfolio}))
+        self.client.connect(url, transports=['websocket'])
+
+    def _on_update(self, data):
+        received_at = time.time()
+        with self._lock:
+            self.events += 1
+            if data.get('sent_at'):
+                self.latencies_ms.append((received_at - data['sent_at']) * 1000)
+
+    def _on_batch(self, data):
+        for update in data['updates'].values():
+            self._on_update(update)
+
+    def close(self):
+        self.client.disconnect()
+
+    def report(self):
+        with self._lock:
+            samples = list(self.latencies_ms)
+        return {
+            'events': self.events,
+            'samples': len(samples),
+            'p50_ms': percentile(samples, 50),
+            'p90_ms': percentile(samples, 90),
+            'p99_ms': percentile(samples, 99),
+            'max_ms': max(samples) if samples else None,
+        }
+
+
+def main(args):
+    loan_ids = loan_ids_for(args)
+    processes = max(1, min(args.processes, args.devices))
+    probe = LatencyProbe(args.socket_url) if args.socket_url else None
+
+    results = mp.Queue()
+    started_at = time.time() + 1.0  # let every worker connect before the clock starts
+    workers = []
+    for index in range(processes):
+        devices = list(range(index, args.devices, processes))
+        worker = mp.Process(
+            target=publisher,
+            args=(index, args, devices, loan_ids, len(devices) / args.devices, started_at, results),
+            daemon=True
+        )
+        worker.start()
+        workers.append(worker)
+    print(f"🚀 {args.devices} devices across {len(loan_ids)} loans, {processes} processes, "
+          f"target {args.rate:,.0f} msgs/s{' for ' + str(args.duration) + 's' if args.duration else ''}")
+
+    reports = []
+    try:
+        while len(reports) < processes:
+            reports.append(results.get())
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.join(5)
+        while not results.empty():
+            reports.append(results.get())
+    for worker in workers:
+        worker.join(5)
+
+    if probe:
+        time.sleep(args.drain)  # in-flight updates still being scored and emitted
+        probe.close()
+
+    per_second = {}
+    for report in reports:
+        for second, count in report['per_second'].items():
+            per_second[second] = per_second.get(second, 0) + count
+    sent = sum(report['sent'] for report in reports)
+    elapsed = max(per_second) + 1 if per_second else 0
+    summary = {
+        'config': {key: value for key, value in vars(args).items() if key != 'loan_ids'},
+        'sent': sent,
+        'errors': sum(report['errors'] for report in reports),
+        'elapsed_s': elapsed,
+        'throughput_msgs_per_s': sent / elapsed if elapsed else 0.0,
+        'per_second_p50': percentile(list(per_second.values()), 50),
+        'per_second_min': min(per_second.values()) if per_second else None,
+        'latency': probe.report() if probe else None,
+    }
+
+    print(f"📤 Sent {summary['sent']:,} messages ({summary['errors']} errors) in {elapsed}s: "
+          f"{summary['throughput_msgs_per_s']:,.0f} msgs/s")
+    if probe:
+        latency = summary['latency']
+        if latency['samples']:
+            print(f"⏱️ publish -> iot_update over {latency['samples']:,} events: "
+                  f"p50 {latency['p50_ms']:.1f} ms, p90 {latency['p90_ms']:.1f} ms, "
+                  f"p99 {latency['p99_ms']:.1f} ms, max {latency['max_ms']:.1f} ms")
+        else:
+            print("⚠️ No iot_update events received; is the backend consuming the topic?")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2)
+        print(f"Wrote {args.output}")
+    return summary
 
-client = mqtt.Client()
-client.connect('localhost', 1883)
 
-while True:
-  data = {'loan_id': 'test-loan', 'carbon_est': random.uniform(5, 50), 'predicted_carbon_reduction': random.uniform(1000, 2000)}
-  client.publish('ecoscore/iot/updates', json.dumps(data))
-  time.sleep(10)  # Simulate periodic updates
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Simulate IoT devices publishing carbon readings')
+    parser.add_argument('--broker', default='localhost')
+    parser.add_argument('--port', type=int, default=1883)
+    parser.add_argument('--devices', type=int, default=10)
+    parser.add_argument('--loans', type=int, default=10, help='loans the devices are spread across')
+    parser.add_argument('--loan-prefix', default='test-loan-', help='loan ids are <prefix>1..<prefix>M')
+    parser.add_argument('--loan-ids', help='comma-separated loan ids (overrides --loans/--loan-prefix)')
+    parser.add_argument('--rate', type=float, default=1.0, help='messages per second across all devices')
+    parser.add_argument('--duration', type=float, default=0, help='seconds to run (0 = until Ctrl+C)')
+    parser.add_argument('--processes', type=int, default=1, help='publisher processes')
+    parser.add_argument('--qos', type=int, choices=(0, 1, 2), default=0)
+    parser.add_argument('--max-inflight', type=int, default=1000, help='unacknowledged QoS 1/2 messages per process')
+    parser.add_argument('--payload-bytes', type=int, default=0, help='pad payloads to roughly this size')
+    parser.add_argument('--burst-every', type=float, default=0, help='seconds between bursts (0 = none)')
+    parser.add_argument('--burst-duration', type=float, default=5)
+    parser.add_argument('--burst-factor', type=float, default=5, help='rate multiplier during a burst')
+    parser.add_argument('--socket-url', help='backend URL to time publish -> iot_update latency')
+    parser.add_argument('--drain', type=float, default=5, help='seconds to keep listening after publishing')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the summary as JSON')
+    main(parser.parse_args())
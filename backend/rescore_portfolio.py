@@ -0,0 +1,50 @@
+"""Re-score the whole loan book after a model update.
+
+Usage: python rescore_portfolio.py [--chunk-size 10000] [--checkpoint rescore.ckpt] [--restart]
+"""
+import argparse
+import os
+
+import numpy as np
+from dotenv import load_dotenv
+
+from models.portfolio import portfolio_rollups
+from services.certification import CertificationQueue
+from services.inference import create_backend
+from services.rescoring import rescore_portfolio, stored_reading_windows
+
+load_dotenv()
+
+parser = argparse.ArgumentParser(description='Re-score every loan with the current model')
+parser.add_argument('--chunk-size', type=int, default=10000, help='loans per fetch/inference/update chunk')
+parser.add_argument('--inference-batch', type=int, default=1024, help='rows per forward pass')
+parser.add_argument('--backend', help='keras, torchscript or onnx (default: MODEL_BACKEND)')
+parser.add_argument('--checkpoint', default='rescore.ckpt', help='resume checkpoint file')
+parser.add_argument('--restart', action='store_true', help='ignore the checkpoint a crashed run left behind')
+parser.add_argument('--no-certify', action='store_true', help='do not queue on-chain certifications')
+args = parser.parse_args()
+
+if args.restart and os.path.exists(args.checkpoint):
+    os.remove(args.checkpoint)
+
+model_backend = create_backend(args.backend)
+
+
+def predict_scores(batch):
+    return np.concatenate([
+        model_backend.predict(batch[start:start + args.inference_batch])
+        for start in range(0, len(batch), args.inference_batch)
+    ])
+
+
+# Enqueue only: the backend's certification workers submit the transactions
+certification_queue = None if args.no_certify else CertificationQueue(certifier=None)
+
+# Loans with stored IoT readings are scored on their recent history
+reading_window = stored_reading_windows()
+
+rescore_portfolio(predict_scores, chunk_size=args.chunk_size, checkpoint_path=args.checkpoint,
+                  certification_queue=certification_queue,
+                  readings=reading_window.sequence if reading_window is not None else None)
+# Score deltas were summed per portfolio group in memory; write them once
+portfolio_rollups.flush()
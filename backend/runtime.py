@@ -0,0 +1,319 @@
+"""Backend components and their lifecycle, shared by app.py's factory.
+
+Constructing a BackendRuntime is cheap: nothing connects, loads or starts.
+The model loads on first predict (or in the background with MODEL_WARMUP=1),
+the Hedera SDK on the first certification, and Mongo/MQTT connect from a
+background thread in start(). Schema changes are not applied here at all;
+run `python migrate.py` once per deploy (AUTO_MIGRATE=1 does it on start for
+local development).
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from config.database import DatabaseConfig
+from models.loan import Loan
+from models.milestone import Milestone
+from models.portfolio import portfolio_rollups
+from services.certification import CertificationBatcher, CertificationQueue
+from services.fakes import FakeHederaCertifier, FakeMQTTClient, InProcessBroker
+from services.hedera import HederaCertifier
+from services.inference import create_backend
+from services.iot import IOT_TOPIC, IoTProcessor
+from services.loan_cache import loan_caches
+from services.loan_import import score_imported
+from services.milestones import MilestoneEngine
+from services.prediction_cache import PredictionCache
+from services.realtime import RoomEmitter, rooms_for_loan
+from services.scoring import ScoringEngine
+from services.timeseries import ReadingStore, ReadingWindow
+from services.write_behind import ScoreWriteBuffer
+
+
+class BackendRuntime:
+    """Everything the Flask app needs besides routes: scoring, persistence,
+    certification, IoT ingestion, milestones and realtime fan-out.
+
+    start() and stop() are the lifecycle hooks; both are idempotent.
+    liveness() says the process is serving, readiness() whether its
+    dependencies are usable (schema migrated, MQTT connected, model loaded
+    when warmup was requested).
+    """
+
+    def __init__(self, socketio):
+        self.socketio = socketio
+        self.started = False
+        self._lock = threading.Lock()
+        self._iot_thread = None
+        # Background scoring of uploaded loans (POST /api/loans/import?score=1):
+        # a few workers and a cap on queued jobs, so uploads can't pile up threads
+        self._import_executor = None
+        self._import_slots = threading.BoundedSemaphore(int(os.getenv('IMPORT_SCORING_MAX_PENDING', 4)))
+
+        # Room-scoped emits; high-frequency updates are merged per room per interval
+        self.emitter = RoomEmitter(socketio, interval_ms=float(os.getenv('SOCKETIO_THROTTLE_MS', 250)))
+
+        # HEDERA_FAKE=1 certifies against an in-process fake; the real
+        # certifier only imports the SDK on its first transaction
+        certifier = FakeHederaCertifier() if os.getenv('HEDERA_FAKE') == '1' else HederaCertifier.from_env()
+        # Certification runs off the scoring path, through a queue in the incentives table
+        self.certification_queue = CertificationQueue(
+            certifier,
+            workers=int(os.getenv('CERTIFICATION_WORKERS', 4)),
+            max_attempts=int(os.getenv('CERTIFICATION_MAX_ATTEMPTS', 8)),
+            on_certified=self.emit_certified,
+            # HEDERA_BATCH_SIZE > 1 submits certifyLoans batches
+            batcher=CertificationBatcher.from_env()
+        )
+
+        # MODEL_BACKEND selects keras, torchscript, onnx or fake; nothing is
+        # imported or loaded until the first prediction
+        self.model_backend = create_backend()
+
+        # Memoized predictions, keyed by model version + quantized input sequence
+        self.prediction_cache = None
+        if os.getenv('PREDICTION_CACHE_ENABLED', '1') == '1':
+            self.prediction_cache = PredictionCache(
+                lambda: self.model_backend.version,
+                redis_client=DatabaseConfig.get_redis_client() if os.getenv('PREDICTION_CACHE_REDIS', '1') == '1' else None,
+                max_size=int(os.getenv('PREDICTION_CACHE_SIZE', 100000)),
+                ttl=int(os.getenv('PREDICTION_CACHE_TTL', 3600)),
+                quantum=float(os.getenv('PREDICTION_CACHE_QUANTUM', 0.01))
+            )
+
+        # Micro-batching inference shared by the MQTT path and the score endpoint
+        self.scoring_engine = ScoringEngine(
+            self.predict_scores,
+            max_batch_size=int(os.getenv('SCORING_MAX_BATCH', 64)),
+            max_wait_ms=float(os.getenv('SCORING_MAX_WAIT_MS', 20)),
+            cache=self.prediction_cache
+        )
+
+        # Optional write-behind for score updates: the latest score per loan is
+        # committed in grouped bulk UPDATEs instead of one transaction per update
+        self.score_writer = None
+        if os.getenv('SCORE_WRITE_BEHIND') == '1':
+            self.score_writer = ScoreWriteBuffer(
+                Loan.bulk_update_scores,
+                Loan.update_score,
+                max_pending=int(os.getenv('SCORE_WRITE_BEHIND_MAX_PENDING', 50000)),
+                flush_size=int(os.getenv('SCORE_WRITE_BEHIND_FLUSH_SIZE', 2000)),
+                flush_interval_ms=float(os.getenv('SCORE_WRITE_BEHIND_FLUSH_MS', 200)),
+                block_timeout=float(os.getenv('SCORE_WRITE_BEHIND_BLOCK_TIMEOUT', 1.0))
+            )
+
+        # The last 12 readings per loan are held in memory so inference sees a
+        # real sequence; raw readings also go to Mongo once the store is up
+        self.reading_window = ReadingWindow()
+        self.reading_store = None
+
+        # Every reading is checked against an in-memory index of open milestones;
+        # progress and achievements are written in batches
+        self.milestones = None
+        if os.getenv('MILESTONES_ENABLED', '1') == '1':
+            self.milestones = MilestoneEngine(
+                Milestone.load_open,
+                Milestone.bulk_update_progress,
+                Milestone.mark_achieved_many,
+                self.emitter,
+                flush_interval_ms=float(os.getenv('MILESTONE_FLUSH_MS', 500)),
+                refresh_interval=float(os.getenv('MILESTONE_REFRESH_INTERVAL', 30)),
+                refresh_overlap=int(os.getenv('MILESTONE_REFRESH_OVERLAP', 1000))
+            )
+
+        # Readings are coalesced per loan, then scored on loan-sharded workers
+        self.iot = IoTProcessor(
+            Loan.get_by_id,
+            self.scoring_engine.score,
+            self.save_score,
+            self.emitter,
+            self.reading_window,
+            enqueue_certification=self.certification_queue.enqueue,
+            milestones=self.milestones,
+            workers=int(os.getenv('INGEST_WORKERS', 16)),
+            queue_size=int(os.getenv('INGEST_QUEUE_SIZE', 10000)),
+            block_timeout=float(os.getenv('INGEST_BLOCK_TIMEOUT', 1.0)),
+            coalesce_window_ms=float(os.getenv('COALESCE_WINDOW_MS', 1000)),
+            coalesce_tolerance=float(os.getenv('COALESCE_TOLERANCE', 0)),
+            log_updates=os.getenv('IOT_LOG_UPDATES', '1') == '1'
+        )
+
+        # MQTT_FAKE=1 uses an in-process broker
+        if os.getenv('MQTT_FAKE') == '1':
+            self.mqtt_client = FakeMQTTClient(InProcessBroker())
+        else:
+            import paho.mqtt.client as mqtt
+            self.mqtt_client = mqtt.Client()
+        self.mqtt_client.on_message = self.iot.on_message
+        self.mqtt_client.on_connect = self._on_mqtt_connect
+        # With MQTT_SHARED_GROUP set, backend processes split the topic between them
+        shared_group = os.getenv('MQTT_SHARED_GROUP')
+        self.subscription = f'$share/{shared_group}/{IOT_TOPIC}' if shared_group else IOT_TOPIC
+
+    # --- lifecycle ---
+
+    def start(self):
+        """Start background workers; slow connections finish in the background"""
+        with self._lock:
+            if self.started:
+                return self
+            if os.getenv('AUTO_MIGRATE') == '1':
+                DatabaseConfig.init_postgres_tables()
+            self.emitter.start()
+            self.scoring_engine.start()
+            if self.score_writer is not None:
+                self.score_writer.start()
+            if self.milestones is not None:
+                self.milestones.start()
+            self.iot.start()
+            self.certification_queue.start()
+            # Flushes portfolio rollup deltas and reconciles them against Postgres
+            portfolio_rollups.start()
+            if os.getenv('MODEL_WARMUP') == '1':
+                threading.Thread(target=self.model_backend.warmup, name='model-warmup', daemon=True).start()
+            self._iot_thread = threading.Thread(target=self._connect_iot, name='iot-connect', daemon=True)
+            self._iot_thread.start()
+            self._import_executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv('IMPORT_SCORING_WORKERS', 1)), thread_name_prefix='import-scoring'
+            )
+            self.started = True
+        return self
+
+    def stop(self):
+        """Stop consuming, then drain and flush every buffer"""
+        with self._lock:
+            if not self.started:
+                return
+            self.started = False
+            try:
+                self.mqtt_client.loop_stop()
+                self.mqtt_client.disconnect()
+            except Exception as e:
+                print(f"MQTT disconnect failed: {e}")
+            # Queued import scoring is dropped; a running job finishes first
+            self._import_executor.shutdown(wait=True, cancel_futures=True)
+            self._import_executor = None
+            self.iot.stop()
+            if self.milestones is not None:
+                self.milestones.stop()
+            if self.reading_store is not None:
+                self.reading_store.stop()
+            self.scoring_engine.stop()
+            if self.score_writer is not None:
+                self.score_writer.stop()
+            self.certification_queue.stop()
+            portfolio_rollups.stop()
+            self.emitter.stop()
+
+    def _connect_iot(self):
+        """Set up the Mongo reading store, then start consuming MQTT"""
+        if os.getenv('IOT_STORE_ENABLED', '1') == '1':
+            mongo_db = DatabaseConfig.get_mongodb_client()
+            if mongo_db is not None:
+                reading_store = ReadingStore(
+                    mongo_db,
+                    batch_size=int(os.getenv('IOT_STORE_BATCH', 500)),
+                    flush_interval=float(os.getenv('IOT_STORE_FLUSH_INTERVAL', 1.0))
+                )
+                try:
+                    reading_store.ensure_collection()
+                    print(f"📚 Rebuilt reading windows for {reading_store.rebuild_window(self.reading_window)} loans")
+                except Exception as e:
+                    print(f"MongoDB reading store setup failed: {e}")
+                self.reading_store = self.iot.reading_store = reading_store.start()
+
+        try:
+            # loop_start() reconnects on its own; on_connect (re)subscribes
+            self.mqtt_client.connect_async(os.getenv('MQTT_BROKER', 'localhost'), int(os.getenv('MQTT_PORT', 1883)))
+            self.mqtt_client.loop_start()
+        except Exception as e:
+            print(f"❌ Failed to connect to MQTT Broker: {e}")
+
+    def _on_mqtt_connect(self, client, userdata, flags, rc):
+        if rc == 0:
+            client.subscribe(self.subscription)
+            print(f"📡 MQTT connected and subscribed to {self.subscription}")
+        else:
+            print(f"❌ MQTT connection refused (rc={rc})")
+
+    # --- health ---
+
+    def liveness(self):
+        return {'alive': True, 'started': self.started}
+
+    def readiness(self):
+        """(ready, checks): every check must pass before taking traffic"""
+        checks = {
+            'started': self.started,
+            'postgres_schema': DatabaseConfig.schema_ready(),
+            'mqtt': self.mqtt_client.is_connected(),
+            # Without warmup the model loads on first use, which is allowed
+            'model': self.model_backend.loaded or os.getenv('MODEL_WARMUP') != '1',
+        }
+        return all(checks.values()), checks
+
+    # --- operations used by the routes ---
+
+    def predict_scores(self, batch):
+        """Vectorized forward pass: (N, 12, F) sequences -> (N,) eco scores"""
+        return self.model_backend.predict(batch)
+
+    def save_score(self, loan_id, eco_score, carbon_value, sync=False):
+        """Persist a score; sync=True guarantees it is committed on return"""
+        if self.score_writer is None:
+            return Loan.update_score(loan_id, eco_score, carbon_value)
+        if sync:
+            return self.score_writer.write_through(loan_id, eco_score, carbon_value)
+        return self.score_writer.submit(loan_id, eco_score, carbon_value)
+
+    def score_imported_async(self, loan_ids):
+        """Score imported loans on the import executor; returns False when the
+        runtime is stopped or IMPORT_SCORING_MAX_PENDING jobs are already queued"""
+        if not self._import_slots.acquire(blocking=False):
+            return False
+        if self.score_writer is not None:
+            # Buffered IoT scores must not overwrite these afterwards
+            self.score_writer.discard(loan_ids)
+        try:
+            with self._lock:
+                if self._import_executor is None:
+                    raise RuntimeError('runtime is stopped')
+                future = self._import_executor.submit(
+                    score_imported, self.predict_scores, loan_ids,
+                    certification_queue=self.certification_queue, readings=self.reading_window.sequence
+                )
+        except RuntimeError:
+            self._import_slots.release()
+            return False
+        future.add_done_callback(self._import_done)
+        return True
+
+    def _import_done(self, future):
+        self._import_slots.release()
+        if not future.cancelled() and future.exception() is not None:
+            print(f"Scoring imported loans failed: {future.exception()}")
+
+    def emit_certified(self, loan_id, eco_score, tx_id):
+        loan = Loan.get_by_id(loan_id)
+        self.emitter.emit_now(
+            'loan_certified',
+            {'loan_id': loan_id, 'eco_score': eco_score, 'tx_id': tx_id},
+            rooms_for_loan(loan_id, loan['project_type'] if loan else None)
+        )
+
+    def metrics(self):
+        """Per-component metrics, as reported by /health and /metrics"""
+        return {
+            'postgres_pool': DatabaseConfig.get_postgres_pool().metrics(),
+            'realtime': self.emitter.metrics(),
+            'coalescer': self.iot.coalescer.metrics(),
+            'readings': self.reading_store.metrics() if self.reading_store else None,
+            'ingestion': self.iot.ingestion.metrics(),
+            'score_writes': self.score_writer.metrics() if self.score_writer else None,
+            'prediction_cache': self.prediction_cache.metrics() if self.prediction_cache else None,
+            'scoring': self.scoring_engine.metrics(),
+            'certification': self.certification_queue.metrics(),
+            'milestones': self.milestones.metrics() if self.milestones else None,
+            'portfolio_rollups': portfolio_rollups.metrics(),
+            'cache': loan_caches.metrics(),
+        }
@@ -0,0 +1,5 @@
+from .metrics import Counter, Histogram
+from .scoring import ScoringEngine, build_features, build_sequence, build_reading_sequence
+
+__all__ = ['Counter', 'Histogram', 'ScoringEngine', 'build_features', 'build_sequence',
+           'build_reading_sequence']
@@ -0,0 +1,233 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from .metrics import Counter
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe in-process LRU with per-entry TTL"""
+
+    def __init__(self, max_size=10000, ttl=5.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.invalidated = False
+
+
+class TieredCache:
+    """Read-through cache: in-process LRU, then Redis, then the loader.
+
+    Values are stored as JSON in both tiers so callers always get a private
+    copy. Concurrent misses on the same key share a single loader call
+    (single-flight), so a hot key expiring never stampedes the database.
+    A load that an invalidate() overlaps is returned but not left cached,
+    since it may have read the data before the write. The local tier uses a short TTL because other processes can only
+    invalidate the Redis tier.
+    """
+
+    def __init__(self, name, redis_client=None, ttl=60, local_ttl=5.0, local_size=10000):
+        self.name = name
+        self.redis = redis_client
+        self.ttl = ttl
+        self.local = LRUCache(max_size=local_size, ttl=local_ttl)
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+
+        self.local_hits = Counter()
+        self.redis_hits = Counter()
+        self.misses = Counter()
+        self.coalesced = Counter()
+        self.invalidations = Counter()
+        self.redis_errors = Counter()
+
+    def _redis_key(self, key):
+        return f"ecoscore:{self.name}:{key}"
+
+    def _redis_get(self, key):
+        if self.redis is None:
+            return None
+        try:
+            return self.redis.get(self._redis_key(key))
+        except Exception:
+            self.redis_errors.inc()
+            return None
+
+    def _redis_set(self, key, raw):
+        if self.redis is None:
+            return
+        try:
+            self.redis.set(self._redis_key(key), raw, ex=self.ttl)
+        except Exception:
+            self.redis_errors.inc()
+
+    def get_or_load(self, key, loader):
+        """Return the cached value for key, calling loader() once on a miss.
+
+        None results are not cached.
+        """
+        raw = self.local.get(key)
+        if raw is not None:
+            self.local_hits.inc()
+            return json.loads(raw)
+
+        raw = self._redis_get(key)
+        if raw is not None:
+            self.redis_hits.inc()
+            self.local.set(key, raw)
+            return json.loads(raw)
+
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            self.coalesced.inc()
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return json.loads(flight.value) if flight.value is not None else None
+
+        self.misses.inc()
+        raw = None
+        try:
+            value = loader()
+            raw = json.dumps(value) if value is not None else None
+            if raw is not None:
+                self.local.set(key, raw)
+                self._redis_set(key, raw)
+            flight.value = raw
+            return value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._flights_lock:
+                self._flights.pop(key, None)
+                invalidated = flight.invalidated
+            if invalidated and raw is not None:
+                # invalidate() ran during the load; its deletes may have landed before our set
+                self._delete(key)
+            flight.done.set()
+
+    def invalidate(self, *keys):
+        if not keys:
+            return
+        with self._flights_lock:
+            for key in keys:
+                flight = self._flights.get(key)
+                if flight is not None:
+                    flight.invalidated = True
+        self.invalidations.inc(len(keys))
+        self._delete(*keys)
+
+    def _delete(self, *keys):
+        for key in keys:
+            self.local.delete(key)
+        if self.redis is None:
+            return
+        try:
+            self.redis.delete(*[self._redis_key(key) for key in keys])
+        except Exception:
+            self.redis_errors.inc()
+
+    def metrics(self):
+        hits = self.local_hits.value + self.redis_hits.value
+        lookups = hits + self.misses.value
+        return {
+            'local_hits': self.local_hits.value,
+            'redis_hits': self.redis_hits.value,
+            'misses': self.misses.value,
+            'coalesced': self.coalesced.value,
+            'invalidations': self.invalidations.value,
+            'redis_errors': self.redis_errors.value,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            'local_size': len(self.local),
+        }
+
+
+class CacheGeneration:
+    """Shared version number used to invalidate a whole family of keys at once
+    (e.g. every cached page of the loan list) by bumping it.
+
+    The Redis value is re-read at most every `local_ttl` seconds, so other
+    processes' bumps take up to that long to be seen; this process's own
+    bumps are seen at once.
+    """
+
+    def __init__(self, name, redis_client=None, local_ttl=1.0):
+        self.name = name
+        self.redis = redis_client
+        self.local_ttl = local_ttl
+        self._local = 0
+        self._shared = 0
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def _redis_key(self):
+        return f"ecoscore:{self.name}:generation"
+
+    def current(self):
+        if self.redis is None:
+            return self._local
+        if time.monotonic() >= self._expires_at:
+            try:
+                self._shared = int(self.redis.get(self._redis_key()) or 0)
+            except Exception:
+                return self._local
+            self._expires_at = time.monotonic() + self.local_ttl
+        return self._shared
+
+    def bump(self):
+        with self._lock:
+            self._local += 1
+        if self.redis is not None:
+            try:
+                self._shared = int(self.redis.incr(self._redis_key()))
+                self._expires_at = time.monotonic() + self.local_ttl
+            except Exception:
+                pass
@@ -0,0 +1,239 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from models.incentive import Incentive
+from .metrics import Counter, stages
+
+# The contract only certifies integer scores above this value
+CERTIFICATION_THRESHOLD = 80
+
+
+# certifyLoans gas: a fixed part plus a worst-case per-loan part (first
+# certification of the loan, all-nonzero calldata); benchmarks/certification_gas.py
+# checks both against the EVM gas schedule
+BATCH_BASE_GAS = 25000
+PER_LOAN_GAS = 26000
+
+
+def is_certifiable(eco_score):
+    return eco_score is not None and int(eco_score) > CERTIFICATION_THRESHOLD
+
+
+class CertificationBatcher:
+    """Packs certifications into certifyLoans transactions.
+
+    A batch holds at most `max_batch` loans and its gas estimate never
+    exceeds `max_gas`; each transaction's gas limit is the estimate for its
+    own size. Hedera charges at least 80% of the gas limit, so a limit sized
+    to the batch matters as much as sharing the transaction overhead. The
+    default max_batch keeps transactions under Hedera's 6 KiB size limit
+    (each loan adds 96 bytes of calldata).
+    """
+
+    def __init__(self, max_batch=50, max_gas=1500000, base_gas=BATCH_BASE_GAS, per_loan_gas=PER_LOAN_GAS):
+        self.max_batch = max_batch
+        self.max_gas = max_gas
+        self.base_gas = base_gas
+        self.per_loan_gas = per_loan_gas
+        self.capacity = max(1, min(max_batch, (max_gas - base_gas) // per_loan_gas))
+
+    @staticmethod
+    def from_env():
+        """Batcher from HEDERA_BATCH_SIZE / HEDERA_BATCH_MAX_GAS, or None when batching is off"""
+        max_batch = int(os.getenv('HEDERA_BATCH_SIZE', 1))
+        if max_batch <= 1:
+            return None
+        return CertificationBatcher(max_batch, int(os.getenv('HEDERA_BATCH_MAX_GAS', 1500000)))
+
+    def gas_for(self, count):
+        return self.base_gas + self.per_loan_gas * count
+
+    def chunks(self, jobs):
+        return [jobs[i:i + self.capacity] for i in range(0, len(jobs), self.capacity)]
+
+
+class CertificationQueue:
+    """Background on-chain certification backed by the incentives table.
+
+    Scoring paths call enqueue() and return immediately. A dispatcher thread
+    claims due rows and submits them through `certifier` on a bounded worker
+    pool; failures are retried with exponential backoff until `max_attempts`.
+    Because the queue lives in Postgres it survives restarts and can be
+    drained by several processes at once.
+
+    With a `batcher`, each worker takes a chunk of rows and certifies the
+    first attempts in one certifyLoans transaction. Rows being retried are
+    certified one at a time, so a row that makes the contract revert only
+    fails itself after its first batch.
+    """
+
+    def __init__(self, certifier, workers=4, poll_interval=1.0, max_attempts=8,
+                 base_backoff=2.0, max_backoff=600.0, lease_seconds=300, on_certified=None,
+                 batcher=None):
+        self.certifier = certifier
+        self.batcher = batcher
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.lease_seconds = lease_seconds
+        self.on_certified = on_certified
+
+        self._slots = threading.BoundedSemaphore(workers)
+        self._executor = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.enqueued = Counter()
+        self.submitted = Counter()
+        self.certified = Counter()
+        self.retries = Counter()
+        self.failed = Counter()
+        self.batches = Counter()
+        self.batched = Counter()
+
+    def enqueue(self, loan_id, eco_score):
+        """Queue one certification if the score qualifies; never blocks on the chain"""
+        return self.enqueue_many([(loan_id, eco_score)])
+
+    def enqueue_many(self, entries):
+        entries = [(loan_id, score) for loan_id, score in entries if is_certifiable(score)]
+        if not entries:
+            return 0
+        queued = Incentive.enqueue_certifications(entries)
+        if queued:
+            self.enqueued.inc(queued)
+            self._wake.set()
+        return queued
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            Incentive.requeue_stale(self.lease_seconds)
+            self._stop.clear()
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='certify')
+            self._thread = threading.Thread(target=self._run, name='certification-dispatcher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=10.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            claimed = 0
+            try:
+                claimed = self._dispatch()
+            except Exception as e:
+                print(f"Certification dispatcher error: {e}")
+            if not claimed:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def _dispatch(self):
+        # Only claim as many rows as there are free workers
+        free = 0
+        while self._slots.acquire(blocking=False):
+            free += 1
+        if not free:
+            return 0  # a finishing worker sets _wake
+
+        if self.batcher is None:
+            jobs = Incentive.claim_certifications(free)
+            groups = [[job] for job in jobs]
+        else:
+            jobs = Incentive.claim_certifications(free * self.batcher.capacity)
+            groups = self.batcher.chunks(jobs)
+        for _ in range(free - len(groups)):
+            self._slots.release()
+        for group in groups:
+            self._executor.submit(self._submit, group)
+        return len(jobs)
+
+    def _backoff(self, attempts):
+        return min(self.max_backoff, self.base_backoff * (2 ** (attempts - 1)))
+
+    def _submit(self, jobs):
+        try:
+            # First attempts share a transaction; retries go one at a time
+            batch, single = [], []
+            for job in jobs:
+                (batch if job['attempts'] == 1 else single).append(job)
+            if len(batch) == 1:
+                batch, single = [], batch + single
+            if batch:
+                self._certify_batch(batch)
+            for job in single:
+                self._certify(job)
+        finally:
+            self._slots.release()
+            self._wake.set()
+
+    def _certify(self, job):
+        try:
+            self.submitted.inc()
+            try:
+                with stages.time('hedera_execute'):
+                    tx_id = self.certifier.certify(job['loan_id'], job['eco_score'], job['borrower_address'])
+            except Exception as e:
+                self._failed(job, e)
+                return
+
+            Incentive.mark_certified(job['id'], tx_id)
+            self.certified.inc()
+            if self.on_certified:
+                self.on_certified(job['loan_id'], job['eco_score'], tx_id)
+        except Exception as e:
+            print(f"Error finishing certification for Loan {job['loan_id']}: {e}")
+
+    def _certify_batch(self, jobs):
+        try:
+            self.submitted.inc(len(jobs))
+            self.batches.inc()
+            entries = [(job['loan_id'], job['eco_score'], job['borrower_address']) for job in jobs]
+            try:
+                with stages.time('hedera_execute_batch'):
+                    tx_id = self.certifier.certify_batch(entries, gas=self.batcher.gas_for(len(jobs)))
+            except Exception as e:
+                for job in jobs:
+                    self._failed(job, e)
+                return
+
+            Incentive.mark_certified_many([job['id'] for job in jobs], tx_id)
+            self.certified.inc(len(jobs))
+            self.batched.inc(len(jobs))
+            if self.on_certified:
+                for job in jobs:
+                    self.on_certified(job['loan_id'], job['eco_score'], tx_id)
+        except Exception as e:
+            print(f"Error finishing certification batch of {len(jobs)} loans: {e}")
+
+    def _failed(self, job, error):
+        # A malformed id or score fails the same way on every attempt
+        if isinstance(error, (ValueError, TypeError)) or job['attempts'] >= self.max_attempts:
+            self.failed.inc()
+            Incentive.mark_failed(job['id'], error)
+            print(f"Blockchain certification for Loan {job['loan_id']} gave up after {job['attempts']} attempts: {error}")
+        else:
+            self.retries.inc()
+            Incentive.mark_failed(job['id'], error, retry_in_seconds=self._backoff(job['attempts']))
+
+    def metrics(self):
+        return {
+            'workers': self.workers,
+            'enqueued': self.enqueued.value,
+            'submitted': self.submitted.value,
+            'certified': self.certified.value,
+            'retries': self.retries.value,
+            'failed': self.failed.value,
+            'batch_capacity': self.batcher.capacity if self.batcher else 1,
+            'batches': self.batches.value,
+            'batched': self.batched.value,
+        }
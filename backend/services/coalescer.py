@@ -0,0 +1,115 @@
+import threading
+import time
+
+from .metrics import Counter
+
+
+class UpdateCoalescer:
+    """Collapse bursts of IoT updates to the latest reading per key.
+
+    Within each `window_ms` only the newest item per loan is kept; at the
+    end of the window survivors are passed to `on_flush(key, item)`. Items
+    whose `value_key` moved less than `tolerance` since the last forwarded
+    value for that loan are skipped entirely; a value only counts as
+    forwarded once on_flush returns without raising and not False (e.g. a
+    full queue), and items with a non-numeric value are forwarded as is.
+    A rejected item stays pending for the next flush unless a newer item for
+    its key arrived meanwhile. window_ms=0 disables windowing (tolerance
+    still applies, and rejected items are dropped).
+    """
+
+    def __init__(self, on_flush, window_ms=1000, tolerance=0.0, value_key='predicted_carbon_reduction'):
+        self.on_flush = on_flush
+        self.window = window_ms / 1000.0
+        self.tolerance = tolerance
+        self.value_key = value_key
+
+        self._pending = {}
+        self._last_forwarded = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.received = Counter()
+        self.collapsed = Counter()
+        self.below_tolerance = Counter()
+        self.forwarded = Counter()
+        self.rejected = Counter()
+
+    def start(self):
+        if self.window > 0 and (self._thread is None or not self._thread.is_alive()):
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='iot-coalescer', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        """Stop the timer and flush whatever is still pending, retrying
+        rejected items for up to `timeout` seconds"""
+        deadline = time.monotonic() + timeout
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+        while self._pending and time.monotonic() < deadline:
+            time.sleep(0.01)
+            self.flush()
+
+    def offer(self, key, item):
+        self.received.inc()
+        if self.window <= 0:
+            self._forward(key, item)
+            return
+        with self._lock:
+            if key in self._pending:
+                self.collapsed.inc()
+            self._pending[key] = item
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        rejected = [(key, item) for key, item in pending.items() if self._forward(key, item) is False]
+        if rejected and self.window > 0:
+            with self._lock:
+                for key, item in rejected:
+                    self._pending.setdefault(key, item)
+
+    def _forward(self, key, item):
+        """Pass item to on_flush; returns False if on_flush rejected it"""
+        try:
+            value = None
+            if self.tolerance > 0:
+                value = float(item[self.value_key]) if item.get(self.value_key) is not None else None
+                last = self._last_forwarded.get(key)
+                if value is not None and last is not None and abs(value - last) < self.tolerance:
+                    self.below_tolerance.inc()
+                    return
+        except (TypeError, ValueError):
+            value = None
+        try:
+            if self.on_flush(key, item) is False:
+                self.rejected.inc()
+                return False
+            self.forwarded.inc()
+            if value is not None:
+                self._last_forwarded[key] = value
+        except Exception as e:
+            print(f"Error forwarding coalesced update for {key}: {e}")
+
+    def _run(self):
+        while not self._stop.wait(self.window):
+            self.flush()
+
+    def metrics(self):
+        received = self.received.value
+        return {
+            'window_ms': self.window * 1000,
+            'tolerance': self.tolerance,
+            'pending': len(self._pending),
+            'received': received,
+            'collapsed': self.collapsed.value,
+            'below_tolerance': self.below_tolerance.value,
+            'forwarded': self.forwarded.value,
+            'rejected': self.rejected.value,
+            'reduction_ratio': received / self.forwarded.value if self.forwarded.value else 0.0,
+        }
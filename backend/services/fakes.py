@@ -0,0 +1,578 @@
+"""In-process stand-ins for external services, for tests and local runs"""
+import itertools
+import random
+import threading
+import time
+
+from .hedera import ReceiptStatusError, chain_loan_id
+
+
+class FakeCertifierContract:
+    """EcoLoanCertifier executed in Python with the EVM gas schedule.
+
+    Storage, logs, calldata and the intrinsic transaction cost are priced as
+    on the EVM (EIP-2929 cold access, EIP-2200 SSTORE); dispatch and loop
+    overhead are estimates (EXECUTION_GAS, LOOP_GAS) since no bytecode runs.
+    Refunds are ignored. A call that reverts or runs out of gas changes
+    nothing, as on chain. Returns the gas used.
+    """
+
+    TX_GAS = 21000
+    CALLDATA_ZERO_GAS = 4
+    CALLDATA_NONZERO_GAS = 16
+    COLD_SLOAD_GAS = 2100
+    SSTORE_SET_GAS = 20000    # zero -> nonzero
+    SSTORE_RESET_GAS = 2900   # nonzero -> another value
+    WARM_ACCESS_GAS = 100     # unchanged or already-dirty slot
+    LOG_GAS = 375
+    LOG_TOPIC_GAS = 375
+    LOG_DATA_GAS = 8
+    EXECUTION_GAS = 600       # selector dispatch and argument decoding
+    LOOP_GAS = 250            # per certifyLoans element
+    # LoanCertified(uint indexed loanId, uint ecoScore, address borrower)
+    EVENT_GAS = LOG_GAS + 2 * LOG_TOPIC_GAS + 2 * 32 * LOG_DATA_GAS
+
+    def __init__(self):
+        self.scores = {}
+        self.events = []
+
+    def certify_loan(self, loan_id, eco_score, borrower_address=None, gas_limit=None):
+        return self._execute([(loan_id, eco_score, borrower_address)], gas_limit, batch=False)
+
+    def certify_loans(self, entries, gas_limit=None):
+        return self._execute(list(entries), gas_limit, batch=True)
+
+    @staticmethod
+    def _word(value):
+        return chain_loan_id(value).to_bytes(32, 'big')
+
+    @classmethod
+    def _address(cls, address):
+        return cls._word(int(address or '0x0', 16))
+
+    @classmethod
+    def calldata(cls, entries, batch=True):
+        """ABI-encoded arguments (without the selector) of certifyLoan / certifyLoans"""
+        if not batch:
+            loan_id, eco_score, borrower_address = entries[0]
+            return cls._word(loan_id) + cls._word(eco_score) + cls._address(borrower_address)
+        n = len(entries)
+        head = b''.join(cls._word(32 * (3 + i * (n + 1))) for i in range(3))
+        loan_ids = cls._word(n) + b''.join(cls._word(loan_id) for loan_id, _, _ in entries)
+        scores = cls._word(n) + b''.join(cls._word(eco_score) for _, eco_score, _ in entries)
+        borrowers = cls._word(n) + b''.join(cls._address(address) for _, _, address in entries)
+        return head + loan_ids + scores + borrowers
+
+    @classmethod
+    def intrinsic_gas(cls, entries, batch=True):
+        data = cls.calldata(entries, batch)
+        zeros = data.count(0)
+        # The 4-byte selector is treated as nonzero
+        return cls.TX_GAS + (4 + len(data) - zeros) * cls.CALLDATA_NONZERO_GAS + zeros * cls.CALLDATA_ZERO_GAS
+
+    def _execute(self, entries, gas_limit, batch):
+        gas = self.intrinsic_gas(entries, batch) + self.EXECUTION_GAS
+        writes = {}
+        for loan_id, eco_score, _ in entries:
+            eco_score = int(eco_score)
+            if eco_score <= 80:
+                raise RuntimeError("EcoScore must be above 80 to certify")
+            if batch:
+                gas += self.LOOP_GAS
+            original = self.scores.get(loan_id, 0)
+            current = writes.get(loan_id, original)
+            if loan_id not in writes:
+                gas += self.COLD_SLOAD_GAS
+            if eco_score == current or current != original:
+                gas += self.WARM_ACCESS_GAS
+            else:
+                gas += self.SSTORE_SET_GAS if original == 0 else self.SSTORE_RESET_GAS
+            writes[loan_id] = eco_score
+            gas += self.EVENT_GAS
+        if gas_limit is not None and gas > gas_limit:
+            raise RuntimeError(f"Out of gas: {gas} needed, limit {gas_limit}")
+        self.scores.update(writes)
+        self.events.extend(entries)
+        return gas
+
+
+class FakeHederaCertifier:
+    """Drop-in for HederaCertifier that records calls instead of hitting the network.
+
+    Calls run against a FakeCertifierContract, so gas limits are enforced
+    and every transaction's gas use is recorded in `transactions`.
+
+    latency: seconds each transaction sleeps, to mimic consensus time
+    failure_rate: probability a transaction raises, to exercise retries
+    revert_at: 'execute' raises a revert before a transaction exists;
+        'receipt' records the failed transaction (status
+        CONTRACT_REVERT_EXECUTED or INSUFFICIENT_GAS, full gas charged) and
+        raises ReceiptStatusError, as HederaCertifier does on the network
+    """
+
+    def __init__(self, latency=0.0, failure_rate=0.0, seed=None, gas=200000, revert_at='execute'):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.gas = gas
+        self.revert_at = revert_at
+        self.contract = FakeCertifierContract()
+        self.scores = self.contract.scores
+        self.calls = []
+        self.transactions = []
+        self._random = random.Random(seed)
+        self._sequence = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def certify(self, loan_id, eco_score, borrower_address=None):
+        return self._transact([(loan_id, eco_score, borrower_address)], self.gas, batch=False)
+
+    def certify_batch(self, entries, gas=None):
+        return self._transact(list(entries), gas or self.gas, batch=True)
+
+    def _transact(self, entries, gas_limit, batch):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            if self._random.random() < self.failure_rate:
+                raise RuntimeError(f"Fake Hedera failure for loan {entries[0][0]}")
+            try:
+                if batch:
+                    gas_used = self.contract.certify_loans(entries, gas_limit)
+                else:
+                    gas_used = self.contract.certify_loan(*entries[0], gas_limit=gas_limit)
+            except RuntimeError as e:
+                if self.revert_at != 'receipt':
+                    raise
+                tx_id = self._tx_id()
+                status = 'INSUFFICIENT_GAS' if 'Out of gas' in str(e) else 'CONTRACT_REVERT_EXECUTED'
+                self.transactions.append({'tx_id': tx_id, 'loans': len(entries), 'gas_limit': gas_limit,
+                                          'gas_used': gas_limit, 'status': status})
+                raise ReceiptStatusError(tx_id, status) from e
+            tx_id = self._tx_id()
+            self.transactions.append({'tx_id': tx_id, 'loans': len(entries), 'gas_limit': gas_limit,
+                                      'gas_used': gas_used, 'status': 'SUCCESS'})
+            for loan_id, eco_score, borrower_address in entries:
+                self.calls.append((loan_id, eco_score, borrower_address, tx_id))
+        return tx_id
+
+    def _tx_id(self):
+        return f"0.0.1001@{int(time.time())}.{next(self._sequence):09d}"
+
+
+class FakeMQTTMessage:
+    def __init__(self, topic, payload, qos=0):
+        self.topic = topic
+        self.payload = payload if isinstance(payload, bytes) else str(payload).encode()
+        self.qos = qos
+
+
+class InProcessBroker:
+    """Minimal MQTT broker stand-in: exact topic matches plus shared
+    subscriptions ($share/<group>/<topic>), which round-robin across the
+    group's members like a real broker"""
+
+    def __init__(self):
+        self._subscribers = {}  # topic -> [client]
+        self._groups = {}  # (group, topic) -> [client]
+        self._cursors = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, client, topic):
+        with self._lock:
+            if topic.startswith('$share/'):
+                _, group, real_topic = topic.split('/', 2)
+                self._groups.setdefault((group, real_topic), []).append(client)
+            else:
+                self._subscribers.setdefault(topic, []).append(client)
+
+    def unsubscribe(self, client):
+        with self._lock:
+            for members in list(self._subscribers.values()) + list(self._groups.values()):
+                if client in members:
+                    members.remove(client)
+
+    def publish(self, topic, payload, qos=0):
+        with self._lock:
+            targets = list(self._subscribers.get(topic, []))
+            for (group, group_topic), members in self._groups.items():
+                if group_topic == topic and members:
+                    cursor = self._cursors.get((group, group_topic), 0)
+                    targets.append(members[cursor % len(members)])
+                    self._cursors[(group, group_topic)] = cursor + 1
+        for client in targets:
+            client.deliver(FakeMQTTMessage(topic, payload, qos))
+        return len(targets)
+
+
+class FakeMQTTClient:
+    """paho.mqtt.client.Client look-alike bound to an InProcessBroker.
+
+    Messages are delivered synchronously on the publisher's thread.
+    """
+
+    def __init__(self, broker, userdata=None):
+        self.broker = broker
+        self.userdata = userdata
+        self.on_message = None
+        self.on_connect = None
+        self._connected = False
+        self._pending_connect = None
+        self._stopped = threading.Event()
+
+    def connect(self, host='localhost', port=1883, keepalive=60):
+        self._connected = True
+        if self.on_connect:
+            self.on_connect(self, self.userdata, {}, 0)
+        return 0
+
+    def connect_async(self, host='localhost', port=1883, keepalive=60):
+        self._pending_connect = (host, port, keepalive)
+
+    def is_connected(self):
+        return self._connected
+
+    def subscribe(self, topic, qos=0):
+        self.broker.subscribe(self, topic)
+        return (0, 1)
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        self.broker.publish(topic, payload, qos)
+
+    def deliver(self, message):
+        if self.on_message:
+            self.on_message(self, self.userdata, message)
+
+    def loop_forever(self):
+        self._stopped.wait()
+
+    def loop_start(self):
+        if self._pending_connect:
+            self.connect(*self._pending_connect)
+            self._pending_connect = None
+
+    def loop_stop(self):
+        pass
+
+    def disconnect(self):
+        self.broker.unsubscribe(self)
+        self._connected = False
+        self._stopped.set()
+
+
+class FakeSocketIO:
+    """Records emits instead of sending them; stands in for SocketIO or RedisManager"""
+
+    def __init__(self):
+        self.emitted = []
+        self._lock = threading.Lock()
+
+    def emit(self, event, data=None, room=None, to=None, namespace=None, **kwargs):
+        with self._lock:
+            self.emitted.append((event, data, to or room))
+
+    def events(self, event=None, room=None):
+        with self._lock:
+            return [
+                (e, data, r) for e, data, r in self.emitted
+                if (event is None or e == event) and (room is None or r == room)
+            ]
+
+
+class FakeRedis:
+    """The slice of redis.Redis the caches use, kept in a dict; TTLs are ignored"""
+
+    def __init__(self):
+        self.data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self.data[key] = str(value)
+        return True
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(1 for key in keys if self.data.pop(key, None) is not None)
+
+    def incr(self, key):
+        with self._lock:
+            value = int(self.data.get(key, 0)) + 1
+            self.data[key] = str(value)
+            return value
+
+
+class FakeLoanStore:
+    """In-memory stand-in for the Loan model's lookup and score-write methods"""
+
+    def __init__(self):
+        self.loans = {}
+        self.score_writes = 0
+        self._lock = threading.Lock()
+
+    def seed(self, count, prefix='loan-', seed=0):
+        rng = random.Random(seed)
+        project_types = ['solar', 'wind', 'hydro', 'efficiency']
+        for index in range(1, count + 1):
+            loan_id = f'{prefix}{index}'
+            self.loans[loan_id] = {
+                'loan_id': loan_id,
+                'borrower_name': f'Borrower {index}',
+                'loan_amount': round(rng.uniform(10000, 500000), 2),
+                'project_type': rng.choice(project_types),
+                'description': 'seeded',
+                'eco_score': None,
+                'predicted_carbon_reduction': round(rng.uniform(1000, 2000), 2),
+                'borrower_address': None,
+                'status': 'pending',
+                'created_at': None,
+            }
+        return list(self.loans)
+
+    def get_by_id(self, loan_id):
+        loan = self.loans.get(str(loan_id))
+        return dict(loan) if loan else None
+
+    def update_score(self, loan_id, eco_score, predicted_carbon_reduction):
+        with self._lock:
+            loan = self.loans.get(str(loan_id))
+            if loan is None:
+                return True
+            loan['eco_score'] = eco_score
+            loan['predicted_carbon_reduction'] = predicted_carbon_reduction
+            self.score_writes += 1
+        return True
+
+    def bulk_update_scores(self, updates):
+        updates = list(updates)
+        for loan_id, eco_score, carbon in updates:
+            self.update_score(loan_id, eco_score, carbon)
+        return len(updates)
+
+
+class FakeIncentiveStore:
+    """In-memory stand-in for the Incentive model's certification queue.
+
+    Mirrors the SQL contract: one pending row per loan (a newer score
+    replaces it), nothing queued when the in-flight or last certified score
+    has the same integer value, claims skip loans with a row in flight, and
+    a row returning to the queue while the loan already has a pending row
+    is superseded. Time is time.monotonic() plus whatever advance() added,
+    so backoff can be skipped without sleeping.
+    """
+
+    def __init__(self):
+        self.rows = {}
+        self.borrowers = {}       # loan_id -> borrower_address
+        self.retries = []         # (incentive_id, retry_in_seconds) per scheduled retry
+        self._offset = 0.0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def now(self):
+        return time.monotonic() + self._offset
+
+    def advance(self, seconds):
+        with self._lock:
+            self._offset += seconds
+
+    def rows_for(self, loan_id, status=None):
+        with self._lock:
+            return [
+                dict(row) for row in sorted(self.rows.values(), key=lambda row: row['id'])
+                if row['loan_id'] == str(loan_id) and (status is None or row['status'] == status)
+            ]
+
+    def _find(self, loan_id, status):
+        return [row for row in self.rows.values() if row['loan_id'] == loan_id and row['status'] == status]
+
+    def enqueue_certifications(self, entries):
+        latest = {}
+        for loan_id, eco_score in entries:
+            latest[str(loan_id)] = eco_score
+        queued = 0
+        with self._lock:
+            for loan_id, eco_score in latest.items():
+                in_flight = self._find(loan_id, 'processing')
+                certified = sorted(self._find(loan_id, 'certified'), key=lambda row: row['updated_at'])
+                if any(int(row['eco_score']) == int(eco_score) for row in in_flight):
+                    continue
+                if certified and int(certified[-1]['eco_score']) == int(eco_score):
+                    continue
+                pending = self._find(loan_id, 'pending')
+                if pending:
+                    pending[0].update(eco_score=eco_score, updated_at=self.now())
+                else:
+                    row_id = next(self._ids)
+                    self.rows[row_id] = {
+                        'id': row_id, 'loan_id': loan_id, 'eco_score': eco_score, 'status': 'pending',
+                        'attempts': 0, 'next_attempt_at': self.now(), 'updated_at': self.now(),
+                        'blockchain_tx_id': None, 'last_error': None,
+                    }
+                queued += 1
+        return queued
+
+    def claim_certifications(self, limit):
+        with self._lock:
+            now = self.now()
+            busy = {row['loan_id'] for row in self.rows.values() if row['status'] == 'processing'}
+            due = sorted(
+                (row for row in self.rows.values()
+                 if row['status'] == 'pending' and row['next_attempt_at'] <= now and row['loan_id'] not in busy),
+                key=lambda row: row['next_attempt_at']
+            )[:limit]
+            for row in due:
+                row.update(status='processing', attempts=row['attempts'] + 1, updated_at=now)
+            return [
+                {'id': row['id'], 'loan_id': row['loan_id'], 'eco_score': float(row['eco_score']),
+                 'borrower_address': self.borrowers.get(row['loan_id']), 'attempts': row['attempts']}
+                for row in due
+            ]
+
+    def mark_certified(self, incentive_id, tx_id):
+        return self.mark_certified_many([incentive_id], tx_id)
+
+    def mark_certified_many(self, incentive_ids, tx_id):
+        with self._lock:
+            for incentive_id in incentive_ids:
+                self.rows[incentive_id].update(status='certified', blockchain_tx_id=tx_id,
+                                               last_error=None, updated_at=self.now())
+        return True
+
+    def mark_failed(self, incentive_id, error, retry_in_seconds=None):
+        with self._lock:
+            row = self.rows[incentive_id]
+            row.update(last_error=str(error)[:1000], updated_at=self.now())
+            if retry_in_seconds is None:
+                row['status'] = 'failed'
+                return True
+            self.retries.append((incentive_id, retry_in_seconds))
+            row['status'] = 'superseded' if self._find(row['loan_id'], 'pending') else 'pending'
+            row['next_attempt_at'] = self.now() + retry_in_seconds
+        return True
+
+    def requeue_stale(self, lease_seconds):
+        with self._lock:
+            cutoff = self.now() - lease_seconds
+            stale = sorted(
+                (row for row in self.rows.values() if row['status'] == 'processing' and row['updated_at'] < cutoff),
+                key=lambda row: row['id'], reverse=True
+            )
+            for row in stale:
+                row['status'] = 'superseded' if self._find(row['loan_id'], 'pending') else 'pending'
+                row['updated_at'] = self.now()
+        return True
+
+
+class FakeMilestoneStore:
+    """In-memory stand-in for the Milestone model methods MilestoneEngine uses"""
+
+    def __init__(self):
+        self.milestones = {}
+        self.progress_writes = 0
+        self.achieved_writes = 0
+        self._open = {}  # (loan_id, metric) -> ids not yet achieved
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def seed(self, loans, per_loan=3, low=1500.0, high=3000.0, metric='predicted_carbon_reduction', seed=0):
+        """Add `per_loan` milestones with targets in [low, high) to each loan dict"""
+        rng = random.Random(seed)
+        for loan in loans:
+            for index in range(per_loan):
+                milestone_id = next(self._ids)
+                self.milestones[milestone_id] = {
+                    'id': milestone_id,
+                    'loan_id': loan['loan_id'],
+                    'milestone_name': f'Milestone {index + 1}',
+                    'metric': metric,
+                    'target_value': round(rng.uniform(low, high), 2),
+                    'current_value': None,
+                    'achieved': False,
+                    'achieved_at': None,
+                    'project_type': loan.get('project_type'),
+                }
+                self._open.setdefault((loan['loan_id'], metric), set()).add(milestone_id)
+        return len(self.milestones)
+
+    def load_open(self, after_id=0):
+        with self._lock:
+            return [
+                (m['id'], m['loan_id'], m['metric'], m['target_value'], m['milestone_name'], m['project_type'])
+                for milestone_id, m in sorted(self.milestones.items())
+                if milestone_id > after_id and not m['achieved']
+            ]
+
+    def bulk_update_progress(self, updates):
+        updates = list(updates)
+        with self._lock:
+            for loan_id, metric, value in updates:
+                for milestone_id in self._open.get((loan_id, metric), ()):
+                    self.milestones[milestone_id]['current_value'] = value
+            self.progress_writes += len(updates)
+        return len(updates)
+
+    def mark_achieved_many(self, achievements):
+        confirmed = []
+        with self._lock:
+            for milestone_id, value, achieved_at in achievements:
+                milestone = self.milestones.get(milestone_id)
+                if milestone is None or milestone['achieved']:
+                    continue
+                milestone.update(achieved=True, achieved_at=achieved_at, current_value=value)
+                self._open[(milestone['loan_id'], milestone['metric'])].discard(milestone_id)
+                confirmed.append(milestone_id)
+            self.achieved_writes += len(confirmed)
+        return confirmed
+
+
+class FakeModelBackend:
+    """InferenceBackend look-alike with a deterministic score and no framework.
+
+    latency_ms: fixed cost per predict() call (graph dispatch)
+    per_sample_us: extra cost per row, so batching behaves like a real model
+    """
+
+    name = 'fake'
+    fork_safe = True
+
+    def __init__(self, path=None, n_features=3, seq_len=12, latency_ms=0.0, per_sample_us=0.0,
+                 num_threads=None, **kwargs):
+        self.path = path
+        self.n_features = n_features
+        self.seq_len = seq_len
+        self.num_threads = num_threads
+        self.latency_ms = latency_ms
+        self.per_sample_us = per_sample_us
+        self.version = f'fake:{latency_ms}:{per_sample_us}'
+        self.loaded = True
+        self.calls = 0
+
+    def load(self):
+        return self
+
+    def reload(self, path=None):
+        return self.version
+
+    def preload(self):
+        return True
+
+    def set_num_threads(self, num_threads):
+        self.num_threads = num_threads
+
+    def warmup(self, batch_size=1):
+        pass
+
+    def predict(self, batch):
+        import numpy as np
+
+        batch = np.asarray(batch, dtype=np.float32)
+        delay = self.latency_ms / 1000 + self.per_sample_us * len(batch) / 1e6
+        if delay:
+            time.sleep(delay)
+        self.calls += 1
+        # Mean carbon reading (feature 1) mapped smoothly onto 0-100
+        return 50 + 50 * np.tanh(batch[:, :, 1].mean(axis=1) / 1000 - 1)
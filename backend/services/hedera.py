@@ -0,0 +1,100 @@
+import hashlib
+import os
+import threading
+
+NULL_ADDRESS = '0x0000000000000000000000000000000000000000'
+
+
+def chain_loan_id(loan_id):
+    """uint256 the contract stores a loan under: numeric ids as is, others
+    (e.g. 'test-loan-1') as the SHA-256 of the id"""
+    try:
+        return int(loan_id)
+    except ValueError:
+        return int.from_bytes(hashlib.sha256(str(loan_id).encode()).digest(), 'big')
+
+
+class ReceiptStatusError(RuntimeError):
+    """A transaction reached consensus but did not succeed (e.g. the contract
+    reverted or ran out of gas); nothing it did was applied"""
+
+    def __init__(self, tx_id, status):
+        super().__init__(f"Transaction {tx_id} failed at consensus: {status}")
+        self.tx_id = tx_id
+        self.status = status
+
+
+def connect_from_env():
+    """(client, contract_id) from HEDERA_* / ECO_CONTRACT_ID settings"""
+    from hedera import AccountId, PrivateKey, Client
+
+    account_id = AccountId.fromString(os.getenv('HEDERA_ACCOUNT_ID'))
+    private_key = PrivateKey.fromString(os.getenv('HEDERA_PRIVATE_KEY'))
+    client = Client.forName(os.getenv('HEDERA_NETWORK', 'testnet'))
+    client.setOperator(account_id, private_key)
+    return client, AccountId.fromString(os.getenv('ECO_CONTRACT_ID'))
+
+
+class HederaCertifier:
+    """Submits certifyLoan / certifyLoans calls to the EcoLoanCertifier contract.
+
+    Built with `connect` instead of a client, the SDK (and its JVM) is only
+    loaded by the first certify() call. Calls wait for the receipt, so a
+    transaction that reverts at consensus raises ReceiptStatusError instead
+    of returning an id.
+    """
+
+    def __init__(self, client=None, contract_id=None, gas=200000, connect=None):
+        self.client = client
+        self.contract_id = contract_id
+        self.gas = gas
+        self._connect = connect
+        self._connect_lock = threading.Lock()
+
+    @staticmethod
+    def from_env():
+        """Build a certifier from HEDERA_* / ECO_CONTRACT_ID settings (connects lazily)"""
+        return HederaCertifier(gas=int(os.getenv('HEDERA_CERTIFY_GAS', 200000)), connect=connect_from_env)
+
+    def _ensure_client(self):
+        if self.client is None:
+            with self._connect_lock:
+                if self.client is None:
+                    self.client, self.contract_id = self._connect()
+
+    def _confirm(self, resp):
+        """Transaction id once the receipt reports SUCCESS"""
+        tx_id = resp.transactionId.toString()
+        receipt = resp.getReceipt(self.client)
+        status = receipt.status.toString()
+        if status != 'SUCCESS':
+            raise ReceiptStatusError(tx_id, status)
+        return tx_id
+
+    def certify(self, loan_id, eco_score, borrower_address=None):
+        """Execute certifyLoan and return the transaction id once it succeeded"""
+        from hedera import ContractExecuteTransaction, ContractFunctionParams
+
+        self._ensure_client()
+        params = ContractFunctionParams()
+        params.addUInt256(chain_loan_id(loan_id))
+        params.addUInt256(int(eco_score))
+        params.addAddress(borrower_address or NULL_ADDRESS)
+
+        tx = ContractExecuteTransaction().setContractId(self.contract_id).setGas(self.gas).setFunction("certifyLoan", params)
+        return self._confirm(tx.execute(self.client))
+
+    def certify_batch(self, entries, gas=None):
+        """Execute certifyLoans for [(loan_id, eco_score, borrower_address)] in one
+        transaction and return its id once it succeeded; the contract certifies
+        all or none"""
+        from hedera import ContractExecuteTransaction, ContractFunctionParams
+
+        self._ensure_client()
+        params = ContractFunctionParams()
+        params.addUInt256Array([chain_loan_id(loan_id) for loan_id, _, _ in entries])
+        params.addUInt256Array([int(eco_score) for _, eco_score, _ in entries])
+        params.addAddressArray([borrower_address or NULL_ADDRESS for _, _, borrower_address in entries])
+
+        tx = ContractExecuteTransaction().setContractId(self.contract_id).setGas(gas or self.gas).setFunction("certifyLoans", params)
+        return self._confirm(tx.execute(self.client))
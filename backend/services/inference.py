@@ -0,0 +1,263 @@
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+from .scoring import SEQUENCE_LENGTH
+
+
+class InferenceBackend:
+    """Base class for model runtimes.
+
+    The model is loaded lazily on the first predict() (or an explicit
+    load()/warmup()), so importing the service never pays for a framework
+    import. predict() maps an (N, T, F) float32 batch to N eco scores in the
+    0-100 range.
+    """
+
+    name = None
+    # Safe to load() in a parent process before forking workers: loading
+    # starts no runtime threads, and the weights end up in memory the
+    # children share (copy-on-write or a file mapping). TensorFlow and
+    # ONNX Runtime start thread pools when loading, so they load per worker.
+    fork_safe = False
+
+    def __init__(self, path, n_features=3, seq_len=SEQUENCE_LENGTH, num_threads=None):
+        self.path = path
+        self.n_features = n_features
+        self.seq_len = seq_len
+        self.num_threads = num_threads
+        self._model = None
+        self._version = None
+        self._load_lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._model is not None
+
+    @property
+    def version(self):
+        """Identifies the loaded artifact (or the one that would be loaded)"""
+        return self._version or self._artifact_version()
+
+    def _artifact_version(self):
+        """Content hash of the artifact file (or every file under a directory),
+        so a same-second overwrite or an mtime-preserving copy still changes it"""
+        if os.path.isdir(self.path):
+            files = sorted(os.path.join(root, name) for root, _, names in os.walk(self.path) for name in names)
+        else:
+            files = [self.path]
+        digest = hashlib.blake2b(digest_size=8)
+        try:
+            for path in files:
+                digest.update(os.path.relpath(path, self.path).encode())
+                with open(path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(1 << 20), b''):
+                        digest.update(chunk)
+            content = digest.hexdigest()
+        except OSError:
+            content = 'missing'
+        return f"{self.name}:{os.path.basename(self.path)}:{content}"
+
+    def load(self):
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    self._version = self._artifact_version()
+                    self._model = self._load()
+        return self._model
+
+    def reload(self, path=None):
+        """Swap in a new artifact; in-flight predictions finish on the old model"""
+        with self._load_lock:
+            if path:
+                self.path = path
+            version = self._artifact_version()
+            model = self._load()
+            self._model, self._version = model, version
+        return version
+
+    def preload(self):
+        """Load now if the model can be shared with forked workers; returns whether it did"""
+        if not self.fork_safe:
+            return False
+        self.load()
+        return True
+
+    def set_num_threads(self, num_threads):
+        """Intra-op threads for this process, e.g. CPUs / workers after a fork"""
+        self.num_threads = num_threads
+        if self.loaded:
+            with self._load_lock:
+                self._apply_threads()
+
+    def _apply_threads(self):
+        pass
+
+    def warmup(self, batch_size=1):
+        """Run one dummy batch so the first real request doesn't pay for graph setup"""
+        self.predict(np.zeros((batch_size, self.seq_len, self.n_features), dtype=np.float32))
+
+    def predict(self, batch):
+        model = self.load()
+        return self._predict(model, np.ascontiguousarray(batch, dtype=np.float32))
+
+    def _check_features(self, input_size):
+        """Fail at load, not on the first request, when the artifact was
+        trained on a different number of features than the service builds"""
+        if isinstance(input_size, int) and input_size != self.n_features:
+            raise ValueError(
+                f"{self.name} model {self.path} takes {input_size} features per step, "
+                f"but MODEL_FEATURES is {self.n_features}"
+            )
+
+    def _load(self):
+        raise NotImplementedError
+
+    def _predict(self, model, batch):
+        raise NotImplementedError
+
+
+class KerasBackend(InferenceBackend):
+    """TensorFlow/Keras .h5 or SavedModel; the model outputs a 0-1 score"""
+
+    name = 'keras'
+
+    def _load(self):
+        import tensorflow as tf
+        if self.num_threads:
+            try:
+                # Only honoured before the TF runtime initializes
+                tf.config.threading.set_intra_op_parallelism_threads(self.num_threads)
+                tf.config.threading.set_inter_op_parallelism_threads(1)
+            except RuntimeError as e:
+                print(f"TensorFlow thread settings ignored: {e}")
+        model = tf.keras.models.load_model(self.path)
+        self._check_features(model.input_shape[-1])
+        return model
+
+    def _predict(self, model, batch):
+        return model.predict(batch, batch_size=min(len(batch), 1024), verbose=0)[:, 0] * 100
+
+
+class TorchScriptBackend(InferenceBackend):
+    """TorchScript export of EcoScoreLSTM; the model outputs the score directly"""
+
+    name = 'torchscript'
+    fork_safe = True
+
+    def _load(self):
+        import torch
+        self._apply_threads()
+        model = torch.jit.load(self.path, map_location='cpu')
+        model.eval()
+        # export_model.py folds the scaler in as a per-feature `scale` buffer
+        scale = getattr(model, 'scale', None)
+        if scale is not None:
+            self._check_features(int(scale.shape[0]))
+        return model
+
+    def _apply_threads(self):
+        import torch
+        if self.num_threads:
+            torch.set_num_threads(self.num_threads)
+
+    def _predict(self, model, batch):
+        import torch
+        with torch.inference_mode():
+            out = model(torch.from_numpy(batch)).numpy()[:, 0]
+        return np.clip(out, 0, 100)
+
+
+class OnnxBackend(InferenceBackend):
+    """ONNX Runtime session over an ONNX export of EcoScoreLSTM"""
+
+    name = 'onnx'
+
+    def _apply_threads(self):
+        # Thread pools are fixed per session; build a new one
+        self._model = self._load()
+
+    def _load(self):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if self.num_threads:
+            options.intra_op_num_threads = self.num_threads
+        session = ort.InferenceSession(self.path, sess_options=options, providers=['CPUExecutionProvider'])
+        model_input = session.get_inputs()[0]
+        # Dynamic axes come back as names; the feature axis is fixed at export
+        self._check_features(model_input.shape[-1])
+        return session, model_input.name
+
+    def _predict(self, model, batch):
+        session, input_name = model
+        out = session.run(None, {input_name: batch})[0][:, 0]
+        return np.clip(out, 0, 100)
+
+
+class TorchWeightsBackend(TorchScriptBackend):
+    """EcoScoreLSTM rebuilt from a weights directory (export_model.py
+    --format weights: manifest.json plus one .npy per tensor).
+
+    Each tensor is np.load()ed with a copy-on-write memory map and assigned
+    to the module as-is (torch >= 2.1), so the parameters are the mapped
+    file pages: every worker process on the host shares one copy of the
+    weights through the page cache, whether or not it was forked.
+    """
+
+    name = 'torch'
+
+    def _load(self):
+        import torch
+        from ml_model import EcoScoreLSTM
+
+        self._apply_threads()
+        with open(os.path.join(self.path, 'manifest.json')) as f:
+            manifest = json.load(f)
+        self._check_features(manifest['config']['input_size'])
+        model = EcoScoreLSTM(**manifest['config'])
+        state = {
+            name: torch.from_numpy(np.load(os.path.join(self.path, filename), mmap_mode='c'))
+            for name, filename in manifest['tensors'].items()
+        }
+        model.load_state_dict(state, assign=True)
+        model.eval()
+        scale = np.asarray(manifest['scale'], dtype=np.float32)
+        offset = np.asarray(manifest['offset'], dtype=np.float32)
+        return model, scale, offset
+
+    def _predict(self, model, batch):
+        import torch
+        model, scale, offset = model
+        with torch.inference_mode():
+            out = model(torch.from_numpy(batch * scale + offset)).numpy()[:, 0]
+        return np.clip(out, 0, 100)
+
+
+BACKENDS = {
+    KerasBackend.name: KerasBackend,
+    TorchScriptBackend.name: TorchScriptBackend,
+    TorchWeightsBackend.name: TorchWeightsBackend,
+    OnnxBackend.name: OnnxBackend,
+}
+
+
+def create_backend(name=None, path=None, **kwargs):
+    """Backend from MODEL_BACKEND / MODEL_PATH unless given explicitly"""
+    name = name or os.getenv('MODEL_BACKEND', 'keras')
+    path = path or os.getenv('MODEL_PATH')
+    if name == 'fake':
+        # Deterministic in-process model for local runs and benchmarks
+        from .fakes import FakeModelBackend
+        kwargs.setdefault('n_features', int(os.getenv('MODEL_FEATURES', 3)))
+        kwargs.setdefault('latency_ms', float(os.getenv('MODEL_FAKE_LATENCY_MS', 0)))
+        kwargs.setdefault('per_sample_us', float(os.getenv('MODEL_FAKE_PER_SAMPLE_US', 0)))
+        return FakeModelBackend(path, **kwargs)
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown model backend '{name}' (expected one of {', '.join(BACKENDS)})")
+    if 'num_threads' not in kwargs and os.getenv('MODEL_NUM_THREADS'):
+        kwargs['num_threads'] = int(os.getenv('MODEL_NUM_THREADS'))
+    kwargs.setdefault('n_features', int(os.getenv('MODEL_FEATURES', 3)))
+    return BACKENDS[name](path, **kwargs)
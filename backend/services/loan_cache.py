@@ -0,0 +1,55 @@
+import json
+import os
+
+from config.database import DatabaseConfig
+from models.loan import Loan
+from .cache import CacheGeneration, TieredCache
+
+
+class LoanCaches:
+    """Read-through caches for single-loan lookups and list pages.
+
+    Installed on the Loan model (Loan.caches), whose reads go through them
+    and whose writes call invalidate(). List pages are keyed by a
+    generation that only moves when loans are added or removed or change
+    status; score writes leave cached pages alone, so a page can show a
+    score up to `page_ttl` seconds old. Keep the page TTL short.
+    """
+
+    def __init__(self, redis_client=None, ttl=60, page_ttl=5, local_ttl=5.0, local_size=10000,
+                 generation_ttl=1.0):
+        self.loan = TieredCache('loan', redis_client=redis_client, ttl=ttl,
+                                local_ttl=local_ttl, local_size=local_size)
+        self.page = TieredCache('loan_page', redis_client=redis_client, ttl=page_ttl,
+                                local_ttl=min(local_ttl, page_ttl), local_size=1000)
+        self.generation = CacheGeneration('loan_page', redis_client=redis_client, local_ttl=generation_ttl)
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            redis_client=DatabaseConfig.get_redis_client() if os.getenv('CACHE_REDIS', '1') == '1' else None,
+            ttl=int(os.getenv('LOAN_CACHE_TTL', 60)),
+            page_ttl=int(os.getenv('LOAN_PAGE_CACHE_TTL', 5)),
+            local_ttl=float(os.getenv('LOAN_CACHE_LOCAL_TTL', 5)),
+            local_size=int(os.getenv('LOAN_CACHE_LOCAL_SIZE', 10000))
+        )
+
+    def get_loan(self, loan_id, loader):
+        return self.loan.get_or_load(str(loan_id), loader)
+
+    def get_page(self, limit, cursor, fields, filters, loader):
+        key = json.dumps([self.generation.current(), limit, cursor, fields, filters], sort_keys=True)
+        return self.page.get_or_load(key, loader)
+
+    def invalidate(self, loan_ids, listed=False):
+        """Drop cached loans; `listed` also retires every cached list page"""
+        self.loan.invalidate(*[str(loan_id) for loan_id in loan_ids])
+        if listed:
+            self.generation.bump()
+
+    def metrics(self):
+        return {'loan': self.loan.metrics(), 'loan_page': self.page.metrics()}
+
+
+loan_caches = LoanCaches.from_env()
+Loan.caches = loan_caches
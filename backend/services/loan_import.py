@@ -0,0 +1,196 @@
+import csv
+import io
+import json
+import math
+import time
+
+from models.loan import Loan, IMPORT_FIELDS, REQUIRED_FIELDS
+from .rescoring import score_loan_ids
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+
+# Column limits from the loans table
+MAX_LENGTHS = {'loan_id': 50, 'borrower_name': 255, 'project_type': 100, 'borrower_address': 42}
+MAX_MAGNITUDES = {'loan_amount': 1e13, 'predicted_carbon_reduction': 1e8}
+
+
+def detect_format(filename=None, content_type=None):
+    """csv or ndjson from a file extension or content type, None if unknown"""
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    content_type = (content_type or '').lower()
+    if 'csv' in content_type:
+        return 'csv'
+    if 'ndjson' in content_type or 'jsonl' in content_type:
+        return 'ndjson'
+    return None
+
+
+def read_records(text_stream, fmt):
+    """Yield (row_number, record_or_error) from a CSV or NDJSON text stream.
+
+    Rows are read one at a time, so uploads of any size are never held in
+    memory. A CSV header missing required columns rejects the whole file.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(text_stream)
+        missing = [field for field in REQUIRED_FIELDS if field not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"CSV header is missing columns: {', '.join(missing)}")
+        for row_number, record in enumerate(reader, start=1):
+            yield row_number, record
+    elif fmt == 'ndjson':
+        for row_number, line in enumerate(text_stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield row_number, ValueError(f"Invalid JSON: {e}")
+                continue
+            if not isinstance(record, dict):
+                yield row_number, ValueError('Each line must be a JSON object')
+                continue
+            yield row_number, record
+    else:
+        raise ValueError(f"Unknown import format '{fmt}' (expected one of {', '.join(IMPORT_FORMATS)})")
+
+
+def _optional_number(record, field, low=None, high=None):
+    value = record.get(field)
+    if value is None or value == '':
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} must be a number")
+    if not math.isfinite(number):
+        raise ValueError(f"{field} must be finite")
+    if low is not None and number < low:
+        raise ValueError(f"{field} must be at least {low:g}")
+    if high is not None and number > high:
+        raise ValueError(f"{field} must be at most {high:g}")
+    if field in MAX_MAGNITUDES and abs(number) >= MAX_MAGNITUDES[field]:
+        raise ValueError(f"{field} is out of range")
+    return number
+
+
+def validate_record(record):
+    """Check one record against the create-loan contract; returns a row in IMPORT_FIELDS order"""
+    values = {field: record.get(field) for field in IMPORT_FIELDS}
+    for field in ('loan_id', 'borrower_name', 'project_type', 'description', 'borrower_address'):
+        if values[field] is not None:
+            values[field] = str(values[field]).strip() or None
+    for field in REQUIRED_FIELDS:
+        if values[field] is None or values[field] == '':
+            raise ValueError(f"Missing required field: {field}")
+    for field, limit in MAX_LENGTHS.items():
+        if values[field] is not None and len(values[field]) > limit:
+            raise ValueError(f"{field} is longer than {limit} characters")
+
+    values['loan_amount'] = _optional_number(record, 'loan_amount', low=0)
+    values['eco_score'] = _optional_number(record, 'eco_score', low=0, high=100)
+    values['predicted_carbon_reduction'] = _optional_number(record, 'predicted_carbon_reduction')
+    return tuple(values[field] for field in IMPORT_FIELDS)
+
+
+class LoanImporter:
+    """Stream-validate an upload and load it in COPY-backed chunks.
+
+    Invalid rows are reported and skipped; valid rows are upserted
+    `chunk_size` at a time through Loan.bulk_import. When the database
+    rejects a chunk it is split and retried until the offending rows are
+    isolated, so one bad row never costs its neighbours. The error report
+    keeps the first `max_errors` entries (all of them when None).
+    """
+
+    def __init__(self, chunk_size=10000, max_errors=None):
+        self.chunk_size = chunk_size
+        self.max_errors = max_errors
+
+        self.inserted = 0
+        self.updated = 0
+        self.rejected = 0
+        self.errors = []
+        self.loan_ids = []
+
+    def run(self, text_stream, fmt):
+        started = time.monotonic()
+        rows, row_numbers = [], []
+        total = 0
+        for row_number, record in read_records(text_stream, fmt):
+            total += 1
+            if isinstance(record, Exception):
+                self._reject(row_number, None, record)
+                continue
+            try:
+                rows.append(validate_record(record))
+                row_numbers.append(row_number)
+            except ValueError as e:
+                self._reject(row_number, record.get('loan_id'), e)
+                continue
+            if len(rows) >= self.chunk_size:
+                self._load(rows, row_numbers)
+                rows, row_numbers = [], []
+        self._load(rows, row_numbers)
+
+        elapsed = time.monotonic() - started
+        return {
+            'rows': total,
+            'inserted': self.inserted,
+            'updated': self.updated,
+            'rejected': self.rejected,
+            'errors': self.errors,
+            'errors_truncated': self.max_errors is not None and self.rejected > len(self.errors),
+            'elapsed_s': round(elapsed, 3),
+            'rows_per_s': round(total / elapsed, 1) if elapsed > 0 else None,
+        }
+
+    def _reject(self, row_number, loan_id, error):
+        self.rejected += 1
+        if self.max_errors is None or len(self.errors) < self.max_errors:
+            self.errors.append({'row': row_number, 'loan_id': loan_id, 'error': str(error)})
+
+    def _load(self, rows, row_numbers):
+        if not rows:
+            return
+        try:
+            counts = Loan.bulk_import(rows)
+        except Exception as e:
+            # Only data/constraint errors (SQLSTATE classes 22, 23) are row-specific
+            if str(getattr(e, 'pgcode', None) or '')[:2] not in ('22', '23'):
+                raise
+            if len(rows) == 1:
+                self._reject(row_numbers[0], rows[0][0], str(e).strip().splitlines()[0])
+                return
+            middle = len(rows) // 2
+            self._load(rows[:middle], row_numbers[:middle])
+            self._load(rows[middle:], row_numbers[middle:])
+            return
+        if counts is None:
+            raise RuntimeError('Database unavailable')
+        self.inserted += counts[0]
+        self.updated += counts[1]
+        self.loan_ids.extend(row[0] for row in rows)
+
+
+def score_imported(predict_fn, loan_ids, batch_size=1000, certification_queue=None, readings=None):
+    """Score imported loans in batches (one inference + one bulk update each);
+    `readings` is as for build_feature_block"""
+    loan_ids = list(dict.fromkeys(loan_ids))
+    scored = 0
+    for start in range(0, len(loan_ids), batch_size):
+        results = score_loan_ids(predict_fn, loan_ids[start:start + batch_size], readings)
+        if certification_queue is not None:
+            certification_queue.enqueue_many((loan_id, eco_score) for loan_id, eco_score, _ in results)
+        scored += len(results)
+    print(f"✅ Scored {scored} imported loans")
+    return scored
+
+
+def text_stream(binary_stream):
+    """Decode an uploaded byte stream incrementally (BOM-tolerant UTF-8)"""
+    return io.TextIOWrapper(binary_stream, encoding='utf-8-sig', newline='')
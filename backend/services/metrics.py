@@ -0,0 +1,155 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Count(int):
+    """A Counter's value. Behaves as an int (and serializes as one) in the
+    metrics() dicts, but tells the Prometheus registry to export it as a
+    counter rather than a gauge."""
+
+
+class Counter:
+    """Monotonic counter"""
+
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return Count(self._value)
+
+
+class Histogram:
+    """Fixed-bucket histogram (cumulative counts, Prometheus style)"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        cumulative = []
+        running = 0
+        for bound, n in zip(self.buckets + (float('inf'),), counts):
+            running += n
+            cumulative.append(('+Inf' if bound == float('inf') else bound, running))
+        return {
+            'count': count,
+            'sum': total,
+            'avg': total / count if count else 0.0,
+            'buckets': cumulative,
+        }
+
+
+class Gauge:
+    """Point-in-time value, either set directly or read from `fn` on demand"""
+
+    def __init__(self, fn=None):
+        self._fn = fn
+        self._value = 0.0
+
+    def set(self, value):
+        self._value = value
+
+    @property
+    def value(self):
+        return self._fn() if self._fn is not None else self._value
+
+
+class HistogramVec:
+    """One Histogram per combination of label values (per route, per stage)"""
+
+    def __init__(self, buckets, labelnames):
+        self.buckets = tuple(sorted(buckets))
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, Histogram(self.buckets))
+        return child
+
+    def items(self):
+        with self._lock:
+            return sorted(self._children.items())
+
+
+class CounterVec:
+    """One Counter per combination of label values"""
+
+    def __init__(self, labelnames):
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, Counter())
+        return child
+
+    def items(self):
+        with self._lock:
+            return sorted(self._children.items())
+
+
+class StageTimer:
+    """Per-stage latency (ms) and error counts for a multi-step request.
+
+    `with stages.time('db_read'): ...` costs two perf_counter() calls and a
+    histogram observe, so it can wrap every step of the hot path. Stages
+    already measured elsewhere are recorded with observe().
+    """
+
+    def __init__(self, buckets=(0.1, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)):
+        self.latency_ms = HistogramVec(buckets, ('stage',))
+        self.errors = CounterVec(('stage',))
+
+    @contextmanager
+    def time(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.errors.labels(stage).inc()
+            raise
+        finally:
+            self.latency_ms.labels(stage).observe((time.perf_counter() - started) * 1000)
+
+    def observe(self, stage, elapsed_ms):
+        self.latency_ms.labels(stage).observe(elapsed_ms)
+
+    def metrics(self):
+        errors = dict(self.errors.items())
+        return {
+            stage: dict(histogram.snapshot(), errors=errors[(stage,)].value if (stage,) in errors else 0)
+            for (stage,), histogram in self.latency_ms.items()
+        }
+
+
+# Process-wide stage timings: IoT processing, the score endpoint, model
+# inference, certification and socket emits all record here
+stages = StageTimer()
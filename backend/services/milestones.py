@@ -0,0 +1,217 @@
+import bisect
+import threading
+import time
+from datetime import datetime, timezone
+
+from .metrics import Counter, Histogram, stages
+from .realtime import rooms_for_loan
+
+
+class MilestoneEngine:
+    """Evaluates IoT readings against each loan's open milestones.
+
+    Open milestones are held in memory as {loan_id: {metric: targets}},
+    each target list sorted ascending, so observe() costs one dict lookup
+    for loans without milestones and one comparison against the lowest
+    open target otherwise; a reading never scans the table. Milestones
+    reached by a reading leave the index at once.
+
+    Writes are batched: the latest value per (loan_id, metric) and the
+    newly achieved milestones are handed to `write_progress(updates)` and
+    `write_achieved(achievements)` every `flush_interval_ms`.
+    write_achieved returns the ids that were still open, and
+    milestone_achieved is only emitted for those, so a milestone reached
+    in two backend processes at once is announced once. New milestones
+    are picked up through `load_open(after_id)` every `refresh_interval`
+    seconds, or immediately via add() in the process that created them.
+    Only refresh() moves the id watermark, and it reloads the last
+    `refresh_overlap` ids each time: ids from the sequence can commit out
+    of order across workers, and add() skips milestones already indexed.
+    """
+
+    def __init__(self, load_open, write_progress, write_achieved, emitter,
+                 flush_interval_ms=500, refresh_interval=30.0, refresh_overlap=1000):
+        self.load_open = load_open
+        self.write_progress = write_progress
+        self.write_achieved = write_achieved
+        self.emitter = emitter
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.refresh_interval = refresh_interval
+        self.refresh_overlap = refresh_overlap
+
+        self._index = {}          # loan_id -> {metric: [(target_value, milestone_id), ...]}
+        self._milestones = {}     # milestone_id -> (loan_id, metric, target_value, milestone_name)
+        self._project_types = {}  # loan_id -> project_type, for room routing
+        self._max_id = 0          # highest id loaded by refresh()
+        self._progress = {}       # (loan_id, metric) -> latest value
+        self._achieved = []       # (milestone_id, value, achieved_at)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_refresh = 0.0
+
+        self.readings = Counter()
+        self.checks = Counter()
+        self.achieved = Counter()
+        self.duplicates = Counter()
+        self.progress_written = Counter()
+        self.flushes = Counter()
+        self.flush_errors = Counter()
+        self.flush_ms = Histogram([1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000])
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='milestone-engine', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=10.0):
+        """Stop the flusher and write everything still buffered"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    # --- index ---
+
+    def add(self, milestone_id, loan_id, metric, target_value, milestone_name=None, project_type=None):
+        loan_id = str(loan_id)
+        with self._lock:
+            if milestone_id in self._milestones:
+                return
+            self._milestones[milestone_id] = (loan_id, metric, float(target_value), milestone_name)
+            bisect.insort(self._index.setdefault(loan_id, {}).setdefault(metric, []), (float(target_value), milestone_id))
+            if project_type is not None:
+                self._project_types[loan_id] = project_type
+
+    def refresh(self):
+        """Index milestones created since the last refresh; returns how many rows were loaded"""
+        rows = self.load_open(max(self._max_id - self.refresh_overlap, 0))
+        if rows is None:
+            return 0
+        for milestone_id, loan_id, metric, target_value, milestone_name, project_type in rows:
+            self.add(milestone_id, loan_id, metric, target_value, milestone_name, project_type)
+            self._max_id = max(self._max_id, milestone_id)
+        self._last_refresh = time.monotonic()
+        return len(rows)
+
+    # --- readings ---
+
+    def observe(self, loan_id, reading):
+        """Check one reading (a dict of metric values) against the loan's open milestones"""
+        self.readings.inc()
+        loan_id = str(loan_id)
+        if loan_id not in self._index:
+            return 0
+        reached = 0
+        with self._lock:
+            by_metric = self._index.get(loan_id)
+            if not by_metric:
+                return 0
+            for metric in list(by_metric):
+                value = reading.get(metric)
+                if value is None:
+                    continue
+                value = float(value)
+                targets = by_metric[metric]
+                self.checks.inc()
+                self._progress[(loan_id, metric)] = value
+                count = bisect.bisect_right(targets, (value, float('inf')))
+                if not count:
+                    continue
+                achieved_at = datetime.now(timezone.utc).replace(tzinfo=None)
+                for _, milestone_id in targets[:count]:
+                    self._achieved.append((milestone_id, value, achieved_at))
+                del targets[:count]
+                reached += count
+                if not targets:
+                    del by_metric[metric]
+            if not by_metric:
+                del self._index[loan_id]
+        return reached
+
+    # --- writes ---
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                progress, self._progress = self._progress, {}
+                achieved, self._achieved = self._achieved, []
+            if not progress and not achieved:
+                return 0
+
+            started = time.monotonic()
+            confirmed = None
+            try:
+                # Achievements first: progress updates only touch milestones still open
+                confirmed = self.write_achieved(achieved)
+                written = self.write_progress(sorted((loan_id, metric, value) for (loan_id, metric), value in progress.items()))
+            except Exception as e:
+                print(f"Milestone flush failed: {e}")
+                written = 0
+            finished = time.monotonic()
+            self.flush_ms.observe((finished - started) * 1000)
+            stages.observe('milestone_flush', (finished - started) * 1000)
+
+            if confirmed is None or written != len(progress):
+                self.flush_errors.inc()
+                print(f"⚠️ Milestone flush of {len(achieved)} achievements and {len(progress)} updates failed; retrying")
+                with self._lock:
+                    if confirmed is None:
+                        self._achieved[:0] = achieved
+                    for key, value in progress.items():
+                        self._progress.setdefault(key, value)
+                if confirmed is None:
+                    return 0
+
+            self.flushes.inc()
+            self.progress_written.inc(written)
+            self._announce(achieved, set(confirmed))
+            return len(confirmed)
+
+    def _announce(self, achieved, confirmed):
+        for milestone_id, value, achieved_at in achieved:
+            with self._lock:
+                loan_id, metric, target_value, milestone_name = self._milestones.pop(milestone_id)
+            project_type = self._project_types.get(loan_id)
+            if milestone_id not in confirmed:
+                self.duplicates.inc()
+                continue
+            self.achieved.inc()
+            self.emitter.emit_now('milestone_achieved', {
+                'loan_id': loan_id,
+                'milestone_id': milestone_id,
+                'milestone_name': milestone_name,
+                'metric': metric,
+                'target_value': target_value,
+                'current_value': value,
+                'achieved_at': achieved_at.isoformat(),
+            }, rooms_for_loan(loan_id, project_type))
+
+    def _run(self):
+        while not self._stop.is_set():
+            if time.monotonic() - self._last_refresh >= self.refresh_interval:
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"Milestone refresh failed: {e}")
+            self.flush()
+            self._stop.wait(self.flush_interval)
+
+    def metrics(self):
+        return {
+            'loans_indexed': len(self._index),
+            'open_milestones': len(self._milestones) - len(self._achieved),
+            'pending_progress': len(self._progress),
+            'pending_achieved': len(self._achieved),
+            'readings': self.readings.value,
+            'checks': self.checks.value,
+            'achieved': self.achieved.value,
+            'duplicates': self.duplicates.value,
+            'progress_written': self.progress_written.value,
+            'flushes': self.flushes.value,
+            'flush_errors': self.flush_errors.value,
+            'flush_ms': self.flush_ms.snapshot(),
+        }
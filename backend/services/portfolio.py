@@ -0,0 +1,198 @@
+import threading
+import time
+
+from .metrics import Counter
+
+# Rollup key used for loans without a project_type
+UNSPECIFIED = 'unspecified'
+
+# Additive measures kept per (project_type, status)
+MEASURES = ('loan_count', 'scored_count', 'eco_score_sum', 'carbon_sum', 'loan_amount_sum', 'certified_count')
+
+# Deltas are summed per group per slice of this many seconds, stamped with the
+# slice start, so a rebuild can tell which ones it already includes
+STAMP_RESOLUTION = 0.01
+
+
+def _number(value):
+    return float(value) if value is not None else 0.0
+
+
+class PortfolioRollups:
+    """Incremental portfolio rollups by (project_type, status).
+
+    Writers record deltas (a new loan, a score change, a first certification)
+    after their write commits; deltas are summed in memory per group and per
+    STAMP_RESOLUTION slice of wall-clock time, so the buffer stays bounded
+    by groups x slices per flush however many loans change. A background
+    thread hands the buffer to `apply(deltas)`, keyed by (project_type,
+    status, recorded_at), every `flush_interval` seconds and calls
+    `reconcile(max_age)` every `reconcile_interval` seconds to rebuild the
+    rollups from the loans table, correcting any drift (e.g. deltas lost in
+    a crash). apply() must drop deltas recorded before the last rebuild:
+    their writes were committed before it and are already counted, whether
+    they were buffered here or in another process.
+    """
+
+    def __init__(self, apply, reconcile=None, flush_interval=1.0, reconcile_interval=900.0):
+        self.apply = apply
+        self.reconcile_fn = reconcile
+        self.flush_interval = flush_interval
+        self.reconcile_interval = reconcile_interval
+
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_reconcile_check = 0.0
+
+        self.recorded = Counter()
+        self.flushes = Counter()
+        self.flush_errors = Counter()
+        self.reconciles = Counter()
+
+    def record(self, project_type, status, **measures):
+        stamp = int(time.time() / STAMP_RESOLUTION) * STAMP_RESOLUTION
+        key = (project_type or UNSPECIFIED, status or 'pending', stamp)
+        with self._lock:
+            totals = self._pending.setdefault(key, dict.fromkeys(MEASURES, 0))
+            for name, value in measures.items():
+                totals[name] += value
+        self.recorded.inc()
+
+    def record_created(self, project_type, status, loan_amount, eco_score=None, carbon=None):
+        self.record(
+            project_type, status,
+            loan_count=1,
+            scored_count=1 if eco_score is not None else 0,
+            eco_score_sum=_number(eco_score),
+            carbon_sum=_number(carbon),
+            loan_amount_sum=_number(loan_amount)
+        )
+
+    def record_removed(self, project_type, status, loan_amount, eco_score=None, carbon=None):
+        """Take a loan's previous values out of its group (e.g. before it is replaced)"""
+        self.record(
+            project_type, status,
+            loan_count=-1,
+            scored_count=-1 if eco_score is not None else 0,
+            eco_score_sum=-_number(eco_score),
+            carbon_sum=-_number(carbon),
+            loan_amount_sum=-_number(loan_amount)
+        )
+
+    def record_rescored(self, project_type, status, old_score, new_score, old_carbon, new_carbon):
+        self.record(
+            project_type, status,
+            scored_count=(new_score is not None) - (old_score is not None),
+            eco_score_sum=_number(new_score) - _number(old_score),
+            carbon_sum=_number(new_carbon) - _number(old_carbon)
+        )
+
+    def record_certified(self, project_type, status):
+        self.record(project_type, status, certified_count=1)
+
+    def flush(self):
+        """Apply buffered deltas; on failure they are merged back for the next flush"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            applied = self.apply(pending)
+        except Exception as e:
+            print(f"Portfolio rollup flush failed: {e}")
+            applied = False
+        if not applied:
+            self.flush_errors.inc()
+            with self._lock:
+                for key, deltas in pending.items():
+                    totals = self._pending.setdefault(key, dict.fromkeys(MEASURES, 0))
+                    for name, value in deltas.items():
+                        totals[name] += value
+            return 0
+        self.flushes.inc()
+        return len(pending)
+
+    def reconcile(self):
+        """Flush, then rebuild the rollups from Postgres if they are older than the interval"""
+        self.flush()
+        if self.reconcile_fn is None:
+            return False
+        if self.reconcile_fn(self.reconcile_interval):
+            self.reconciles.inc()
+            return True
+        return False
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='portfolio-rollups', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if time.monotonic() - self._last_reconcile_check >= self.reconcile_interval:
+                    self._last_reconcile_check = time.monotonic()
+                    self.reconcile()
+                else:
+                    self.flush()
+            except Exception as e:
+                print(f"Portfolio rollup error: {e}")
+            self._stop.wait(self.flush_interval)
+
+    def metrics(self):
+        return {
+            'pending_groups': len(self._pending),
+            'recorded': self.recorded.value,
+            'flushes': self.flushes.value,
+            'flush_errors': self.flush_errors.value,
+            'reconciles': self.reconciles.value,
+        }
+
+
+def summarize(rows):
+    """Build the summary payload from rollup rows (one per project_type/status).
+
+    Cost depends only on the number of groups, never on the number of loans.
+    """
+    def finish(totals):
+        scored = totals['scored_count']
+        return {
+            'loan_count': int(totals['loan_count']),
+            'scored_count': int(scored),
+            'total_eco_score': totals['eco_score_sum'],
+            'average_eco_score': totals['eco_score_sum'] / scored if scored else None,
+            'total_carbon_reduction': totals['carbon_sum'],
+            'total_loan_amount': totals['loan_amount_sum'],
+            'certified_count': int(totals['certified_count']),
+        }
+
+    overall = dict.fromkeys(MEASURES, 0.0)
+    by_project_type, by_status, groups = {}, {}, []
+    reconciled_at = None
+    for row in rows:
+        for bucket in (overall,
+                       by_project_type.setdefault(row['project_type'], dict.fromkeys(MEASURES, 0.0)),
+                       by_status.setdefault(row['status'], dict.fromkeys(MEASURES, 0.0))):
+            for name in MEASURES:
+                bucket[name] += row[name]
+        groups.append({'project_type': row['project_type'], 'status': row['status'], **finish(row)})
+        if row.get('reconciled_at') and (reconciled_at is None or row['reconciled_at'] < reconciled_at):
+            reconciled_at = row['reconciled_at']
+
+    return {
+        'totals': finish(overall),
+        'by_project_type': {key: finish(value) for key, value in by_project_type.items()},
+        'by_status': {key: finish(value) for key, value in by_status.items()},
+        'groups': groups,
+        'reconciled_at': reconciled_at,
+    }
@@ -0,0 +1,88 @@
+import hashlib
+import threading
+
+import numpy as np
+
+from .cache import LRUCache
+from .metrics import Counter
+
+
+class PredictionCache:
+    """Memoizes eco scores by a fingerprint of the quantized input sequence.
+
+    Keys combine the model version with a hash of the sequence rounded to
+    `quantum`, so readings that differ only by sensor noise share an entry.
+    A new model version makes every old key unreachable: the local LRU is
+    cleared on the first lookup after a model change, and stale Redis
+    entries simply expire.
+    """
+
+    def __init__(self, version_fn, redis_client=None, max_size=100000, ttl=3600, quantum=0.01):
+        self.version_fn = version_fn
+        self.redis = redis_client
+        self.ttl = ttl
+        self.quantum = quantum
+        self.local = LRUCache(max_size=max_size, ttl=ttl)
+        self._version = None
+        self._version_lock = threading.Lock()
+
+        self.hits = Counter()
+        self.redis_hits = Counter()
+        self.misses = Counter()
+        self.invalidations = Counter()
+        self.redis_errors = Counter()
+
+    def key(self, sequence):
+        version = self.version_fn()
+        if version != self._version:
+            with self._version_lock:
+                if version != self._version:
+                    if self._version is not None:
+                        self.local.clear()
+                        self.invalidations.inc()
+                    self._version = version
+        quantized = np.rint(np.asarray(sequence, dtype=np.float64) / self.quantum).astype(np.int64)
+        digest = hashlib.blake2b(quantized.tobytes(), digest_size=16)
+        digest.update(str(quantized.shape).encode())
+        return f"{version}:{digest.hexdigest()}"
+
+    def get(self, key):
+        score = self.local.get(key)
+        if score is not None:
+            self.hits.inc()
+            return score
+        if self.redis is not None:
+            try:
+                raw = self.redis.get(f"ecoscore:prediction:{key}")
+            except Exception:
+                self.redis_errors.inc()
+                raw = None
+            if raw is not None:
+                score = float(raw)
+                self.local.set(key, score)
+                self.redis_hits.inc()
+                return score
+        self.misses.inc()
+        return None
+
+    def set(self, key, score):
+        self.local.set(key, score)
+        if self.redis is not None:
+            try:
+                self.redis.set(f"ecoscore:prediction:{key}", score, ex=self.ttl)
+            except Exception:
+                self.redis_errors.inc()
+
+    def metrics(self):
+        hits = self.hits.value + self.redis_hits.value
+        lookups = hits + self.misses.value
+        return {
+            'model_version': self._version,
+            'local_hits': self.hits.value,
+            'redis_hits': self.redis_hits.value,
+            'misses': self.misses.value,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            'invalidations': self.invalidations.value,
+            'redis_errors': self.redis_errors.value,
+            'local_size': len(self.local),
+        }
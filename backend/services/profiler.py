@@ -0,0 +1,108 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter as Tally
+
+# Leaf frames of threads parked on a lock, queue or socket
+IDLE_FRAMES = {
+    ('threading.py', 'wait'),
+    ('threading.py', '_wait_for_tstate_lock'),
+    ('queue.py', 'get'),
+    ('selectors.py', 'select'),
+    ('socket.py', 'readinto'),
+    ('ssl.py', 'read'),
+}
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class SamplingProfiler:
+    """Statistical profiler for a live process.
+
+    A background thread snapshots every thread's Python stack with
+    sys._current_frames() each `interval_ms` and tallies identical stacks;
+    nothing is hooked into the profiled code, so the cost is one stack walk
+    per thread per sample and zero when the profiler is not running.
+    Threads blocked in IDLE_FRAMES are skipped unless include_idle=True.
+    folded() emits the "frame;frame;frame count" format read by
+    flamegraph.pl and speedscope; top() lists the hottest functions.
+    Only OS threads are visible (not eventlet/gevent greenlets).
+    """
+
+    def __init__(self, interval_ms=5, max_depth=64, include_idle=False):
+        self.interval = interval_ms / 1000.0
+        self.max_depth = max_depth
+        self.include_idle = include_idle
+        self.stacks = Tally()
+        self.samples = 0
+        self.started_at = None
+        self.stopped_at = None
+        self._ignored = set()  # thread idents not to sample
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self.started_at = time.time()
+            self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.stopped_at = time.time()
+        return self
+
+    def run_for(self, seconds):
+        """Profile for `seconds`, blocking (and not sampling) the caller"""
+        self._ignored.add(threading.get_ident())
+        self.start()
+        time.sleep(seconds)
+        return self.stop()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own or thread_id in self._ignored:
+                    continue
+                code = frame.f_code
+                if not self.include_idle and (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, f'thread-{thread_id}'))
+                self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self):
+        """Collapsed stacks, hottest first, one "thread;outer;...;leaf count" per line"""
+        return '\n'.join(f"{';'.join(stack)} {count}" for stack, count in self.stacks.most_common()) + '\n'
+
+    def top(self, limit=25):
+        """Hottest functions by self (leaf) and total (anywhere on the stack) samples"""
+        own, total = Tally(), Tally()
+        for stack, count in self.stacks.items():
+            frames = stack[1:]
+            if not frames:
+                continue
+            own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+        return {
+            'samples': self.samples,
+            'interval_ms': self.interval * 1000,
+            'duration_s': ((self.stopped_at or time.time()) - self.started_at) if self.started_at else 0.0,
+            'self': [{'frame': frame, 'samples': count} for frame, count in own.most_common(limit)],
+            'total': [{'frame': frame, 'samples': count} for frame, count in total.most_common(limit)],
+        }
@@ -0,0 +1,133 @@
+import math
+import re
+
+from .metrics import Count, Counter, CounterVec, Gauge, Histogram, HistogramVec
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_INVALID_CHARS = re.compile(r'[^a-zA-Z0-9_]')
+
+
+def metric_name(*parts):
+    name = _INVALID_CHARS.sub('_', '_'.join(str(part) for part in parts if part != ''))
+    return name if not name[:1].isdigit() else '_' + name
+
+
+def _value(value):
+    if value is None:
+        return 'NaN'
+    value = float(value)
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def _escape_help(text):
+    return str(text).replace('\\', '\\\\').replace('\n', '\\n')
+
+
+def _escape(value):
+    return _escape_help(value).replace('"', '\\"')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def _is_histogram_snapshot(value):
+    return isinstance(value, dict) and 'buckets' in value and 'count' in value and 'sum' in value
+
+
+class Registry:
+    """Prometheus text exposition (format 0.0.4) for services.metrics.
+
+    There is no client library: registered Counter, Gauge, Histogram,
+    CounterVec and HistogramVec objects are rendered as-is, and each
+    collector's `metrics()` dict is exported too (Counter values as
+    <name>_total counters, other numeric leaves as gauges, Histogram
+    snapshots as histograms), so /metrics and /health always
+    report the same numbers. Nothing is computed until a scrape.
+    """
+
+    def __init__(self, namespace='ecoscore'):
+        self.namespace = namespace
+        self._metrics = []  # (name, help, metric)
+        self._collectors = []  # (name, fn)
+
+    def register(self, name, metric, help=''):
+        self._metrics.append((metric_name(self.namespace, name), help, metric))
+        return metric
+
+    def register_collector(self, name, fn):
+        """Export the dict returned by `fn()` (e.g. a component's metrics())"""
+        self._collectors.append((metric_name(self.namespace, name), fn))
+
+    def render(self):
+        lines = []
+        for name, help, metric in self._metrics:
+            self._render_metric(lines, name, help, metric)
+        for name, fn in self._collectors:
+            try:
+                data = fn()
+            except Exception as e:
+                print(f"Metrics collector {name} failed: {e}")
+                continue
+            self._render_tree(lines, name, data)
+        return '\n'.join(lines) + '\n'
+
+    def _render_metric(self, lines, name, help, metric):
+        # Counters are exposed as <name>_total; HELP, TYPE and samples share the name
+        if isinstance(metric, (Counter, CounterVec)) and not name.endswith('_total'):
+            name += '_total'
+        if help:
+            lines.append(f'# HELP {name} {_escape_help(help)}')
+        if isinstance(metric, Counter):
+            lines.append(f'# TYPE {name} counter')
+            lines.append(f'{name} {_value(metric.value)}')
+        elif isinstance(metric, Gauge):
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {_value(metric.value)}')
+        elif isinstance(metric, Histogram):
+            lines.append(f'# TYPE {name} histogram')
+            self._render_histogram(lines, name, (), metric.snapshot())
+        elif isinstance(metric, CounterVec):
+            lines.append(f'# TYPE {name} counter')
+            for values, counter in metric.items():
+                lines.append(f'{name}{_labels(zip(metric.labelnames, values))} {_value(counter.value)}')
+        elif isinstance(metric, HistogramVec):
+            lines.append(f'# TYPE {name} histogram')
+            for values, histogram in metric.items():
+                self._render_histogram(lines, name, tuple(zip(metric.labelnames, values)), histogram.snapshot())
+        else:
+            raise TypeError(f"Cannot export {type(metric).__name__} as {name}")
+
+    def _render_histogram(self, lines, name, labels, snapshot):
+        for bound, count in snapshot['buckets']:
+            le = '+Inf' if bound == '+Inf' else _value(bound)
+            lines.append(f'{name}_bucket{_labels(labels + (("le", le),))} {count}')
+        lines.append(f'{name}_sum{_labels(labels)} {_value(snapshot["sum"])}')
+        lines.append(f'{name}_count{_labels(labels)} {snapshot["count"]}')
+
+    def _render_tree(self, lines, name, data):
+        if _is_histogram_snapshot(data):
+            lines.append(f'# TYPE {name} histogram')
+            self._render_histogram(lines, name, (), data)
+        elif isinstance(data, dict):
+            for key, value in data.items():
+                self._render_tree(lines, metric_name(name, key), value)
+        elif isinstance(data, bool):
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {int(data)}')
+        elif isinstance(data, Count):
+            if not name.endswith('_total'):
+                name += '_total'
+            lines.append(f'# TYPE {name} counter')
+            lines.append(f'{name} {_value(data)}')
+        elif isinstance(data, (int, float)):
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {_value(data)}')
+        # strings, lists and None carry no sample
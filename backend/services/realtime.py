@@ -0,0 +1,120 @@
+import threading
+import time
+
+from .metrics import Counter, stages
+
+PORTFOLIO_ROOM_PREFIX = 'portfolio:'
+ALL_LOANS_ROOM = PORTFOLIO_ROOM_PREFIX + 'all'
+
+
+def loan_room(loan_id):
+    return f'loan:{loan_id}'
+
+
+def portfolio_room(portfolio):
+    return f'{PORTFOLIO_ROOM_PREFIX}{portfolio}'
+
+
+def rooms_for_loan(loan_id, project_type=None):
+    """Rooms interested in one loan: its own room, its portfolio and the all-loans room"""
+    rooms = [loan_room(loan_id), ALL_LOANS_ROOM]
+    if project_type:
+        rooms.append(portfolio_room(project_type))
+    return rooms
+
+
+class RoomEmitter:
+    """Throttled, room-scoped Socket.IO emits.
+
+    emit() buffers the latest payload per (room, event, merge_key) and a
+    background thread sends whatever is buffered every `interval_ms`, so a
+    loan updating 50 times a second reaches each room at most once per
+    interval. Portfolio rooms, which follow many loans, instead get one
+    `<event>_batch` frame per interval, {'updates': {merge_key: payload}},
+    holding the latest payload of every key that emitted. Overwritten
+    payloads are counted as dropped frames; interval_ms=0 sends at once.
+    emit_now() bypasses the buffer for events that must never be merged.
+    `socketio` is anything with emit(event, data, room=...): flask_socketio's
+    SocketIO (with a Redis message_queue for multi-worker fan-out), a
+    write-only socketio.RedisManager, or services.fakes.FakeSocketIO.
+    """
+
+    def __init__(self, socketio, interval_ms=250):
+        self.socketio = socketio
+        self.interval = interval_ms / 1000.0
+        self._pending = {}
+        self._batches = {}  # (portfolio room, event) -> {merge_key: payload}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._started_at = time.monotonic()
+
+        self.emitted = Counter()
+        self.dropped_frames = Counter()
+        self.errors = Counter()
+
+    def start(self):
+        if self.interval > 0 and (self._thread is None or not self._thread.is_alive()):
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='socket-emitter', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    def emit(self, event, payload, rooms, merge_key=None):
+        with self._lock:
+            for room in rooms:
+                if merge_key is not None and room.startswith(PORTFOLIO_ROOM_PREFIX):
+                    updates = self._batches.setdefault((room, event), {})
+                    if merge_key in updates:
+                        self.dropped_frames.inc()
+                    updates[merge_key] = payload
+                    continue
+                key = (room, event, merge_key)
+                if key in self._pending:
+                    self.dropped_frames.inc()
+                self._pending[key] = payload
+        if self.interval <= 0:
+            self.flush()
+
+    def emit_now(self, event, payload, rooms):
+        for room in rooms:
+            self._send(event, payload, room)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            batches, self._batches = self._batches, {}
+        for (room, event, _), payload in pending.items():
+            self._send(event, payload, room)
+        for (room, event), updates in batches.items():
+            self._send(f'{event}_batch', {'updates': updates}, room)
+
+    def _send(self, event, payload, room):
+        try:
+            with stages.time('socket_emit'):
+                self.socketio.emit(event, payload, room=room)
+            self.emitted.inc()
+        except Exception as e:
+            self.errors.inc()
+            print(f"Socket emit of {event} to {room} failed: {e}")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def metrics(self):
+        uptime = time.monotonic() - self._started_at
+        return {
+            'interval_ms': self.interval * 1000,
+            'pending': len(self._pending) + len(self._batches),
+            'emitted': self.emitted.value,
+            'emit_rate_per_s': self.emitted.value / uptime if uptime > 0 else 0.0,
+            'dropped_frames': self.dropped_frames.value,
+            'errors': self.errors.value,
+        }
@@ -0,0 +1,134 @@
+import json
+import os
+import time
+
+import numpy as np
+
+from config.database import DatabaseConfig
+from models.loan import Loan
+from .scoring import SEQUENCE_LENGTH
+from .timeseries import ReadingStore, ReadingWindow
+
+
+def build_feature_block(rows, readings=None, steps=SEQUENCE_LENGTH):
+    """Turn scoring rows into an (N, steps, 3) float32 block without per-row Python lists.
+
+    rows: (loan_id, loan_amount, predicted_carbon_reduction, project_type) tuples
+    readings: loan_id -> recent carbon readings, oldest first (e.g.
+        ReadingWindow.sequence). Loans with history get the same window
+        build_reading_sequence feeds the IoT and single-loan paths; loans
+        without one repeat their stored value at every step.
+    """
+    n = len(rows)
+    features = np.empty((n, 3), dtype=np.float32)
+    features[:, 0] = np.fromiter((row[1] for row in rows), dtype=np.float64, count=n)
+    features[:, 1] = np.fromiter((row[2] or 0 for row in rows), dtype=np.float64, count=n)
+    features[:, 2] = np.fromiter((row[3] == 'solar' for row in rows), dtype=np.float32, count=n)
+    block = np.ascontiguousarray(np.broadcast_to(features[:, None, :], (n, steps, 3)))
+    if readings is not None:
+        for index, row in enumerate(rows):
+            history = list(readings(row[0]))[-steps:]
+            if history:
+                # Front-padded with the oldest reading, as in build_reading_sequence
+                block[index, :steps - len(history), 1] = history[0]
+                block[index, steps - len(history):, 1] = history
+    return block
+
+
+def score_rows(predict_fn, rows, readings=None):
+    """Score a block of rows; returns [(loan_id, eco_score, carbon_value)]"""
+    if not rows:
+        return []
+    scores = np.asarray(predict_fn(build_feature_block(rows, readings))).reshape(-1)
+    return [
+        (row[0], round(float(score), 2), row[2] or 0)
+        for row, score in zip(rows, scores)
+    ]
+
+
+def score_loan_ids(predict_fn, loan_ids, readings=None):
+    """Score and persist a specific set of loans"""
+    rows = Loan.get_scoring_rows(loan_ids)
+    results = score_rows(predict_fn, rows, readings)
+    Loan.bulk_update_scores(results)
+    return results
+
+
+def stored_reading_windows(since_days=30):
+    """ReadingWindow warmed from the Mongo reading store, for offline jobs that
+    have no live MQTT window; None when the store is disabled or unreachable"""
+    if os.getenv('IOT_STORE_ENABLED', '1') != '1':
+        return None
+    mongo_db = DatabaseConfig.get_mongodb_client()
+    if mongo_db is None:
+        return None
+    window = ReadingWindow()
+    try:
+        loans = ReadingStore(mongo_db).rebuild_window(window, since_days=since_days)
+    except Exception as e:
+        print(f"Reading history unavailable, scoring from stored values: {e}")
+        return None
+    print(f"📚 Loaded reading windows for {loans} loans")
+    return window
+
+
+def _read_checkpoint(path):
+    if not path or not os.path.exists(path):
+        return None, 0
+    with open(path) as f:
+        state = json.load(f)
+    return state.get('last_loan_id'), state.get('processed', 0)
+
+
+def _write_checkpoint(path, last_loan_id, processed):
+    if not path:
+        return
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'last_loan_id': last_loan_id, 'processed': processed}, f)
+    os.replace(tmp_path, path)  # atomic, so a crash never leaves a torn checkpoint
+
+
+def rescore_portfolio(predict_fn, chunk_size=10000, checkpoint_path=None, progress_every=5.0,
+                      certification_queue=None, readings=None):
+    """Re-score every loan: stream chunks, one batched inference and one bulk UPDATE per chunk.
+
+    Progress is checkpointed after each committed chunk, so a rerun after a
+    crash resumes from the last loan_id written; the checkpoint is removed
+    once the whole book has been scored, so the next run starts over. Loans that now qualify are queued on
+    `certification_queue` when one is given. `readings` is as for
+    build_feature_block.
+    """
+    last_loan_id, processed = _read_checkpoint(checkpoint_path)
+    if last_loan_id is not None:
+        print(f"⏩ Resuming after loan {last_loan_id} ({processed} already scored)")
+
+    started = time.monotonic()
+    last_report = started
+    scored_this_run = 0
+
+    for rows in Loan.iter_scoring_rows(chunk_size=chunk_size, after_loan_id=last_loan_id):
+        results = score_rows(predict_fn, rows, readings)
+        if Loan.bulk_update_scores(results) != len(results):
+            raise RuntimeError(f"Bulk score update failed after loan {last_loan_id}")
+        if certification_queue is not None:
+            certification_queue.enqueue_many((loan_id, eco_score) for loan_id, eco_score, _ in results)
+
+        last_loan_id = rows[-1][0]
+        processed += len(rows)
+        scored_this_run += len(rows)
+        _write_checkpoint(checkpoint_path, last_loan_id, processed)
+
+        now = time.monotonic()
+        if now - last_report >= progress_every:
+            rate = scored_this_run / (now - started)
+            print(f"📈 {processed} loans scored ({rate:,.0f} loans/s), last loan {last_loan_id}")
+            last_report = now
+
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    elapsed = time.monotonic() - started
+    rate = scored_this_run / elapsed if elapsed > 0 else 0.0
+    print(f"✅ Re-scored {scored_this_run} loans in {elapsed:.1f}s ({rate:,.0f} loans/s)")
+    return {'processed': processed, 'scored_this_run': scored_this_run, 'elapsed_s': elapsed, 'loans_per_s': rate}
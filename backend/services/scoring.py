@@ -0,0 +1,165 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from .metrics import Counter, Histogram, stages
+
+SEQUENCE_LENGTH = 12
+
+
+def build_features(loan, carbon_val):
+    """Feature vector for one time step: loan amount, carbon reduction, solar flag"""
+    return [loan['loan_amount'], carbon_val, 1 if loan['project_type'] == 'solar' else 0]
+
+
+def build_sequence(features, steps=SEQUENCE_LENGTH):
+    """Repeat a feature vector into a (steps, n_features) LSTM input"""
+    return np.array([features] * steps, dtype=np.float32)
+
+
+def build_reading_sequence(loan, readings, steps=SEQUENCE_LENGTH):
+    """(steps, 3) LSTM input from a loan's recent carbon readings, oldest first.
+
+    Short histories are front-padded with the oldest reading.
+    """
+    readings = list(readings)[-steps:]
+    sequence = np.empty((steps, 3), dtype=np.float32)
+    sequence[:, 0] = loan['loan_amount']
+    sequence[:, 2] = 1 if loan['project_type'] == 'solar' else 0
+    sequence[:steps - len(readings), 1] = readings[0]
+    sequence[steps - len(readings):, 1] = readings
+    return sequence
+
+
+class ScoringEngine:
+    """Micro-batching inference engine.
+
+    Callers submit one (T, F) sequence at a time; a background thread groups
+    pending requests into a single (N, T, F) batch, flushing when the batch is
+    full or the oldest request has waited `max_wait_ms`, and runs one
+    vectorized forward pass. `predict_fn` maps a batch to N eco scores.
+    With a PredictionCache, repeated inputs are answered without queueing.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=64, max_wait_ms=20, max_queue_size=10000, cache=None):
+        self.predict_fn = predict_fn
+        self.cache = cache
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.batch_size = Histogram([1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024])
+        self.queue_latency_ms = Histogram([0.5, 1, 2, 5, 10, 20, 50, 100, 250, 500, 1000])
+        self.inference_ms = Histogram([1, 2, 5, 10, 20, 50, 100, 250, 500, 1000])
+        self.batches = Counter()
+        self.errors = Counter()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='scoring-engine', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def submit(self, sequence, timeout=1.0):
+        """Queue one (T, F) sequence; returns a Future resolving to its eco score"""
+        future = Future()
+        sequence = np.asarray(sequence, dtype=np.float32)
+        key = None
+        if self.cache is not None:
+            key = self.cache.key(sequence)
+            score = self.cache.get(key)
+            if score is not None:
+                future.set_result(score)
+                return future
+        self._queue.put((sequence, future, time.monotonic(), key), timeout=timeout)
+        return future
+
+    def score(self, sequence, timeout=10.0):
+        """Blocking convenience wrapper around submit()"""
+        return self.submit(sequence).result(timeout=timeout)
+
+    def _collect(self):
+        """Block for the first request, then gather more until full or deadline"""
+        try:
+            first = self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = first[2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._collect()
+            if batch:
+                self._run_batch(batch)
+        # Drain so no caller is left waiting on shutdown
+        while True:
+            batch = self._collect_nowait()
+            if not batch:
+                break
+            self._run_batch(batch)
+
+    def _collect_nowait(self):
+        batch = []
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run_batch(self, batch):
+        started = time.monotonic()
+        for _, _, enqueued_at, _ in batch:
+            self.queue_latency_ms.observe((started - enqueued_at) * 1000)
+        self.batch_size.observe(len(batch))
+        self.batches.inc()
+
+        try:
+            scores = np.asarray(self.predict_fn(np.stack([item[0] for item in batch]))).reshape(-1)
+        except Exception as e:
+            self.errors.inc()
+            stages.errors.labels('model_predict').inc()
+            for _, future, _, _ in batch:
+                future.set_exception(e)
+            return
+        elapsed_ms = (time.monotonic() - started) * 1000
+        self.inference_ms.observe(elapsed_ms)
+        stages.observe('model_predict', elapsed_ms)
+
+        for (_, future, _, key), score in zip(batch, scores):
+            if key is not None:
+                self.cache.set(key, float(score))
+            future.set_result(float(score))
+
+    def metrics(self):
+        return {
+            'queue_depth': self._queue.qsize(),
+            'batches': self.batches.value,
+            'errors': self.errors.value,
+            'batch_size': self.batch_size.snapshot(),
+            'queue_latency_ms': self.queue_latency_ms.snapshot(),
+            'inference_ms': self.inference_ms.snapshot(),
+        }
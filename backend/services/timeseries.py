@@ -0,0 +1,199 @@
+import threading
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+from .metrics import Counter
+from .scoring import SEQUENCE_LENGTH
+
+READING_FIELD = 'predicted_carbon_reduction'
+
+# MongoDB duplicate key error code
+DUPLICATE_KEY = 11000
+
+
+class ReadingWindow:
+    """Last `size` readings per loan, kept in memory for O(1) sequence retrieval.
+
+    Loan ids are normalized to strings, so a device sending 42 and a request
+    for '42' share one window.
+    """
+
+    def __init__(self, size=SEQUENCE_LENGTH):
+        self.size = size
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def append(self, loan_id, value):
+        loan_id = str(loan_id)
+        with self._lock:
+            window = self._windows.get(loan_id)
+            if window is None:
+                window = self._windows[loan_id] = deque(maxlen=self.size)
+            window.append(value)
+
+    def load(self, loan_id, values):
+        """Replace a loan's window with `values` (oldest first)"""
+        with self._lock:
+            self._windows[str(loan_id)] = deque(values[-self.size:], maxlen=self.size)
+
+    def sequence(self, loan_id):
+        """Readings oldest first; empty if the loan has none"""
+        with self._lock:
+            window = self._windows.get(str(loan_id))
+            return list(window) if window else []
+
+    def __len__(self):
+        return len(self._windows)
+
+
+class ReadingStore:
+    """Buffered writer for raw IoT readings into a MongoDB time-series collection.
+
+    Readings are appended to an in-memory buffer and written with one
+    insert_many per `batch_size` readings or `flush_interval` seconds,
+    whichever comes first. Inserts are unordered: when some documents of a
+    batch fail, only those are kept for the next flush.
+    """
+
+    def __init__(self, db, collection='iot_readings', batch_size=500, flush_interval=1.0,
+                 max_buffer=100000):
+        self.db = db
+        self.collection_name = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.written = Counter()
+        self.dropped = Counter()
+        self.write_errors = Counter()
+
+    @property
+    def collection(self):
+        return self.db[self.collection_name]
+
+    def ensure_collection(self):
+        """Create the time-series collection and its (loan_id, ts) index if missing"""
+        if self.collection_name not in self.db.list_collection_names():
+            self.db.create_collection(
+                self.collection_name,
+                timeseries={'timeField': 'ts', 'metaField': 'loan_id', 'granularity': 'seconds'}
+            )
+        self.collection.create_index([('loan_id', 1), ('ts', -1)])
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='iot-reading-writer', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    def add(self, reading, ts=None):
+        """Buffer one reading (a dict with loan_id and sensor fields)"""
+        document = dict(reading)
+        if document.get('loan_id') is not None:
+            # Devices may send numeric ids; loans are keyed by string
+            document['loan_id'] = str(document['loan_id'])
+        document['ts'] = ts or datetime.now(timezone.utc)
+        with self._lock:
+            if len(self._buffer) >= self.max_buffer:
+                self.dropped.inc()
+                return
+            self._buffer.append(document)
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+            if not batch:
+                return 0
+            try:
+                self.collection.insert_many(batch, ordered=False)
+                self.written.inc(len(batch))
+                return len(batch)
+            except Exception as e:
+                self.write_errors.inc()
+                failed = self._failed_documents(e, batch)
+                print(f"MongoDB reading write failed ({len(failed)} of {len(batch)} readings): {e}")
+                written = len(batch) - len(failed)
+                self.written.inc(written)
+                batch = failed
+                with self._lock:
+                    # Keep the readings for the next attempt, within the buffer cap
+                    room = max(0, self.max_buffer - len(self._buffer))
+                    self._buffer[:0] = batch[-room:] if room else []
+                    self.dropped.inc(len(batch) - min(room, len(batch)))
+                return written
+
+    @staticmethod
+    def _failed_documents(error, batch):
+        """The documents of `batch` that were not written. A BulkWriteError
+        lists them by index (duplicates are already stored); any other error
+        may have written nothing."""
+        from pymongo.errors import BulkWriteError
+        if not isinstance(error, BulkWriteError):
+            return batch
+        indexes = {
+            write_error['index'] for write_error in error.details.get('writeErrors', [])
+            if write_error.get('code') != DUPLICATE_KEY
+        }
+        return [document for index, document in enumerate(batch) if index in indexes]
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def recent(self, size=SEQUENCE_LENGTH, since_days=30, field=READING_FIELD):
+        """{loan_id: [values oldest first]} for the last `size` readings of each loan"""
+        since = datetime.now(timezone.utc) - timedelta(days=since_days)
+        pipeline = [
+            {'$match': {'ts': {'$gte': since}, field: {'$ne': None}}},
+            {'$group': {
+                '_id': '$loan_id',
+                'values': {'$topN': {'n': size, 'sortBy': {'ts': -1}, 'output': f'${field}'}}
+            }},
+        ]
+        return {
+            doc['_id']: list(reversed(doc['values']))
+            for doc in self.collection.aggregate(pipeline, allowDiskUse=True)
+        }
+
+    def sequence(self, loan_id, size=SEQUENCE_LENGTH, field=READING_FIELD):
+        """One loan's last `size` stored readings, oldest first"""
+        cursor = self.collection.find(
+            {'loan_id': str(loan_id), field: {'$ne': None}}, {field: 1, '_id': 0}
+        ).sort('ts', -1).limit(size)
+        return list(reversed([doc[field] for doc in cursor]))
+
+    def rebuild_window(self, window, since_days=30):
+        """Warm a ReadingWindow from stored readings (e.g. on startup)"""
+        recent = self.recent(size=window.size, since_days=since_days)
+        for loan_id, values in recent.items():
+            window.load(loan_id, values)
+        return len(recent)
+
+    def metrics(self):
+        return {
+            'buffered': len(self._buffer),
+            'written': self.written.value,
+            'dropped': self.dropped.value,
+            'write_errors': self.write_errors.value,
+        }
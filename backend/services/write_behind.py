@@ -0,0 +1,176 @@
+import threading
+import time
+
+from .metrics import Counter, Histogram, stages
+
+
+class ScoreWriteBuffer:
+    """Write-behind buffer for loan score updates.
+
+    submit() keeps only the latest (eco_score, predicted_carbon_reduction)
+    per loan_id and returns immediately. The buffer is written with one
+    `flush_many(updates)` call (a single bulk UPDATE in one transaction)
+    every `flush_interval_ms`, or sooner once `flush_size` loans are
+    waiting. It holds at most `max_pending` loans: past that, submit()
+    waits up to `block_timeout` seconds for a flush and then writes through
+    synchronously, so updates are slowed down rather than lost.
+
+    Paths that need read-your-writes use write_through(), which drops any
+    older buffered value for the loan and writes with `write_one` before
+    returning. Buffered updates that were not yet flushed are lost if the
+    process dies; stop() flushes everything on a clean shutdown.
+    """
+
+    def __init__(self, flush_many, write_one, max_pending=50000, flush_size=2000,
+                 flush_interval_ms=200, block_timeout=1.0):
+        self.flush_many = flush_many
+        self.write_one = write_one
+        self.max_pending = max_pending
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.block_timeout = block_timeout
+
+        self._pending = {}  # loan_id -> (eco_score, predicted_carbon_reduction)
+        self._oldest_at = None  # submit time of the oldest unflushed update
+        self._lock = threading.Lock()
+        self._flushed = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.submitted = Counter()
+        self.coalesced = Counter()
+        self.written = Counter()
+        self.flushes = Counter()
+        self.flush_errors = Counter()
+        self.write_throughs = Counter()
+        self.backpressure_fallbacks = Counter()
+        self.flush_ms = Histogram([1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000])
+        self.commit_lag_ms = Histogram([10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000])
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='score-write-behind', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=10.0):
+        """Stop the flusher and write everything still buffered"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    def submit(self, loan_id, eco_score, predicted_carbon_reduction):
+        """Buffer an update; returns True once it is buffered or written"""
+        loan_id = str(loan_id)
+        self.submitted.inc()
+        deadline = time.monotonic() + self.block_timeout
+        with self._lock:
+            while loan_id not in self._pending and len(self._pending) >= self.max_pending:
+                self._wake.set()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._flushed.wait(remaining)
+            else:
+                if loan_id in self._pending:
+                    self.coalesced.inc()
+                elif self._oldest_at is None:
+                    self._oldest_at = time.monotonic()
+                self._pending[loan_id] = (eco_score, predicted_carbon_reduction)
+                full = len(self._pending) >= self.flush_size
+                if full:
+                    self._wake.set()
+                return True
+
+        self.backpressure_fallbacks.inc()
+        return self.write_through(loan_id, eco_score, predicted_carbon_reduction)
+
+    def write_through(self, loan_id, eco_score, predicted_carbon_reduction):
+        """Write one update now, superseding anything buffered for the loan"""
+        loan_id = str(loan_id)
+        self.write_throughs.inc()
+        # Holding the flush lock means no flush carrying an older value is in flight
+        with self._flush_lock:
+            self._discard([loan_id])
+            return self.write_one(loan_id, eco_score, predicted_carbon_reduction)
+
+    def discard(self, loan_ids):
+        """Drop buffered updates for loans about to be written by another path"""
+        with self._flush_lock:
+            return self._discard(loan_ids)
+
+    def _discard(self, loan_ids):
+        with self._lock:
+            dropped = sum(1 for loan_id in loan_ids if self._pending.pop(str(loan_id), None) is not None)
+            if not self._pending:
+                self._oldest_at = None
+            return dropped
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                oldest_at, self._oldest_at = self._oldest_at, None
+                self._flushed.notify_all()
+            if not batch:
+                return 0
+
+            # loan_id order keeps concurrent flushers from deadlocking on row locks
+            updates = [(loan_id, score, carbon) for loan_id, (score, carbon) in sorted(batch.items())]
+            started = time.monotonic()
+            try:
+                written = self.flush_many(updates)
+            except Exception as e:
+                print(f"Score write-behind flush failed: {e}")
+                written = 0
+            finished = time.monotonic()
+            self.flush_ms.observe((finished - started) * 1000)
+            stages.observe('score_flush', (finished - started) * 1000)
+
+            if written != len(updates):
+                self.flush_errors.inc()
+                print(f"⚠️ Score write-behind flush of {len(updates)} updates failed; retrying")
+                with self._lock:
+                    # Newer submits for the same loans win over the failed batch
+                    for loan_id, values in batch.items():
+                        self._pending.setdefault(loan_id, values)
+                    if oldest_at is not None:
+                        self._oldest_at = min(oldest_at, self._oldest_at or oldest_at)
+                return 0
+
+            self.flushes.inc()
+            self.written.inc(written)
+            if oldest_at is not None:
+                self.commit_lag_ms.observe((finished - oldest_at) * 1000)
+            return written
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def lag_ms(self):
+        """Age of the oldest update not yet committed"""
+        oldest_at = self._oldest_at
+        return (time.monotonic() - oldest_at) * 1000 if oldest_at is not None else 0.0
+
+    def metrics(self):
+        return {
+            'pending': len(self._pending),
+            'lag_ms': self.lag_ms(),
+            'submitted': self.submitted.value,
+            'coalesced': self.coalesced.value,
+            'written': self.written.value,
+            'flushes': self.flushes.value,
+            'flush_errors': self.flush_errors.value,
+            'write_throughs': self.write_throughs.value,
+            'backpressure_fallbacks': self.backpressure_fallbacks.value,
+            'flush_ms': self.flush_ms.snapshot(),
+            'commit_lag_ms': self.commit_lag_ms.snapshot(),
+        }
@@ -0,0 +1,34 @@
+import os
+import sys
+import time
+
+import pytest
+
+# Backend modules import each other as top-level packages (models, services)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.fakes import FakeIncentiveStore  # noqa: E402
+
+
+@pytest.fixture
+def wait_for():
+    """Poll `predicate` until it is truthy or `timeout` seconds pass; returns its last value"""
+    def wait(predicate, timeout=5.0, interval=0.01, tick=None):
+        deadline = time.monotonic() + timeout
+        while True:
+            value = predicate()
+            if value or time.monotonic() >= deadline:
+                return value
+            if tick is not None:
+                tick()
+            time.sleep(interval)
+    return wait
+
+
+@pytest.fixture
+def incentives(monkeypatch):
+    """CertificationQueue backed by an in-memory incentives table"""
+    import services.certification
+    store = FakeIncentiveStore()
+    monkeypatch.setattr(services.certification, 'Incentive', store)
+    return store
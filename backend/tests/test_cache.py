@@ -0,0 +1,120 @@
+import threading
+
+import pytest
+
+from services.cache import CacheGeneration, TieredCache
+from services.fakes import FakeRedis
+from services.loan_cache import LoanCaches
+
+
+def test_concurrent_misses_share_one_load(wait_for):
+    cache = TieredCache('loan', redis_client=FakeRedis())
+    release = threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        release.wait(5)
+        return {'loan_id': 'loan-1'}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load('loan-1', loader)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    assert wait_for(lambda: cache.coalesced.value == 7)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [{'loan_id': 'loan-1'}] * 8
+    assert cache.metrics()['misses'] == 1
+
+
+def test_followers_see_the_leaders_error():
+    cache = TieredCache('loan')
+
+    def loader():
+        raise ConnectionError('database down')
+
+    with pytest.raises(ConnectionError):
+        cache.get_or_load('loan-1', loader)
+    assert cache.get_or_load('loan-1', lambda: {'loan_id': 'loan-1'}) == {'loan_id': 'loan-1'}
+
+
+def test_hits_come_from_the_local_tier_then_redis():
+    redis = FakeRedis()
+    cache = TieredCache('loan', redis_client=redis)
+    cache.get_or_load('loan-1', lambda: {'eco_score': 90})
+
+    assert cache.get_or_load('loan-1', lambda: pytest.fail('loaded again')) == {'eco_score': 90}
+    other = TieredCache('loan', redis_client=redis)
+    assert other.get_or_load('loan-1', lambda: pytest.fail('loaded again')) == {'eco_score': 90}
+    assert (cache.local_hits.value, other.redis_hits.value) == (1, 1)
+
+
+def test_callers_get_private_copies():
+    cache = TieredCache('loan')
+    cache.get_or_load('loan-1', lambda: {'tags': []})['tags'].append('mutated')
+    assert cache.get_or_load('loan-1', lambda: None) == {'tags': []}
+
+
+def test_none_is_not_cached():
+    cache = TieredCache('loan')
+    assert cache.get_or_load('loan-1', lambda: None) is None
+    assert cache.get_or_load('loan-1', lambda: {'loan_id': 'loan-1'}) == {'loan_id': 'loan-1'}
+
+
+def test_invalidate_drops_both_tiers():
+    redis = FakeRedis()
+    cache = TieredCache('loan', redis_client=redis)
+    cache.get_or_load('loan-1', lambda: {'eco_score': 90})
+    cache.invalidate('loan-1')
+
+    assert redis.data == {}
+    assert cache.get_or_load('loan-1', lambda: {'eco_score': 95}) == {'eco_score': 95}
+
+
+def test_a_load_overlapping_an_invalidate_is_not_cached():
+    redis = FakeRedis()
+    cache = TieredCache('loan', redis_client=redis)
+
+    def loader():
+        # The row is read, then written and invalidated before the load finishes
+        cache.invalidate('loan-1')
+        return {'eco_score': 90}
+
+    assert cache.get_or_load('loan-1', loader) == {'eco_score': 90}
+    assert redis.data == {}
+    assert cache.get_or_load('loan-1', lambda: {'eco_score': 95}) == {'eco_score': 95}
+
+
+def test_a_generation_bump_is_seen_by_other_processes_after_the_local_ttl():
+    redis = FakeRedis()
+    ours = CacheGeneration('loan_page', redis_client=redis, local_ttl=0.0)
+    theirs = CacheGeneration('loan_page', redis_client=redis, local_ttl=0.0)
+    before = theirs.current()
+    ours.bump()
+    assert ours.current() == theirs.current() == before + 1
+
+
+def test_loan_writes_invalidate_the_loan_and_listed_writes_retire_pages():
+    caches = LoanCaches(redis_client=FakeRedis(), generation_ttl=0.0)
+    pages = []
+
+    def load_page():
+        pages.append(1)
+        return [{'loan_id': 'loan-1'}]
+
+    caches.get_loan('loan-1', lambda: {'eco_score': 90})
+    caches.get_page(20, None, None, {}, load_page)
+    caches.invalidate(['loan-1'])
+
+    assert caches.get_loan('loan-1', lambda: {'eco_score': 95}) == {'eco_score': 95}
+    caches.get_page(20, None, None, {}, load_page)
+    assert len(pages) == 1
+
+    caches.invalidate(['loan-2'], listed=True)
+    caches.get_page(20, None, None, {}, load_page)
+    assert len(pages) == 2
@@ -0,0 +1,130 @@
+import pytest
+
+from services.certification import BATCH_BASE_GAS, PER_LOAN_GAS, CertificationBatcher, CertificationQueue
+from services.fakes import FakeCertifierContract, FakeHederaCertifier
+
+
+def make_queue(certifier, batcher, **kwargs):
+    kwargs.setdefault('workers', 2)
+    kwargs.setdefault('poll_interval', 0.01)
+    kwargs.setdefault('base_backoff', 0.0)
+    return CertificationQueue(certifier, batcher=batcher, **kwargs)
+
+
+def run_until(queue, wait_for, predicate):
+    queue.start()
+    try:
+        assert wait_for(predicate)
+    finally:
+        queue.stop()
+
+
+def certified(incentives):
+    return {row['loan_id']: row for row in incentives.rows.values() if row['status'] == 'certified'}
+
+
+def test_capacity_is_bounded_by_batch_size_and_gas():
+    assert CertificationBatcher(max_batch=50, max_gas=10000000).capacity == 50
+    assert CertificationBatcher(max_batch=50, max_gas=BATCH_BASE_GAS + 3 * PER_LOAN_GAS).capacity == 3
+    assert CertificationBatcher(max_batch=50, max_gas=BATCH_BASE_GAS).capacity == 1
+
+
+def test_chunks_respect_capacity():
+    batcher = CertificationBatcher(max_batch=3)
+    assert [len(chunk) for chunk in batcher.chunks(list(range(7)))] == [3, 3, 1]
+
+
+@pytest.mark.parametrize('size', [2, 10, 50])
+def test_gas_estimate_covers_first_certifications(size):
+    entries = [(index, 90, '0x' + 'ab' * 20) for index in range(1, size + 1)]
+    gas_used = FakeCertifierContract().certify_loans(entries)
+    assert CertificationBatcher(max_batch=size).gas_for(size) >= gas_used
+
+
+def test_batches_are_chunked_by_capacity(incentives, wait_for):
+    certifier = FakeHederaCertifier()
+    batcher = CertificationBatcher(max_batch=50, max_gas=BATCH_BASE_GAS + 3 * PER_LOAN_GAS)
+    queue = make_queue(certifier, batcher, workers=1)
+    queue.enqueue_many((f'loan-{index}', 90) for index in range(7))
+
+    run_until(queue, wait_for, lambda: len(certified(incentives)) == 7)
+
+    sizes = [tx['loans'] for tx in certifier.transactions]
+    assert sorted(sizes) == [1, 3, 3]
+    for tx in certifier.transactions:
+        if tx['loans'] > 1:
+            assert tx['gas_limit'] == batcher.gas_for(tx['loans']) <= batcher.max_gas
+    assert queue.metrics()['batched'] == 6
+
+
+def test_batch_rows_share_the_transaction_id(incentives, wait_for):
+    certifier = FakeHederaCertifier()
+    queue = make_queue(certifier, CertificationBatcher(max_batch=4), workers=1)
+    queue.enqueue_many((f'loan-{index}', 85 + index) for index in range(4))
+
+    run_until(queue, wait_for, lambda: len(certified(incentives)) == 4)
+
+    assert len(certifier.transactions) == 1
+    tx_id = certifier.transactions[0]['tx_id']
+    assert {row['blockchain_tx_id'] for row in certified(incentives).values()} == {tx_id}
+    assert certifier.scores == {f'loan-{index}': 85 + index for index in range(4)}
+
+
+def test_revert_certifies_nothing_then_retries_one_at_a_time(incentives, wait_for):
+    certifier = FakeHederaCertifier()
+    queue = make_queue(certifier, CertificationBatcher(max_batch=10), workers=1, max_attempts=3)
+    queue.enqueue_many([('good-1', 90), ('good-2', 95)])
+    # Written straight to the table: enqueue_many would never queue a score the contract rejects
+    incentives.enqueue_certifications([('bad', 70)])
+
+    run_until(queue, wait_for, lambda: len(certified(incentives)) == 2 and incentives.rows_for('bad', 'failed'))
+
+    batches = [tx for tx in certifier.transactions if tx['loans'] > 1]
+    assert batches == []  # the only batch reverted, so it never became a transaction
+    assert [tx['loans'] for tx in certifier.transactions] == [1, 1]
+    assert set(certifier.scores) == {'good-1', 'good-2'}
+    assert len({row['blockchain_tx_id'] for row in certified(incentives).values()}) == 2
+
+    bad = incentives.rows_for('bad')[0]
+    assert bad['attempts'] == 3
+    assert 'above 80' in bad['last_error']
+    assert queue.metrics()['failed'] == 1
+
+
+def test_gas_limit_overrun_reverts_the_batch(incentives, wait_for):
+    certifier = FakeHederaCertifier()
+    # Underestimates every loan, so the batch runs out of gas
+    batcher = CertificationBatcher(max_batch=5, per_loan_gas=1000)
+    entries = [(f'loan-{index}', 90, None) for index in range(3)]
+    with pytest.raises(RuntimeError, match='Out of gas'):
+        FakeCertifierContract().certify_loans(entries, gas_limit=batcher.gas_for(3))
+
+    queue = make_queue(certifier, batcher, workers=1)
+    queue.enqueue_many((loan_id, score) for loan_id, score, _ in entries)
+
+    run_until(queue, wait_for, lambda: len(certified(incentives)) == 3)
+
+    # Every row failed once with the batch, then went through on its own
+    assert sorted(incentive_id for incentive_id, _ in incentives.retries) == sorted(incentives.rows)
+    assert [tx['loans'] for tx in certifier.transactions] == [1, 1, 1]
+    assert all(tx['gas_limit'] == certifier.gas for tx in certifier.transactions)
+    assert len(certifier.contract.events) == 3
+    assert queue.metrics()['retries'] == 3
+
+
+def test_a_batch_reverted_at_consensus_falls_back_to_single_calls(incentives, wait_for):
+    certifier = FakeHederaCertifier(revert_at='receipt')
+    queue = make_queue(certifier, CertificationBatcher(max_batch=10), workers=1, max_attempts=2)
+    queue.enqueue_many([('good-1', 90), ('good-2', 95)])
+    incentives.enqueue_certifications([('bad', 70)])
+
+    run_until(queue, wait_for, lambda: len(certified(incentives)) == 2 and incentives.rows_for('bad', 'failed'))
+
+    # The batch became a transaction whose receipt failed, so none of its rows took its id
+    reverted = [tx for tx in certifier.transactions if tx['status'] != 'SUCCESS']
+    assert [(tx['loans'], tx['status']) for tx in reverted] == [(3, 'CONTRACT_REVERT_EXECUTED'), (1, 'CONTRACT_REVERT_EXECUTED')]
+    succeeded = {tx['tx_id'] for tx in certifier.transactions if tx['status'] == 'SUCCESS'}
+    assert {row['blockchain_tx_id'] for row in certified(incentives).values()} == succeeded
+    assert len(succeeded) == 2
+    assert set(certifier.scores) == {'good-1', 'good-2'}
+    assert incentives.rows_for('bad')[0]['blockchain_tx_id'] is None
@@ -0,0 +1,184 @@
+from services.certification import CertificationQueue
+from services.fakes import FakeHederaCertifier
+from services.hedera import chain_loan_id
+
+
+class FlakyCertifier(FakeHederaCertifier):
+    """Fails the first `failures` calls, running `during_failure` inside each"""
+
+    def __init__(self, failures, during_failure=None):
+        super().__init__()
+        self.failures = failures
+        self.during_failure = during_failure
+        self.attempts = 0
+
+    def certify(self, loan_id, eco_score, borrower_address=None):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            if self.during_failure:
+                self.during_failure()
+            raise RuntimeError('consensus timeout')
+        return super().certify(loan_id, eco_score, borrower_address)
+
+
+def make_queue(certifier, **kwargs):
+    kwargs.setdefault('workers', 2)
+    kwargs.setdefault('poll_interval', 0.01)
+    return CertificationQueue(certifier, **kwargs)
+
+
+def test_only_certifiable_scores_are_queued(incentives):
+    queue = make_queue(FakeHederaCertifier())
+    assert queue.enqueue_many([('loan-1', 80.9), ('loan-2', None), ('loan-3', 81.0)]) == 1
+    assert [row['loan_id'] for row in incentives.rows.values()] == ['loan-3']
+
+
+def test_a_newer_score_replaces_the_pending_row(incentives, wait_for):
+    certifier = FakeHederaCertifier()
+    queue = make_queue(certifier)
+    queue.enqueue('loan-1', 85)
+    queue.enqueue('loan-1', 92)
+    queue.enqueue_many([('loan-1', 88), ('loan-1', 90)])
+    assert len(incentives.rows_for('loan-1')) == 1
+
+    queue.start()
+    try:
+        assert wait_for(lambda: incentives.rows_for('loan-1', 'certified'))
+    finally:
+        queue.stop()
+    assert certifier.calls == [('loan-1', 90.0, None, certifier.transactions[0]['tx_id'])]
+
+
+def test_unchanged_integer_scores_are_not_requeued(incentives, wait_for):
+    queue = make_queue(FakeHederaCertifier())
+    queue.enqueue('loan-1', 90.2)
+    queue.start()
+    try:
+        assert wait_for(lambda: incentives.rows_for('loan-1', 'certified'))
+    finally:
+        queue.stop()
+
+    assert queue.enqueue('loan-1', 90.8) == 0
+    assert queue.enqueue('loan-1', 91.0) == 1
+
+
+def test_a_loan_in_flight_is_not_claimed_twice(incentives):
+    queue = make_queue(FakeHederaCertifier())
+    queue.enqueue('loan-1', 85)
+    assert len(incentives.claim_certifications(10)) == 1
+
+    assert queue.enqueue('loan-1', 85.5) == 0  # same on-chain score as the row in flight
+    assert queue.enqueue('loan-1', 95) == 1
+    assert incentives.claim_certifications(10) == []
+
+
+def test_failures_back_off_exponentially_then_give_up(incentives, wait_for):
+    certifier = FlakyCertifier(failures=10)
+    queue = make_queue(certifier, max_attempts=5, base_backoff=2.0, max_backoff=10.0)
+    queue.enqueue('loan-1', 90)
+
+    queue.start()
+    try:
+        # Skip each backoff instead of sleeping through it
+        assert wait_for(lambda: incentives.rows_for('loan-1', 'failed'), tick=lambda: incentives.advance(60))
+    finally:
+        queue.stop()
+
+    assert [seconds for _, seconds in incentives.retries] == [2.0, 4.0, 8.0, 10.0]
+    row = incentives.rows_for('loan-1')[0]
+    assert row['attempts'] == 5
+    assert row['last_error'] == 'consensus timeout'
+    assert queue.metrics()['retries'] == 4
+    assert queue.metrics()['failed'] == 1
+    assert certifier.calls == []
+
+
+def test_a_retry_succeeds_after_its_backoff(incentives, wait_for):
+    certifier = FlakyCertifier(failures=2)
+    queue = make_queue(certifier, base_backoff=30.0)
+    queue.enqueue('loan-1', 90)
+
+    queue.start()
+    try:
+        assert wait_for(lambda: incentives.retries)
+        # Not due yet: nothing is claimed until the backoff has passed
+        assert wait_for(lambda: certifier.attempts > 1, timeout=0.2) is False
+        assert wait_for(lambda: incentives.rows_for('loan-1', 'certified'), tick=lambda: incentives.advance(60))
+    finally:
+        queue.stop()
+    assert certifier.attempts == 3
+
+
+def test_a_failed_row_is_superseded_by_a_newer_score(incentives, wait_for):
+    queue = make_queue(None, base_backoff=0.0)
+    queue.certifier = FlakyCertifier(failures=1, during_failure=lambda: queue.enqueue('loan-1', 97))
+    queue.enqueue('loan-1', 90)
+
+    queue.start()
+    try:
+        assert wait_for(lambda: incentives.rows_for('loan-1', 'certified'))
+    finally:
+        queue.stop()
+
+    assert [(row['eco_score'], row['status']) for row in incentives.rows_for('loan-1')] == [
+        (90, 'superseded'), (97, 'certified')
+    ]
+    assert queue.certifier.scores == {'loan-1': 97}
+
+
+def test_start_requeues_rows_stranded_in_processing(incentives, wait_for):
+    queue = make_queue(FakeHederaCertifier(), lease_seconds=300)
+    queue.enqueue('loan-1', 90)
+    incentives.claim_certifications(1)  # a worker that crashed mid-submit
+    incentives.advance(301)
+
+    queue.start()
+    try:
+        assert wait_for(lambda: incentives.rows_for('loan-1', 'certified'))
+    finally:
+        queue.stop()
+    assert incentives.rows_for('loan-1')[0]['attempts'] == 2
+
+
+def test_a_failed_receipt_is_never_recorded_as_certified(incentives, wait_for):
+    certifier = FakeHederaCertifier(revert_at='receipt')
+    queue = make_queue(certifier, max_attempts=2, base_backoff=0.0)
+    # Written straight to the table: enqueue would never queue a score the contract rejects
+    incentives.enqueue_certifications([('loan-1', 70)])
+
+    queue.start()
+    try:
+        assert wait_for(lambda: incentives.rows_for('loan-1', 'failed'))
+    finally:
+        queue.stop()
+
+    row = incentives.rows_for('loan-1')[0]
+    assert row['blockchain_tx_id'] is None
+    assert 'CONTRACT_REVERT_EXECUTED' in row['last_error']
+    assert [tx['status'] for tx in certifier.transactions] == ['CONTRACT_REVERT_EXECUTED'] * 2
+    assert certifier.calls == [] and certifier.scores == {}
+
+
+def test_malformed_entries_fail_without_retrying(incentives, wait_for):
+    class RejectingCertifier(FakeHederaCertifier):
+        def certify(self, loan_id, eco_score, borrower_address=None):
+            raise ValueError(f"invalid literal for int(): {loan_id!r}")
+
+    queue = make_queue(RejectingCertifier(), max_attempts=8)
+    queue.enqueue('loan-1', 90)
+
+    queue.start()
+    try:
+        assert wait_for(lambda: incentives.rows_for('loan-1', 'failed'))
+    finally:
+        queue.stop()
+
+    assert incentives.rows_for('loan-1')[0]['attempts'] == 1
+    assert incentives.retries == []
+    assert queue.metrics()['failed'] == 1
+
+
+def test_non_numeric_loan_ids_map_to_a_stable_uint256():
+    assert chain_loan_id('42') == chain_loan_id(42) == 42
+    assert chain_loan_id('test-loan-1') == chain_loan_id('test-loan-1') != chain_loan_id('test-loan-2')
+    assert 0 <= chain_loan_id('test-loan-1') < 2 ** 256
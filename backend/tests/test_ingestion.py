@@ -0,0 +1,224 @@
+import json
+import random
+import threading
+import time
+
+from services.coalescer import UpdateCoalescer
+from services.fakes import FakeLoanStore, FakeMQTTClient, FakeSocketIO, InProcessBroker
+from services.ingestion import IngestionPipeline
+from services.iot import IOT_TOPIC, IoTProcessor
+from services.realtime import RoomEmitter
+from services.timeseries import ReadingWindow
+
+
+def make_processor(loans, writes, **kwargs):
+    def save_score(loan_id, eco_score, carbon):
+        writes.append((loan_id, carbon))
+        return True
+
+    kwargs.setdefault('workers', 4)
+    kwargs.setdefault('coalesce_window_ms', 0)
+    return IoTProcessor(
+        loans.get_by_id, lambda sequence: 90.0, save_score, RoomEmitter(FakeSocketIO(), interval_ms=0),
+        ReadingWindow(), log_updates=False, **kwargs
+    )
+
+
+def connect(broker, processor, topic=IOT_TOPIC):
+    client = FakeMQTTClient(broker)
+    client.on_message = processor.on_message
+    client.connect()
+    client.subscribe(topic)
+    return client
+
+
+def publish(client, loan_id, value):
+    client.publish(IOT_TOPIC, json.dumps({'loan_id': loan_id, 'predicted_carbon_reduction': value}))
+
+
+def test_shards_are_stable_per_key():
+    pipeline = IngestionPipeline(lambda item: None, workers=8)
+    assert len({pipeline.shard_for('loan-42') for _ in range(10)}) == 1
+    assert pipeline.shard_for(42) == pipeline.shard_for('42')
+    assert len({pipeline.shard_for(f'loan-{index}') for index in range(100)}) == 8
+
+
+def test_each_key_is_handled_in_submission_order(wait_for):
+    handled = {}
+    rng = random.Random(0)
+
+    def handle(item):
+        key, sequence = item
+        time.sleep(rng.random() / 2000)
+        handled.setdefault(key, []).append(sequence)
+
+    pipeline = IngestionPipeline(handle, workers=4, queue_size=10000).start()
+    keys = [f'loan-{index}' for index in range(20)]
+
+    def produce(offset):
+        for sequence in range(50):
+            for key in keys[offset::2]:
+                pipeline.submit(key, (key, sequence))
+
+    producers = [threading.Thread(target=produce, args=(offset,)) for offset in range(2)]
+    for producer in producers:
+        producer.start()
+    for producer in producers:
+        producer.join()
+    try:
+        assert wait_for(lambda: pipeline.processed.value == 1000)
+    finally:
+        pipeline.stop()
+
+    assert sorted(handled) == sorted(keys)
+    assert all(sequences == list(range(50)) for sequences in handled.values())
+    assert pipeline.metrics()['dropped'] == 0
+
+
+def test_a_full_shard_blocks_then_drops(wait_for):
+    release = threading.Event()
+    pipeline = IngestionPipeline(lambda item: release.wait(5), workers=1, queue_size=2, block_timeout=0.05).start()
+    try:
+        assert pipeline.submit('loan-1', 'in progress')
+        assert wait_for(lambda: pipeline.queue_depth() == 0)
+        assert pipeline.submit('loan-1', 'queued 1')
+        assert pipeline.submit('loan-1', 'queued 2')
+
+        started = time.monotonic()
+        assert pipeline.submit('loan-1', 'dropped') is False
+        assert time.monotonic() - started >= 0.05
+        metrics = pipeline.metrics()
+        assert metrics['dropped'] == 1
+        assert metrics['queue_depth'] == metrics['max_shard_depth'] == 2
+    finally:
+        release.set()
+        pipeline.stop()
+    assert pipeline.processed.value == 3
+
+
+def test_broker_readings_keep_per_loan_order(wait_for):
+    loans = FakeLoanStore()
+    loan_ids = loans.seed(10)
+    writes = []
+    processor = make_processor(loans, writes).start()
+    client = connect(InProcessBroker(), processor)
+
+    for value in range(30):
+        for loan_id in loan_ids:
+            publish(client, loan_id, value)
+    try:
+        assert wait_for(lambda: len(writes) == 300)
+    finally:
+        processor.stop()
+
+    for loan_id in loan_ids:
+        assert [carbon for written, carbon in writes if written == loan_id] == list(range(30))
+
+
+def test_shared_subscription_splits_readings_across_processes(wait_for):
+    broker = InProcessBroker()
+    loans = FakeLoanStore()
+    loan_ids = loans.seed(4)
+    writes = [[], []]
+    processors = [make_processor(loans, writes[index]).start() for index in range(2)]
+    clients = [connect(broker, processor, f'$share/backend/{IOT_TOPIC}') for processor in processors]
+
+    for value in range(10):
+        for loan_id in loan_ids:
+            publish(clients[0], loan_id, value)
+    try:
+        assert wait_for(lambda: len(writes[0]) + len(writes[1]) == 40)
+    finally:
+        for processor in processors:
+            processor.stop()
+    assert len(writes[0]) == len(writes[1]) == 20
+
+
+def test_readings_dropped_under_backpressure_are_counted(wait_for):
+    loans = FakeLoanStore()
+    loans.seed(1)
+    release = threading.Event()
+    writes = []
+    processor = make_processor(loans, writes, workers=1, queue_size=1, block_timeout=0.01)
+    processor.get_loan = lambda loan_id: release.wait(5) and loans.get_by_id(loan_id)
+    processor.start()
+    client = connect(InProcessBroker(), processor)
+
+    try:
+        publish(client, 'loan-1', 1)
+        assert wait_for(lambda: processor.ingestion.queue_depth() == 0)
+        publish(client, 'loan-1', 2)
+        publish(client, 'loan-1', 3)
+        metrics = processor.metrics()
+        assert metrics['ingestion']['dropped'] == 1
+        assert metrics['coalescer']['rejected'] == 1
+        assert metrics['coalescer']['forwarded'] == 2
+    finally:
+        release.set()
+        processor.stop()
+    assert [carbon for _, carbon in writes] == [1, 2]
+
+
+def test_a_rejected_reading_stays_pending_until_forwarded():
+    accepting = []
+    forwarded = []
+    coalescer = UpdateCoalescer(lambda key, item: bool(accepting) and forwarded.append(item) is None,
+                                window_ms=1000)
+    coalescer.offer('loan-1', 1)
+    coalescer.flush()
+    assert coalescer.metrics()['pending'] == 1
+
+    accepting.append(True)
+    coalescer.flush()
+    assert forwarded == [1]
+    assert coalescer.metrics()['pending'] == 0
+    assert coalescer.rejected.value == 1
+
+
+def test_a_newer_reading_replaces_a_rejected_one():
+    offered = []
+    coalescer = UpdateCoalescer(lambda key, item: offered.append(item) or len(offered) > 1, window_ms=1000)
+    original_forward = coalescer._forward
+
+    def forward_then_receive(key, item):
+        result = original_forward(key, item)
+        if item == 1:
+            coalescer.offer('loan-1', 2)  # arrives while the flush is forwarding
+        return result
+
+    coalescer._forward = forward_then_receive
+    coalescer.offer('loan-1', 1)
+    coalescer.flush()
+    coalescer.flush()
+    assert offered == [1, 2]
+    assert coalescer.metrics()['pending'] == 0
+
+
+def test_a_full_shard_does_not_stall_the_flush(wait_for):
+    loans = FakeLoanStore()
+    loan_ids = loans.seed(2)
+    release = threading.Event()
+    writes = []
+    processor = make_processor(loans, writes, workers=1, queue_size=1, block_timeout=1.0,
+                               coalesce_window_ms=1000)
+    get_by_id = loans.get_by_id
+    processor.get_loan = lambda loan_id: release.wait(5) and get_by_id(loan_id)
+    processor.start()
+    client = connect(InProcessBroker(), processor)
+
+    try:
+        publish(client, loan_ids[0], 1)
+        processor.coalescer.flush()
+        assert wait_for(lambda: processor.ingestion.queue_depth() == 0)
+        publish(client, loan_ids[0], 2)
+        publish(client, loan_ids[1], 3)
+
+        started = time.monotonic()
+        processor.coalescer.flush()
+        assert time.monotonic() - started < 0.5
+        assert processor.coalescer.metrics()['pending'] == 1
+        assert processor.metrics()['ingestion']['dropped'] == 0
+    finally:
+        release.set()
+        processor.stop()
+    assert sorted(carbon for _, carbon in writes) == [1, 2, 3]
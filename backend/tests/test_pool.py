@@ -0,0 +1,173 @@
+import threading
+import time
+
+import pytest
+
+from config.pool import PoolTimeout, PostgresPool
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql):
+        self.conn.pings += 1
+        if self.conn.broken:
+            raise ConnectionError('server closed the connection unexpectedly')
+
+    def fetchone(self):
+        return (1,)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """psycopg2 connection look-alike: closed flag, cursor, rollback"""
+
+    def __init__(self, number):
+        self.number = number
+        self.closed = 0
+        self.broken = False
+        self.pings = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = 1
+
+
+class Connector:
+    def __init__(self):
+        self.connections = []
+        self.fail = False
+
+    def __call__(self):
+        if self.fail:
+            return None
+        conn = FakeConnection(len(self.connections) + 1)
+        self.connections.append(conn)
+        return conn
+
+
+def test_min_size_connections_are_opened_up_front():
+    connect = Connector()
+    pool = PostgresPool(connect, min_size=2, max_size=4)
+    assert len(connect.connections) == 2
+    assert pool.metrics()['idle'] == 2
+
+
+def test_connections_are_reused_and_rolled_back_on_return():
+    connect = Connector()
+    pool = PostgresPool(connect, min_size=1, max_size=2)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    assert pool.getconn() is conn
+    assert conn.rollbacks == 1
+    assert pool.metrics()['created'] == 1
+
+
+def test_an_exhausted_pool_times_out():
+    pool = PostgresPool(Connector(), min_size=0, max_size=2)
+    held = [pool.getconn(), pool.getconn()]
+
+    started = time.monotonic()
+    with pytest.raises(PoolTimeout):
+        pool.getconn(timeout=0.05)
+    assert time.monotonic() - started >= 0.05
+    metrics = pool.metrics()
+    assert (metrics['in_use'], metrics['timeouts']) == (2, 1)
+    for conn in held:
+        pool.putconn(conn)
+
+
+def test_a_waiter_gets_the_next_returned_connection():
+    pool = PostgresPool(Connector(), min_size=0, max_size=1)
+    conn = pool.getconn()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.getconn(timeout=5)))
+    waiter.start()
+    time.sleep(0.05)
+    assert got == []
+
+    pool.putconn(conn)
+    waiter.join(5)
+    assert got == [conn]
+    assert pool.metrics()['wait_max_ms'] >= 50
+
+
+def test_recently_used_connections_skip_the_round_trip():
+    pool = PostgresPool(Connector(), min_size=1, max_size=1, health_check_interval=60)
+    conn = pool.getconn()
+    assert conn.pings == 0
+    pool.putconn(conn)
+
+
+def test_long_idle_broken_connections_are_replaced():
+    connect = Connector()
+    pool = PostgresPool(connect, min_size=1, max_size=1, health_check_interval=0)
+    stale = connect.connections[0]
+    stale.broken = True
+
+    conn = pool.getconn()
+    assert conn is not stale
+    assert stale.pings == 1 and stale.closed
+    assert pool.metrics()['discarded'] == 1
+    assert pool.metrics()['in_use'] == 1
+
+
+def test_closed_and_discarded_connections_are_not_pooled():
+    pool = PostgresPool(Connector(), min_size=0, max_size=2)
+    first, second = pool.getconn(), pool.getconn()
+    first.close()
+    pool.putconn(first)
+    pool.putconn(second, discard=True)
+
+    assert second.closed
+    metrics = pool.metrics()
+    assert (metrics['idle'], metrics['in_use'], metrics['discarded']) == (0, 0, 2)
+
+
+def test_a_failed_connect_frees_the_slot():
+    connect = Connector()
+    pool = PostgresPool(connect, min_size=0, max_size=1)
+    connect.fail = True
+    assert pool.getconn() is None
+    assert pool.metrics()['in_use'] == 0
+
+    connect.fail = False
+    assert pool.getconn() is not None
+
+
+def test_close_wakes_waiters_and_refuses_checkouts():
+    pool = PostgresPool(Connector(), min_size=1, max_size=1)
+    held = pool.getconn()
+    errors = []
+
+    def wait():
+        try:
+            pool.getconn(timeout=5)
+        except PoolTimeout as e:
+            errors.append(e)
+
+    waiter = threading.Thread(target=wait)
+    waiter.start()
+    time.sleep(0.05)
+    pool.close()
+    waiter.join(5)
+    assert len(errors) == 1
+
+    pool.putconn(held)
+    assert held.closed
+    with pytest.raises(PoolTimeout):
+        pool.getconn()
+
+
+def test_invalid_sizes_are_rejected():
+    with pytest.raises(ValueError):
+        PostgresPool(Connector(), min_size=3, max_size=2)
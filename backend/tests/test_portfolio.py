@@ -0,0 +1,87 @@
+from services.portfolio import MEASURES, UNSPECIFIED, PortfolioRollups, summarize
+
+
+def totals(deltas):
+    """Sum applied deltas per (project_type, status), across time slices"""
+    groups = {}
+    for (project_type, status, _), values in deltas.items():
+        group = groups.setdefault((project_type, status), dict.fromkeys(MEASURES, 0))
+        for name, value in values.items():
+            group[name] += value
+    return groups
+
+
+def test_deltas_are_summed_per_group():
+    applied = []
+    rollups = PortfolioRollups(lambda deltas: applied.append(deltas) or True)
+    rollups.record_created('solar', 'pending', 1000, eco_score=80, carbon=10)
+    rollups.record_created('solar', 'pending', 500)
+    rollups.record_rescored('solar', 'pending', None, 90, 0, 20)
+    rollups.record_certified('solar', 'pending')
+    rollups.record_created(None, None, 200)
+
+    assert rollups.flush() >= 2
+    groups = totals(applied[0])
+    assert groups[('solar', 'pending')] == {
+        'loan_count': 2, 'scored_count': 2, 'eco_score_sum': 170.0, 'carbon_sum': 30.0,
+        'loan_amount_sum': 1500.0, 'certified_count': 1,
+    }
+    assert groups[(UNSPECIFIED, 'pending')]['loan_count'] == 1
+    assert rollups.flush() == 0
+
+
+def test_a_removed_loan_cancels_its_creation():
+    applied = []
+    rollups = PortfolioRollups(lambda deltas: applied.append(deltas) or True)
+    rollups.record_created('wind', 'active', 1000, eco_score=85, carbon=5)
+    rollups.record_removed('wind', 'active', 1000, eco_score=85, carbon=5)
+    rollups.flush()
+    assert set(totals(applied[0])[('wind', 'active')].values()) == {0}
+
+
+def test_failed_applies_are_merged_into_the_next_flush():
+    results = [False, True]
+    applied = []
+
+    def apply(deltas):
+        applied.append(totals(deltas))
+        return results.pop(0)
+
+    rollups = PortfolioRollups(apply)
+    rollups.record_created('solar', 'pending', 1000)
+    assert rollups.flush() == 0
+    rollups.record_created('solar', 'pending', 500)
+    assert rollups.flush() > 0
+
+    assert applied[-1][('solar', 'pending')]['loan_count'] == 2
+    assert applied[-1][('solar', 'pending')]['loan_amount_sum'] == 1500.0
+    assert rollups.metrics()['flush_errors'] == 1
+    assert rollups.metrics()['pending_groups'] == 0
+
+
+def test_reconcile_flushes_first_and_counts_only_rebuilds():
+    calls = []
+    rebuild = [False, True]
+    rollups = PortfolioRollups(lambda deltas: calls.append('apply') or True,
+                               reconcile=lambda max_age: calls.append(('reconcile', max_age)) or rebuild.pop(0),
+                               reconcile_interval=900.0)
+    rollups.record_created('solar', 'pending', 1000)
+
+    assert rollups.reconcile() is False  # another process rebuilt recently
+    assert rollups.reconcile() is True
+    assert calls == ['apply', ('reconcile', 900.0), ('reconcile', 900.0)]
+    assert rollups.metrics()['reconciles'] == 1
+
+
+def test_summary_adds_up_the_groups():
+    rows = [
+        {'project_type': 'solar', 'status': 'active', 'loan_count': 2, 'scored_count': 2, 'eco_score_sum': 170.0,
+         'carbon_sum': 30.0, 'loan_amount_sum': 1500.0, 'certified_count': 1, 'reconciled_at': None},
+        {'project_type': 'wind', 'status': 'active', 'loan_count': 1, 'scored_count': 0, 'eco_score_sum': 0.0,
+         'carbon_sum': 0.0, 'loan_amount_sum': 200.0, 'certified_count': 0, 'reconciled_at': None},
+    ]
+    summary = summarize(rows)
+    assert summary['totals']['loan_count'] == 3
+    assert summary['totals']['average_eco_score'] == 85.0
+    assert summary['by_status']['active']['total_loan_amount'] == 1700.0
+    assert summary['by_project_type']['wind']['average_eco_score'] is None
@@ -0,0 +1,74 @@
+import os
+
+from services.inference import InferenceBackend
+from services.prediction_cache import PredictionCache
+
+
+class FileBackend(InferenceBackend):
+    """Loads the artifact's bytes as the model; no framework needed"""
+
+    name = 'file'
+
+    def _load(self):
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def _predict(self, model, batch):
+        return [float(len(model))] * len(batch)
+
+
+def write(path, data, mtime=None):
+    path.write_bytes(data)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def test_reload_invalidates_cached_predictions(tmp_path):
+    artifact = tmp_path / 'model.bin'
+    write(artifact, b'first')
+    backend = FileBackend(str(artifact))
+    backend.load()
+    cache = PredictionCache(lambda: backend.version)
+
+    key = cache.key([[1.0, 2.0, 3.0]])
+    cache.set(key, 90.0)
+    assert cache.get(cache.key([[1.0, 2.0, 3.0]])) == 90.0
+
+    write(artifact, b'second')
+    backend.reload()
+    new_key = cache.key([[1.0, 2.0, 3.0]])
+    assert new_key != key
+    assert cache.get(new_key) is None
+    assert cache.metrics()['invalidations'] == 1
+    assert len(cache.local) == 0
+
+
+def test_overwrites_that_keep_the_mtime_change_the_version(tmp_path):
+    artifact = tmp_path / 'model.bin'
+    write(artifact, b'first', mtime=1700000000)
+    backend = FileBackend(str(artifact))
+    backend.load()
+    before = backend.version
+
+    write(artifact, b'other', mtime=1700000000)
+    assert backend.reload() != before
+
+    write(artifact, b'first', mtime=1800000000)
+    assert backend.reload() == before
+
+
+def test_directory_artifacts_hash_every_file(tmp_path):
+    (tmp_path / 'weights').mkdir()
+    write(tmp_path / 'weights' / 'manifest.json', b'{}')
+    write(tmp_path / 'weights' / 'w.npy', b'1')
+    backend = FileBackend(str(tmp_path / 'weights'))
+    before = backend.version
+
+    write(tmp_path / 'weights' / 'w.npy', b'2')
+    assert backend.version != before
+
+
+def test_noise_below_the_quantum_shares_a_key():
+    cache = PredictionCache(lambda: 'v1', quantum=0.01)
+    assert cache.key([[1.0, 2.0]]) == cache.key([[1.001, 2.002]])
+    assert cache.key([[1.0, 2.0]]) != cache.key([[1.02, 2.0]])
@@ -0,0 +1,57 @@
+import json
+
+from services.metrics import Counter, CounterVec, Histogram
+from services.prometheus import Registry
+
+
+def metric_lines(text, name):
+    return [line for line in text.splitlines() if line.split(' ')[0].split('{')[0] == name
+            or line.startswith((f'# HELP {name} ', f'# TYPE {name} '))]
+
+
+def test_counters_share_the_total_name_across_help_type_and_samples():
+    registry = Registry()
+    registry.register('certified', Counter(), 'Loans certified').inc(3)
+    registry.register('stage_errors', CounterVec(('stage',)), 'Errors per stage').labels('iot').inc()
+    registry.register('retries_total', Counter(), 'Already suffixed')
+    text = registry.render()
+
+    assert metric_lines(text, 'ecoscore_certified_total') == [
+        '# HELP ecoscore_certified_total Loans certified',
+        '# TYPE ecoscore_certified_total counter',
+        'ecoscore_certified_total 3',
+    ]
+    assert metric_lines(text, 'ecoscore_stage_errors_total') == [
+        '# HELP ecoscore_stage_errors_total Errors per stage',
+        '# TYPE ecoscore_stage_errors_total counter',
+        'ecoscore_stage_errors_total{stage="iot"} 1',
+    ]
+    assert '# HELP ecoscore_retries_total Already suffixed' in text
+    assert 'ecoscore_certified ' not in text and '# HELP ecoscore_certified ' not in text
+
+
+def test_histograms_keep_their_name():
+    registry = Registry()
+    registry.register('flush_ms', Histogram([1, 10]), 'Flush latency').observe(5)
+    text = registry.render()
+    assert '# HELP ecoscore_flush_ms Flush latency' in text
+    assert 'ecoscore_flush_ms_bucket{le="10"} 1' in text
+    assert 'ecoscore_flush_ms_count 1' in text
+
+
+def test_collector_counters_are_exported_as_counters():
+    received = Counter()
+    received.inc(5)
+    registry = Registry()
+    registry.register_collector('coalescer', lambda: {
+        'received': received.value, 'pending': 2, 'reduction_ratio': received.value / 2
+    })
+    text = registry.render()
+
+    assert metric_lines(text, 'ecoscore_coalescer_received_total') == [
+        '# TYPE ecoscore_coalescer_received_total counter',
+        'ecoscore_coalescer_received_total 5',
+    ]
+    assert '# TYPE ecoscore_coalescer_pending gauge' in text
+    assert '# TYPE ecoscore_coalescer_reduction_ratio gauge' in text
+    assert json.dumps({'received': received.value}) == '{"received": 5}'
@@ -0,0 +1,106 @@
+from services.fakes import FakeSocketIO
+from services.realtime import ALL_LOANS_ROOM, RoomEmitter, loan_room, portfolio_room, rooms_for_loan
+
+
+class BrokenSocketIO:
+    def emit(self, event, data=None, room=None):
+        raise ConnectionError('message queue unavailable')
+
+
+def test_a_loan_reaches_its_own_portfolio_and_the_all_room():
+    assert rooms_for_loan('loan-1') == ['loan:loan-1', ALL_LOANS_ROOM]
+    assert rooms_for_loan('loan-1', 'solar') == [loan_room('loan-1'), ALL_LOANS_ROOM, portfolio_room('solar')]
+
+
+def test_emits_go_only_to_the_given_rooms():
+    socketio = FakeSocketIO()
+    emitter = RoomEmitter(socketio, interval_ms=0)
+    emitter.emit('iot_update', {'loan_id': 'loan-1'}, rooms_for_loan('loan-1', 'solar'), merge_key='loan-1')
+    emitter.emit('iot_update', {'loan_id': 'loan-2'}, rooms_for_loan('loan-2', 'wind'), merge_key='loan-2')
+
+    assert [data['loan_id'] for _, data, _ in socketio.events('iot_update', 'loan:loan-1')] == ['loan-1']
+    assert [list(data['updates']) for _, data, _ in socketio.events('iot_update_batch', 'portfolio:wind')] == [
+        ['loan-2']
+    ]
+    assert [list(data['updates']) for _, data, _ in socketio.events('iot_update_batch', ALL_LOANS_ROOM)] == [
+        ['loan-1'], ['loan-2']
+    ]
+    assert socketio.events('iot_update', ALL_LOANS_ROOM) == []
+    assert socketio.events(room='portfolio:hydro') == []
+
+
+def test_updates_within_an_interval_merge_to_the_latest():
+    socketio = FakeSocketIO()
+    emitter = RoomEmitter(socketio, interval_ms=1000)
+    rooms = rooms_for_loan('loan-1', 'solar')
+    for value in range(50):
+        emitter.emit('iot_update', {'loan_id': 'loan-1', 'value': value}, rooms, merge_key='loan-1')
+    assert socketio.emitted == []
+
+    emitter.flush()
+    assert sorted(room for _, _, room in socketio.emitted) == sorted(rooms)
+    assert [data['value'] for _, data, _ in socketio.events('iot_update')] == [49]
+    assert all(data['updates']['loan-1']['value'] == 49 for _, data, _ in socketio.events('iot_update_batch'))
+    metrics = emitter.metrics()
+    assert metrics['emitted'] == 3
+    assert metrics['dropped_frames'] == 49 * 3
+
+
+def test_different_merge_keys_share_a_loan_room_without_merging():
+    socketio = FakeSocketIO()
+    emitter = RoomEmitter(socketio, interval_ms=1000)
+    for key in ('reading', 'milestone'):
+        for value in range(3):
+            emitter.emit('iot_update', {'kind': key, 'value': value}, ['loan:loan-1'], merge_key=key)
+    emitter.flush()
+
+    assert sorted((data['kind'], data['value']) for _, data, _ in socketio.events(room='loan:loan-1')) == [
+        ('milestone', 2), ('reading', 2)
+    ]
+
+
+def test_portfolio_rooms_get_one_batch_per_interval():
+    socketio = FakeSocketIO()
+    emitter = RoomEmitter(socketio, interval_ms=1000)
+    for value in range(3):
+        for index in range(100):
+            loan_id = f'loan-{index}'
+            emitter.emit('iot_update', {'loan_id': loan_id, 'value': value},
+                         rooms_for_loan(loan_id, 'solar'), merge_key=loan_id)
+    emitter.flush()
+
+    for room in (ALL_LOANS_ROOM, portfolio_room('solar')):
+        frames = socketio.events(room=room)
+        assert [event for event, _, _ in frames] == ['iot_update_batch']
+        updates = frames[0][1]['updates']
+        assert len(updates) == 100
+        assert all(update['value'] == 2 for update in updates.values())
+    assert len(socketio.events('iot_update')) == 100
+
+
+def test_emit_now_is_never_merged():
+    socketio = FakeSocketIO()
+    emitter = RoomEmitter(socketio, interval_ms=1000)
+    emitter.emit_now('loan_certified', {'tx_id': 'a'}, ['loan:loan-1'])
+    emitter.emit_now('loan_certified', {'tx_id': 'b'}, ['loan:loan-1'])
+    assert [data['tx_id'] for _, data, _ in socketio.events('loan_certified')] == ['a', 'b']
+    assert emitter.metrics()['dropped_frames'] == 0
+
+
+def test_the_background_thread_flushes_every_interval(wait_for):
+    socketio = FakeSocketIO()
+    emitter = RoomEmitter(socketio, interval_ms=20).start()
+    try:
+        emitter.emit('iot_update', {'value': 1}, ['loan:loan-1'], merge_key='loan-1')
+        assert wait_for(lambda: socketio.events('iot_update'))
+        emitter.emit('iot_update', {'value': 2}, ['loan:loan-1'], merge_key='loan-1')
+        assert wait_for(lambda: len(socketio.events('iot_update')) == 2)
+    finally:
+        emitter.stop()
+
+
+def test_failed_emits_are_counted():
+    emitter = RoomEmitter(BrokenSocketIO(), interval_ms=0)
+    emitter.emit('iot_update', {}, rooms_for_loan('loan-1'))
+    assert emitter.metrics()['errors'] == 2
+    assert emitter.metrics()['emitted'] == 0
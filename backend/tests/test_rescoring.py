@@ -0,0 +1,26 @@
+import numpy as np
+
+from services.rescoring import build_feature_block
+from services.scoring import build_reading_sequence
+from services.timeseries import ReadingWindow
+
+
+def test_loans_with_history_match_the_single_loan_sequence():
+    window = ReadingWindow()
+    for value in (1200.0, 1250.0, 1300.0):
+        window.append('loan-1', value)
+    rows = [('loan-1', 50000.0, 1300.0, 'solar'), ('loan-2', 80000.0, 900.0, 'wind')]
+
+    block = build_feature_block(rows, window.sequence)
+
+    loan = {'loan_amount': 50000.0, 'project_type': 'solar'}
+    np.testing.assert_array_equal(block[0], build_reading_sequence(loan, window.sequence('loan-1')))
+    # No history: the stored value at every step
+    np.testing.assert_array_equal(block[1, :, 1], np.full(12, 900.0, dtype=np.float32))
+    assert block.shape == (2, 12, 3) and block.dtype == np.float32
+
+
+def test_without_readings_every_step_repeats_the_stored_value():
+    block = build_feature_block([('loan-1', 50000.0, None, 'solar')])
+    assert (block[0, :, 1] == 0).all()
+    assert (block[0, :, 2] == 1).all()
@@ -0,0 +1,136 @@
+import threading
+import time
+
+from services.write_behind import ScoreWriteBuffer
+
+
+class Table:
+    """Records bulk and single writes the way the loans table would end up"""
+
+    def __init__(self):
+        self.rows = {}
+        self.batches = []
+        self.singles = []
+        self.fail_next = 0
+        self.release = None
+        self._lock = threading.Lock()
+
+    def flush_many(self, updates):
+        if self.release is not None:
+            self.release.wait(5)
+        if self.fail_next:
+            self.fail_next -= 1
+            return 0
+        with self._lock:
+            self.batches.append(list(updates))
+            for loan_id, score, carbon in updates:
+                self.rows[loan_id] = (score, carbon)
+        return len(updates)
+
+    def write_one(self, loan_id, score, carbon):
+        with self._lock:
+            self.singles.append((loan_id, score))
+            self.rows[loan_id] = (score, carbon)
+        return True
+
+
+def make_buffer(table, **kwargs):
+    return ScoreWriteBuffer(table.flush_many, table.write_one, **kwargs)
+
+
+def test_only_the_latest_update_per_loan_is_written():
+    table = Table()
+    buffer = make_buffer(table)
+    for score in (80, 85, 90):
+        buffer.submit('loan-1', score, score * 10)
+    buffer.submit(2, 70, 700)
+
+    assert buffer.flush() == 2
+    assert table.batches == [[('2', 70, 700), ('loan-1', 90, 900)]]
+    assert buffer.metrics()['coalesced'] == 2
+
+
+def test_write_through_reads_its_own_write_over_older_buffered_values():
+    table = Table()
+    buffer = make_buffer(table)
+    buffer.submit('loan-1', 80, 800)
+    assert buffer.write_through('loan-1', 95, 950)
+    assert table.rows['loan-1'] == (95, 950)
+
+    buffer.flush()
+    assert table.rows['loan-1'] == (95, 950)
+    assert table.batches == []
+
+
+def test_write_through_waits_for_an_in_flight_flush(wait_for):
+    table = Table()
+    table.release = threading.Event()
+    buffer = make_buffer(table)
+    buffer.submit('loan-1', 80, 800)
+    flusher = threading.Thread(target=buffer.flush)
+    flusher.start()
+    assert wait_for(lambda: buffer.metrics()['pending'] == 0)
+
+    writer = threading.Thread(target=buffer.write_through, args=('loan-1', 95, 950))
+    writer.start()
+    time.sleep(0.05)
+    assert table.singles == []  # the older flush still holds the loan
+    table.release.set()
+    flusher.join()
+    writer.join()
+    assert table.rows['loan-1'] == (95, 950)
+
+
+def test_discarded_loans_are_not_flushed():
+    table = Table()
+    buffer = make_buffer(table)
+    buffer.submit('loan-1', 80, 800)
+    buffer.submit('loan-2', 85, 850)
+    assert buffer.discard([1, 'loan-1']) == 1
+    buffer.flush()
+    assert table.rows == {'loan-2': (85, 850)}
+
+
+def test_a_failed_flush_keeps_newer_submits():
+    table = Table()
+    table.fail_next = 1
+    buffer = make_buffer(table)
+    buffer.submit('loan-1', 80, 800)
+    buffer.submit('loan-2', 85, 850)
+    assert buffer.flush() == 0
+    buffer.submit('loan-1', 90, 900)
+
+    assert buffer.flush() == 2
+    assert table.rows == {'loan-1': (90, 900), 'loan-2': (85, 850)}
+    assert buffer.metrics()['flush_errors'] == 1
+
+
+def test_a_full_buffer_writes_through_after_the_block_timeout():
+    table = Table()
+    buffer = make_buffer(table, max_pending=1, block_timeout=0.05)
+    buffer.submit('loan-1', 80, 800)
+    buffer.submit('loan-1', 81, 810)  # already pending: coalesced, not blocked
+
+    started = time.monotonic()
+    assert buffer.submit('loan-2', 85, 850)
+    assert time.monotonic() - started >= 0.05
+    assert table.singles == [('loan-2', 85)]
+    assert buffer.metrics()['backpressure_fallbacks'] == 1
+
+
+def test_the_flusher_writes_on_its_interval(wait_for):
+    table = Table()
+    buffer = make_buffer(table, flush_interval_ms=10).start()
+    try:
+        buffer.submit('loan-1', 80, 800)
+        assert wait_for(lambda: 'loan-1' in table.rows)
+    finally:
+        buffer.stop()
+
+
+def test_stop_writes_everything_still_buffered():
+    table = Table()
+    buffer = make_buffer(table, flush_interval_ms=60000).start()
+    buffer.submit('loan-1', 80, 800)
+    buffer.stop()
+    assert table.rows == {'loan-1': (80, 800)}
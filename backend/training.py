@@ -0,0 +1,190 @@
+"""Mini-batch training for EcoScoreLSTM over memory-mapped sequence datasets.
+
+A dataset is a pair of .npy files: X with shape (N, T, F) and y with shape
+(N,). Both are opened with mmap_mode='r', so datasets far larger than RAM
+stream from disk through a multi-worker DataLoader.
+
+Usage:
+    python training.py synth --samples 2000000 --x data/X.npy --y data/y.npy
+    python training.py train --x data/X.npy --y data/y.npy --output ecoscore_model.pth \
+        [--epochs 20] [--batch-size 1024] [--workers 4] [--threads 8] [--patience 3]
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+from sklearn.preprocessing import MinMaxScaler
+from torch.utils.data import BatchSampler, DataLoader, Dataset, RandomSampler, SequentialSampler
+
+from ml_model import EcoScoreLSTM, save_artifact
+
+
+class SequenceDataset(Dataset):
+    """Scaled (sequence, target) mini-batches read from memory-mapped .npy files.
+
+    Indexed with a list of row indices (one whole batch per call), so each
+    DataLoader worker does one vectorized read per batch. The memmaps are
+    opened lazily so each worker process gets its own handle.
+    """
+
+    def __init__(self, x_path, y_path, scaler, start=0, stop=None):
+        self.x_path = x_path
+        self.y_path = y_path
+        self.scale = scaler.scale_.astype(np.float32)
+        self.offset = scaler.min_.astype(np.float32)
+        self.start = start
+        self.stop = stop if stop is not None else len(np.load(y_path, mmap_mode='r'))
+        self._x = None
+        self._y = None
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __getitem__(self, indices):
+        if self._x is None:
+            self._x = np.load(self.x_path, mmap_mode='r')
+            self._y = np.load(self.y_path, mmap_mode='r')
+        # Sorted reads keep page access mostly sequential
+        rows = np.sort(np.asarray(indices)) + self.start
+        x = np.asarray(self._x[rows], dtype=np.float32) * self.scale + self.offset
+        y = np.asarray(self._y[rows], dtype=np.float32).reshape(-1, 1)
+        return torch.from_numpy(x), torch.from_numpy(y)
+
+
+def fit_scaler(x_path, stop=None, chunk_rows=65536):
+    """Fit a MinMaxScaler over the training rows in chunks, never loading X whole"""
+    x = np.load(x_path, mmap_mode='r')
+    stop = stop if stop is not None else len(x)
+    scaler = MinMaxScaler()
+    for start in range(0, stop, chunk_rows):
+        chunk = np.asarray(x[start:min(start + chunk_rows, stop)], dtype=np.float32)
+        scaler.partial_fit(chunk.reshape(-1, chunk.shape[-1]))
+    return scaler
+
+
+def make_loader(dataset, batch_size, shuffle, workers):
+    sampler = RandomSampler(dataset) if shuffle else SequentialSampler(dataset)
+    options = {'persistent_workers': True, 'prefetch_factor': 4} if workers > 0 else {}
+    return DataLoader(
+        dataset,
+        sampler=BatchSampler(sampler, batch_size=batch_size, drop_last=False),
+        batch_size=None,  # the dataset already returns whole batches
+        num_workers=workers,
+        **options
+    )
+
+
+def evaluate(model, loader, criterion):
+    model.eval()
+    total, count = 0.0, 0
+    with torch.inference_mode():
+        for x, y in loader:
+            total += criterion(model(x), y).item() * len(x)
+            count += len(x)
+    return total / count if count else float('nan')
+
+
+def train(x_path, y_path, output, epochs=20, batch_size=1024, lr=0.001, workers=4, threads=None,
+          val_fraction=0.05, patience=3, hidden_size=50, num_layers=2):
+    """Train with mini-batches and early stopping; the best epoch is saved as an artifact"""
+    if threads:
+        torch.set_num_threads(threads)
+
+    n = len(np.load(y_path, mmap_mode='r'))
+    n_val = max(1, int(n * val_fraction))
+    n_train = n - n_val
+
+    started = time.perf_counter()
+    scaler = fit_scaler(x_path, stop=n_train)
+    print(f"Fitted scaler on {n_train} sequences in {time.perf_counter() - started:.1f}s")
+
+    train_loader = make_loader(SequenceDataset(x_path, y_path, scaler, 0, n_train), batch_size, True, workers)
+    val_loader = make_loader(SequenceDataset(x_path, y_path, scaler, n_train, n), batch_size, False, workers)
+
+    model = EcoScoreLSTM(input_size=len(scaler.scale_), hidden_size=hidden_size, num_layers=num_layers)
+    criterion = nn.MSELoss()
+    optimizer = torch.optim.Adam(model.parameters(), lr=lr)
+
+    best_loss, best_epoch, stale_epochs = float('inf'), -1, 0
+    for epoch in range(epochs):
+        model.train()
+        epoch_started = time.perf_counter()
+        running, seen = 0.0, 0
+        for x, y in train_loader:
+            optimizer.zero_grad(set_to_none=True)
+            loss = criterion(model(x), y)
+            loss.backward()
+            optimizer.step()
+            running += loss.item() * len(x)
+            seen += len(x)
+        elapsed = time.perf_counter() - epoch_started
+
+        val_loss = evaluate(model, val_loader, criterion)
+        print(f"Epoch {epoch}, Loss: {running / seen:.4f}, Val Loss: {val_loss:.4f}, "
+              f"{seen / elapsed:,.0f} samples/s")
+
+        if val_loss < best_loss:
+            best_loss, best_epoch, stale_epochs = val_loss, epoch, 0
+            save_artifact(output, model, scaler, metrics={'val_loss': val_loss, 'epoch': epoch})
+        else:
+            stale_epochs += 1
+            if stale_epochs >= patience:
+                print(f"Early stopping: no improvement for {patience} epochs")
+                break
+
+    print(f"✅ Best epoch {best_epoch} (val loss {best_loss:.4f}) saved to {output} "
+          f"in {time.perf_counter() - started:.1f}s")
+    return best_loss
+
+
+def generate_synthetic(x_path, y_path, samples, seq_len=12, features=3, chunk_rows=65536, seed=0):
+    """Write a synthetic dataset (same recipe as train_model) straight to .npy memmaps"""
+    rng = np.random.default_rng(seed)
+    for path in (x_path, y_path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    x = np.lib.format.open_memmap(x_path, mode='w+', dtype=np.float32, shape=(samples, seq_len, features))
+    y = np.lib.format.open_memmap(y_path, mode='w+', dtype=np.float32, shape=(samples,))
+    for start in range(0, samples, chunk_rows):
+        stop = min(start + chunk_rows, samples)
+        chunk = rng.random((stop - start, seq_len, features), dtype=np.float32) * 100
+        x[start:stop] = chunk
+        y[start:stop] = chunk.mean(axis=(1, 2)) * 0.5 + rng.random(stop - start, dtype=np.float32) * 10
+    x.flush()
+    y.flush()
+    print(f"✅ Wrote {samples} synthetic sequences to {x_path} / {y_path}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Train EcoScoreLSTM')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    synth = commands.add_parser('synth', help='generate a synthetic memory-mapped dataset')
+    synth.add_argument('--x', required=True)
+    synth.add_argument('--y', required=True)
+    synth.add_argument('--samples', type=int, default=1000000)
+    synth.add_argument('--features', type=int, default=3, help='must match MODEL_FEATURES')
+
+    fit = commands.add_parser('train', help='train and save a model+scaler artifact')
+    fit.add_argument('--x', required=True, help='(N, T, F) float .npy')
+    fit.add_argument('--y', required=True, help='(N,) float .npy')
+    fit.add_argument('--output', default='ecoscore_model.pth')
+    fit.add_argument('--epochs', type=int, default=20)
+    fit.add_argument('--batch-size', type=int, default=1024)
+    fit.add_argument('--lr', type=float, default=0.001)
+    fit.add_argument('--workers', type=int, default=4, help='DataLoader worker processes')
+    fit.add_argument('--threads', type=int, help='torch intra-op threads')
+    fit.add_argument('--val-fraction', type=float, default=0.05)
+    fit.add_argument('--patience', type=int, default=3)
+    fit.add_argument('--hidden-size', type=int, default=50)
+    fit.add_argument('--num-layers', type=int, default=2)
+
+    args = parser.parse_args()
+    if args.command == 'synth':
+        generate_synthetic(args.x, args.y, args.samples, features=args.features)
+    else:
+        train(args.x, args.y, args.output, epochs=args.epochs, batch_size=args.batch_size, lr=args.lr,
+              workers=args.workers, threads=args.threads, val_fraction=args.val_fraction,
+              patience=args.patience, hidden_size=args.hidden_size, num_layers=args.num_layers)
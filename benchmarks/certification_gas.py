@@ -0,0 +1,172 @@
+"""Gas per certified loan: certifyLoan one at a time vs certifyLoans batches.
+
+By default the contract runs in-process (services.fakes.FakeCertifierContract,
+priced with the EVM gas schedule). With --rpc-url and --contract, gas comes
+from eth_estimateGas against a deployed EcoLoanCertifier on a local EVM node
+(anvil, hardhat node, ganache). Either way each batch size is measured for
+loans certified for the first time and for loans being re-certified, and
+compared with CertificationBatcher's estimate, which is the gas limit the
+queue sends: the run fails if any estimate is below the gas actually used.
+
+"charged" is what Hedera bills: at least 80% of the gas limit. The unbatched
+baseline uses HEDERA_CERTIFY_GAS (200000) as its limit.
+
+Usage:
+    python benchmarks/certification_gas.py
+    python benchmarks/certification_gas.py --sizes 1,10,50 --output gas.json
+    python benchmarks/certification_gas.py --rpc-url http://127.0.0.1:8545 --contract 0x5FbDB2315678afecb367f032d93F642f64180aa3
+"""
+import argparse
+import json
+import os
+import random
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'backend'))
+
+# Minimum share of the gas limit Hedera charges
+HEDERA_MIN_CHARGE = 0.8
+# Hedera's maximum transaction size
+HEDERA_MAX_TX_BYTES = 6144
+
+ABI = [
+    {'type': 'function', 'name': 'certifyLoan', 'stateMutability': 'nonpayable', 'outputs': [], 'inputs': [
+        {'name': 'loanId', 'type': 'uint256'}, {'name': 'ecoScore', 'type': 'uint256'},
+        {'name': 'borrower', 'type': 'address'}]},
+    {'type': 'function', 'name': 'certifyLoans', 'stateMutability': 'nonpayable', 'outputs': [], 'inputs': [
+        {'name': 'loanIds', 'type': 'uint256[]'}, {'name': 'ecoScores', 'type': 'uint256[]'},
+        {'name': 'borrowers', 'type': 'address[]'}]},
+]
+
+
+class FakeChain:
+    """Gas from the in-process contract"""
+
+    def __init__(self):
+        from services.fakes import FakeCertifierContract
+        self.contract = FakeCertifierContract()
+
+    def certify_loan(self, entry):
+        return self.contract.certify_loan(*entry)
+
+    def certify_loans(self, entries):
+        return self.contract.certify_loans(entries)
+
+
+class Web3Chain:
+    """Gas from eth_estimateGas; transactions are sent so later calls see the storage"""
+
+    def __init__(self, rpc_url, address):
+        from web3 import Web3
+        self.w3 = Web3(Web3.HTTPProvider(rpc_url))
+        self.contract = self.w3.eth.contract(address=Web3.to_checksum_address(address), abi=ABI)
+        self.sender = {'from': self.w3.eth.accounts[0]}
+        self.to_checksum_address = Web3.to_checksum_address
+
+    def _run(self, call):
+        gas = call.estimate_gas(self.sender)
+        self.w3.eth.wait_for_transaction_receipt(call.transact(self.sender))
+        return gas
+
+    def certify_loan(self, entry):
+        loan_id, eco_score, borrower = entry
+        return self._run(self.contract.functions.certifyLoan(loan_id, eco_score, self.to_checksum_address(borrower)))
+
+    def certify_loans(self, entries):
+        return self._run(self.contract.functions.certifyLoans(
+            [loan_id for loan_id, _, _ in entries],
+            [eco_score for _, eco_score, _ in entries],
+            [self.to_checksum_address(borrower) for _, _, borrower in entries]
+        ))
+
+
+def make_entries(rng, count):
+    return [
+        (rng.getrandbits(63), rng.randint(81, 100), '0x' + ''.join(rng.choice('0123456789abcdef') for _ in range(40)))
+        for _ in range(count)
+    ]
+
+
+def charged(gas_used, gas_limit):
+    return max(gas_used, HEDERA_MIN_CHARGE * gas_limit)
+
+
+def measure(chain, batcher, sizes, single_gas_limit, rng):
+    from services.fakes import FakeCertifierContract
+
+    rows = []
+    for kind in ('first', 'recertify'):
+        for size in sizes:
+            entries = make_entries(rng, size)
+            if kind == 'recertify':
+                chain.certify_loans(entries)
+                entries = [(loan_id, 81 + (score - 80) % 20, borrower) for loan_id, score, borrower in entries]
+
+            if size == 1:
+                gas_used = chain.certify_loan(entries[0])
+                gas_limit = single_gas_limit
+                calldata = 4 + len(FakeCertifierContract.calldata(entries, batch=False))
+            else:
+                gas_used = chain.certify_loans(entries)
+                gas_limit = batcher.gas_for(size)
+                calldata = 4 + len(FakeCertifierContract.calldata(entries))
+            rows.append({
+                'kind': kind,
+                'loans': size,
+                'function': 'certifyLoan' if size == 1 else 'certifyLoans',
+                'gas_used': gas_used,
+                'gas_per_loan': gas_used / size,
+                'gas_limit': gas_limit,
+                'estimate_ok': size == 1 or gas_limit >= gas_used,
+                'charged_per_loan': charged(gas_used, gas_limit) / size,
+                'calldata_bytes': calldata,
+            })
+    return rows
+
+
+def main():
+    from services.certification import CertificationBatcher
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1,2,5,10,20,50', help='loans per transaction (1 = certifyLoan)')
+    parser.add_argument('--single-gas', type=int, default=int(os.getenv('HEDERA_CERTIFY_GAS', 200000)),
+                        help='gas limit of an unbatched certifyLoan')
+    parser.add_argument('--max-gas', type=int, default=int(os.getenv('HEDERA_BATCH_MAX_GAS', 1500000)))
+    parser.add_argument('--rpc-url', help='local EVM node; gas from eth_estimateGas instead of the fake contract')
+    parser.add_argument('--contract', help='EcoLoanCertifier address on --rpc-url')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write JSON results here')
+    args = parser.parse_args()
+    if bool(args.rpc_url) != bool(args.contract):
+        parser.error('--rpc-url and --contract go together')
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    batcher = CertificationBatcher(max_batch=max(sizes), max_gas=args.max_gas)
+    chain = Web3Chain(args.rpc_url, args.contract) if args.rpc_url else FakeChain()
+    rows = measure(chain, batcher, sizes, args.single_gas, random.Random(args.seed))
+
+    print(f"gas from {'eth_estimateGas at ' + args.rpc_url if args.rpc_url else 'the in-process contract'}; "
+          f"batcher capacity {batcher.capacity} loans under {args.max_gas:,} gas")
+    print(f"{'kind':<10} {'loans':>5} {'gas used':>10} {'gas/loan':>9} {'gas limit':>10} "
+          f"{'charged/loan':>13} {'calldata B':>11}")
+    for row in rows:
+        flag = '' if row['estimate_ok'] else '  ❌ limit below gas used'
+        if row['calldata_bytes'] > HEDERA_MAX_TX_BYTES:
+            flag += '  ❌ over the 6 KiB transaction limit'
+        print(f"{row['kind']:<10} {row['loans']:>5} {row['gas_used']:>10,} {row['gas_per_loan']:>9,.0f} "
+              f"{row['gas_limit']:>10,} {row['charged_per_loan']:>13,.0f} {row['calldata_bytes']:>11,}{flag}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'sizes': sizes, 'max_gas': args.max_gas, 'single_gas': args.single_gas, 'rows': rows}, f, indent=2)
+        print(f"Wrote {args.output}")
+
+    if not all(row['estimate_ok'] for row in rows):
+        print("❌ BATCH_BASE_GAS / PER_LOAN_GAS underestimate certifyLoans gas")
+        sys.exit(1)
+    print("✅ Batch gas estimates cover the gas used")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""Compare inference backends: p50/p99 latency and RSS for batch sizes 1..1024.
+
+Each backend runs in its own subprocess so RSS reflects only that runtime.
+
+Usage:
+    python benchmarks/inference_backends.py \
+        --model keras=ml-models/inference/lstm_model.h5 \
+        --model torchscript=backend/ecoscore_model.pt \
+        --model onnx=backend/ecoscore_model.onnx \
+        [--iterations 50] [--output results.json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'backend'))
+
+BATCH_SIZES = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024]
+
+
+def rss_mb():
+    """Current resident set size of this process in MB"""
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def run_worker(name, path, iterations, batch_sizes):
+    import numpy as np
+    from services.inference import create_backend
+
+    rss_start = rss_mb()
+    started = time.perf_counter()
+    backend = create_backend(name, path)
+    backend.load()
+    load_s = time.perf_counter() - started
+    rss_loaded = rss_mb()
+    backend.warmup()
+
+    rng = np.random.default_rng(0)
+    results = []
+    for batch_size in batch_sizes:
+        batch = rng.random((batch_size, backend.seq_len, backend.n_features), dtype=np.float32)
+        backend.predict(batch)  # per-shape warmup
+        samples = []
+        for _ in range(iterations):
+            t0 = time.perf_counter()
+            backend.predict(batch)
+            samples.append((time.perf_counter() - t0) * 1000)
+        p50 = percentile(samples, 50)
+        results.append({
+            'batch_size': batch_size,
+            'p50_ms': p50,
+            'p99_ms': percentile(samples, 99),
+            'samples_per_s': batch_size / (p50 / 1000) if p50 else 0.0,
+        })
+
+    return {
+        'backend': name,
+        'path': path,
+        'load_s': load_s,
+        'rss_start_mb': rss_start,
+        'rss_loaded_mb': rss_loaded,
+        'rss_peak_mb': rss_mb(),
+        'batches': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', action='append', default=[], help='backend=path (repeatable)')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--batch-sizes', default=','.join(map(str, BATCH_SIZES)))
+    parser.add_argument('--output', help='write JSON results here')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    batch_sizes = [int(size) for size in args.batch_sizes.split(',')]
+
+    if args.worker:
+        name, path = args.worker.split('=', 1)
+        print(json.dumps(run_worker(name, path, args.iterations, batch_sizes)))
+        return
+
+    if not args.model:
+        parser.error('at least one --model backend=path is required')
+
+    reports = []
+    for spec in args.model:
+        proc = subprocess.run(
+            [sys.executable, __file__, '--worker', spec,
+             '--iterations', str(args.iterations), '--batch-sizes', args.batch_sizes],
+            capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            print(f"❌ {spec} failed:\n{proc.stderr.strip()}")
+            continue
+        report = json.loads(proc.stdout.strip().splitlines()[-1])
+        reports.append(report)
+
+        print(f"\n{report['backend']}: load {report['load_s']:.2f}s, "
+              f"RSS {report['rss_loaded_mb']:.0f} MB loaded / {report['rss_peak_mb']:.0f} MB peak")
+        print(f"{'batch':>6} {'p50 ms':>10} {'p99 ms':>10} {'samples/s':>12}")
+        for row in report['batches']:
+            print(f"{row['batch_size']:>6} {row['p50_ms']:>10.2f} {row['p99_ms']:>10.2f} {row['samples_per_s']:>12,.0f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Concurrent-request load test comparing the sync (Flask) and async (ASGI) servers.
+
+Start both servers against the same database, then:
+
+    python benchmarks/load_test.py \
+        --target sync=http://localhost:5000 --target async=http://localhost:8000 \
+        --loan-id L-1001 --concurrency 1,8,32,128 --requests 2000
+
+For every target, endpoint and concurrency level it reports throughput and
+p50/p99 latency; --output writes the same numbers as JSON.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+async def run_level(client, method, url, concurrency, total):
+    latencies, errors = [], 0
+    remaining = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, url)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        'concurrency': concurrency,
+        'requests': total,
+        'errors': errors,
+        'throughput_rps': total / elapsed,
+        'p50_ms': percentile(latencies, 50),
+        'p99_ms': percentile(latencies, 99),
+    }
+
+
+async def main(args):
+    endpoints = [('GET', '/api/loans?limit=50')]
+    if args.loan_id:
+        endpoints.append(('GET', f'/api/loans/{args.loan_id}'))
+        endpoints.append(('POST', f'/api/loans/{args.loan_id}/score'))
+
+    levels = [int(level) for level in args.concurrency.split(',')]
+    limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+    report = []
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        for spec in args.target:
+            name, base_url = spec.split('=', 1)
+            for method, path in endpoints:
+                print(f"\n{name} {method} {path}")
+                print(f"{'conc':>6} {'req/s':>10} {'p50 ms':>10} {'p99 ms':>10} {'errors':>8}")
+                for level in levels:
+                    result = await run_level(client, method, base_url + path, level, args.requests)
+                    result.update({'target': name, 'method': method, 'path': path})
+                    report.append(result)
+                    print(f"{level:>6} {result['throughput_rps']:>10,.0f} {result['p50_ms']:>10.1f} "
+                          f"{result['p99_ms']:>10.1f} {result['errors']:>8}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', action='append', required=True, help='name=base_url (repeatable)')
+    parser.add_argument('--loan-id', help='existing loan for the single-loan and score endpoints')
+    parser.add_argument('--concurrency', default='1,8,32,128')
+    parser.add_argument('--requests', type=int, default=2000, help='requests per concurrency level')
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--output')
+    asyncio.run(main(parser.parse_args()))
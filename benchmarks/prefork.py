@@ -0,0 +1,180 @@
+"""Pre-forked workers: model memory and throughput per worker count.
+
+For each worker count, two layouts are compared:
+  preload     the model loads once in the parent, workers are forked after
+              (what gunicorn.conf.py does for fork-safe backends)
+  per-worker  each forked worker loads its own copy
+
+Workers get CPUs / workers intra-op threads (or --threads) and run
+back-to-back predict() calls on a fixed batch for --duration seconds,
+all starting together. While every worker is still alive, RSS and PSS
+(proportional set size: shared pages divided between the processes
+mapping them) are read from /proc/<pid>/smaps_rollup; summed PSS is the
+real memory the layout costs. Each configuration runs in its own
+subprocess so earlier loads don't skew later ones.
+
+Usage:
+    python benchmarks/prefork.py --model-backend torch --model-path backend/ecoscore_model.weights
+    python benchmarks/prefork.py --model-backend torchscript --model-path backend/ecoscore_model.pt \
+        --workers 1,2,4,8 --duration 10 --batch-size 64 --output prefork.json
+"""
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'backend'))
+
+MODES = ['preload', 'per-worker']
+
+
+def memory_mb(pid='self'):
+    """{'rss': MB, 'pss': MB} for a process, from smaps_rollup"""
+    memory = {'rss': 0.0, 'pss': 0.0}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                key, _, rest = line.partition(':')
+                if key in ('Rss', 'Pss'):
+                    memory[key.lower()] = int(rest.split()[0]) / 1024
+    except OSError:
+        pass
+    return memory
+
+
+def run_worker(backend, args, threads, start, done, results):
+    import numpy as np
+    from services.inference import create_backend
+
+    if backend is None:
+        backend = create_backend(args.model_backend, args.model_path)
+        backend.load()
+    backend.set_num_threads(threads)
+    backend.warmup(args.batch_size)
+    batch = np.random.default_rng(os.getpid()).random(
+        (args.batch_size, backend.seq_len, backend.n_features), dtype=np.float32
+    )
+
+    start.wait()
+    calls = 0
+    started = time.perf_counter()
+    deadline = started + args.duration
+    while time.perf_counter() < deadline:
+        backend.predict(batch)
+        calls += 1
+    elapsed = time.perf_counter() - started
+    results.put({'pid': os.getpid(), 'samples': calls * args.batch_size, 'elapsed_s': elapsed})
+    # Stay alive until the parent has read every worker's memory
+    done.wait()
+
+
+def run_config(args, mode, workers):
+    from services.inference import create_backend
+
+    threads = args.threads or max(1, (os.cpu_count() or 1) // workers)
+    backend, shared = None, False
+    if mode == 'preload':
+        backend = create_backend(args.model_backend, args.model_path)
+        shared = backend.preload()
+        if not shared:
+            backend = None  # not fork-safe: falls back to loading per worker
+        gc.collect()
+        gc.freeze()
+    parent_memory = memory_mb()
+
+    ctx = multiprocessing.get_context('fork')
+    start, done, results = ctx.Barrier(workers + 1), ctx.Event(), ctx.Queue()
+    procs = [
+        ctx.Process(target=run_worker, args=(backend, args, threads, start, done, results), daemon=True)
+        for _ in range(workers)
+    ]
+    for proc in procs:
+        proc.start()
+    start.wait()
+    reports = [results.get(timeout=args.duration + 600) for _ in procs]
+    memory = {proc.pid: memory_mb(proc.pid) for proc in procs}
+    parent_after = memory_mb()
+    done.set()
+    for proc in procs:
+        proc.join()
+
+    samples = sum(report['samples'] for report in reports)
+    elapsed = max(report['elapsed_s'] for report in reports)
+    workers_rss = [memory[report['pid']]['rss'] for report in reports]
+    return {
+        'mode': mode,
+        'workers': workers,
+        'threads_per_worker': threads,
+        'shared': shared,
+        'samples_per_s': samples / elapsed if elapsed else 0.0,
+        'samples_per_s_per_worker': samples / elapsed / workers if elapsed else 0.0,
+        'parent_rss_before_fork_mb': parent_memory['rss'],
+        'worker_rss_mb': workers_rss,
+        'worker_rss_avg_mb': sum(workers_rss) / workers,
+        # Parent included: with preload it maps the same weight pages
+        'total_pss_mb': parent_after['pss'] + sum(memory[report['pid']]['pss'] for report in reports),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model-backend', default=os.getenv('MODEL_BACKEND', 'torchscript'))
+    parser.add_argument('--model-path', default=os.getenv('MODEL_PATH'))
+    parser.add_argument('--workers', default='1,2,4,8', help='comma-separated worker counts')
+    parser.add_argument('--modes', default=','.join(MODES))
+    parser.add_argument('--threads', type=int, help='intra-op threads per worker (default CPUs / workers)')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds of predict() per configuration')
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--output', help='write JSON results here')
+    parser.add_argument('--config', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.config:
+        mode, workers = args.config.split(':')
+        print(json.dumps(run_config(args, mode, int(workers))))
+        return
+
+    passthrough = [
+        '--model-backend', args.model_backend, '--duration', str(args.duration),
+        '--batch-size', str(args.batch_size),
+    ]
+    if args.model_path:
+        passthrough += ['--model-path', args.model_path]
+    if args.threads:
+        passthrough += ['--threads', str(args.threads)]
+
+    reports = []
+    print(f"{args.model_backend} ({args.model_path}), batch {args.batch_size}, {os.cpu_count()} CPUs")
+    print(f"{'mode':<11} {'workers':>7} {'threads':>7} {'samples/s':>12} {'per worker':>11} "
+          f"{'RSS/worker MB':>14} {'total PSS MB':>13}")
+    for workers in [int(count) for count in args.workers.split(',')]:
+        for mode in args.modes.split(','):
+            proc = subprocess.run(
+                [sys.executable, __file__, '--config', f'{mode}:{workers}'] + passthrough,
+                capture_output=True, text=True
+            )
+            if proc.returncode != 0:
+                print(f"❌ {mode} x{workers} failed:\n{proc.stderr.strip()}")
+                continue
+            report = json.loads(proc.stdout.strip().splitlines()[-1])
+            reports.append(report)
+            label = mode if report['shared'] or mode != 'preload' else 'preload*'
+            print(f"{label:<11} {workers:>7} {report['threads_per_worker']:>7} {report['samples_per_s']:>12,.0f} "
+                  f"{report['samples_per_s_per_worker']:>11,.0f} {report['worker_rss_avg_mb']:>14.0f} "
+                  f"{report['total_pss_mb']:>13.0f}")
+    if any(report['mode'] == 'preload' and not report['shared'] for report in reports):
+        print(f"* {args.model_backend} is not fork-safe; workers loaded their own copy")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(reports, f, indent=2)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == '__main__':
+    main()
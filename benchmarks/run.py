@@ -0,0 +1,554 @@
+"""End-to-end benchmark suite for the backend, runnable without live services.
+
+Benchmarks:
+    ingest     MQTT message -> coalesce -> score -> persist -> emit throughput,
+               through IoTProcessor with FakeLoanStore, FakeModelBackend,
+               FakeSocketIO and the in-process MQTT broker
+    inference  batch-size scaling of the model backend, and request
+               throughput through the micro-batching ScoringEngine
+    loans      GET /api/loans latency (first page, keyset walk, filtered
+               walk, NDJSON export) at each --sizes table size
+    score      POST /api/loans/<id>/score latency and throughput
+    milestones MilestoneEngine: open-milestone index load, readings checked
+               per second on the MQTT callback path (flusher running) and
+               batched write cost, with FakeMilestoneStore
+
+ingest, inference and milestones need nothing external. loans and score import app.py
+with every other service faked (MQTT_FAKE, HEDERA_FAKE, MODEL_BACKEND=fake,
+no Mongo or Redis) and need a throwaway Postgres database: --postgres-db
+(created if missing) has its loan tables TRUNCATED and reseeded via COPY.
+
+Results are written as JSON. Keep one run as a baseline and compare later
+runs against it; throughput (*_per_s) or latency (*_ms) metrics that move
+the wrong way by more than --tolerance are reported and the exit code is 1.
+
+Usage:
+    python benchmarks/run.py --only ingest,inference,milestones --output benchmarks/baseline.json
+    python benchmarks/run.py --only ingest,inference --baseline benchmarks/baseline.json
+    python benchmarks/run.py --only loans,score --postgres-db ecoscore_bench \
+        --sizes 10000,100000,1000000 --output results.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import quote
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'backend'))
+
+BENCHMARKS = ['ingest', 'inference', 'loans', 'score', 'milestones']
+PROJECT_TYPES = ['solar', 'wind', 'hydro', 'efficiency']
+
+
+def percentile(samples, pct):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def latency_summary(samples_ms):
+    elapsed_s = sum(samples_ms) / 1000
+    return {
+        'requests': len(samples_ms),
+        'p50_ms': percentile(samples_ms, 50),
+        'p99_ms': percentile(samples_ms, 99),
+        'sequential_per_s': len(samples_ms) / elapsed_s if elapsed_s else None,
+    }
+
+
+def configure_environment(args):
+    """Swap every external service for a fake before any backend module is imported"""
+    os.environ.update({
+        'MQTT_FAKE': '1',
+        'HEDERA_FAKE': '1',
+        'MODEL_BACKEND': args.model_backend,
+        'MODEL_FAKE_LATENCY_MS': str(args.model_latency_ms),
+        'MODEL_FAKE_PER_SAMPLE_US': str(args.model_per_sample_us),
+        'MODEL_WARMUP': '0',
+        'IOT_STORE_ENABLED': '0',
+        'CACHE_REDIS': '0',
+        'PREDICTION_CACHE_REDIS': '0',
+        'SOCKETIO_MESSAGE_QUEUE': '',
+        'SCORE_WRITE_BEHIND': '0',
+        'POSTGRES_DB': args.postgres_db,
+    })
+    if args.model_path:
+        os.environ['MODEL_PATH'] = args.model_path
+
+
+# --- ingest -------------------------------------------------------------------
+
+def bench_ingest(args):
+    from services.fakes import FakeLoanStore, FakeModelBackend, FakeMQTTClient, FakeSocketIO, InProcessBroker
+    from services.iot import IOT_TOPIC, IoTProcessor
+    from services.realtime import RoomEmitter
+    from services.scoring import ScoringEngine
+    from services.timeseries import ReadingWindow
+
+    rng = random.Random(0)
+    results = {}
+    for label, window_ms in (('coalesce_off', 0), ('coalesce_1s', 1000)):
+        store = FakeLoanStore()
+        loan_ids = store.seed(args.loans)
+        model = FakeModelBackend(latency_ms=args.model_latency_ms, per_sample_us=args.model_per_sample_us)
+        engine = ScoringEngine(model.predict, max_batch_size=64, max_wait_ms=args.max_wait_ms).start()
+        emitter = RoomEmitter(FakeSocketIO(), interval_ms=250).start()
+        iot = IoTProcessor(
+            store.get_by_id, engine.score, store.update_score, emitter, ReadingWindow(),
+            workers=args.workers, queue_size=args.messages, coalesce_window_ms=window_ms,
+            log_updates=False
+        ).start()
+
+        broker = InProcessBroker()
+        subscriber = FakeMQTTClient(broker)
+        subscriber.on_message = iot.on_message
+        subscriber.subscribe(IOT_TOPIC)
+        publisher = FakeMQTTClient(broker)
+        # Payloads are encoded up front so only the backend path is timed
+        payloads = [
+            json.dumps({
+                'loan_id': rng.choice(loan_ids),
+                'predicted_carbon_reduction': round(rng.uniform(1000, 2000), 2),
+                'sent_at': time.time(),
+            }).encode()
+            for _ in range(args.messages)
+        ]
+
+        started = time.perf_counter()
+        for payload in payloads:
+            publisher.publish(IOT_TOPIC, payload)
+        accepted_s = time.perf_counter() - started
+        iot.coalescer.stop()  # flush the last window
+        deadline = time.monotonic() + args.drain_timeout
+        ingestion = iot.ingestion
+        # Dropped submits are counted as rejected, not forwarded, by the coalescer
+        while (ingestion.processed.value + ingestion.errors.value < iot.coalescer.forwarded.value
+               and time.monotonic() < deadline):
+            time.sleep(0.005)
+        drained_s = time.perf_counter() - started
+
+        iot.stop()
+        engine.stop()
+        emitter.stop()
+        batches = engine.batch_size.snapshot()
+        results[label] = {
+            'messages': args.messages,
+            'on_message_per_s': args.messages / accepted_s,
+            'messages_per_s': args.messages / drained_s,
+            'processed': ingestion.processed.value,
+            'processed_per_s': ingestion.processed.value / drained_s,
+            'dropped': ingestion.dropped.value,
+            'errors': ingestion.errors.value,
+            'collapsed': iot.coalescer.collapsed.value,
+            'avg_handle_ms': ingestion.handle_ms.snapshot()['avg'],
+            'avg_model_batch': batches['avg'],
+            'score_writes': store.score_writes,
+        }
+        print(f"ingest[{label}]: {results[label]['messages_per_s']:,.0f} msgs/s end to end, "
+              f"{results[label]['processed_per_s']:,.0f} scored/s, avg batch {batches['avg']:.1f}")
+    return results
+
+
+# --- milestones ---------------------------------------------------------------
+
+def bench_milestones(args):
+    from services.fakes import FakeLoanStore, FakeMilestoneStore, FakeSocketIO
+    from services.milestones import MilestoneEngine
+    from services.realtime import RoomEmitter
+
+    rng = random.Random(0)
+    loan_store = FakeLoanStore()
+    loan_ids = loan_store.seed(args.loans)
+    store = FakeMilestoneStore()
+    total = store.seed(loan_store.loans.values(), per_loan=args.milestones_per_loan)
+    socketio = FakeSocketIO()
+    emitter = RoomEmitter(socketio, interval_ms=250).start()
+    engine = MilestoneEngine(
+        store.load_open, store.bulk_update_progress, store.mark_achieved_many, emitter,
+        flush_interval_ms=args.milestone_flush_ms, refresh_interval=3600
+    )
+
+    started = time.perf_counter()
+    engine.refresh()
+    load_s = time.perf_counter() - started
+    engine.start()
+
+    # Readings drift upwards so milestones keep being reached during the run
+    readings = [
+        (rng.choice(loan_ids), {'predicted_carbon_reduction': round(rng.uniform(1000, 1500) + 1500 * i / args.messages, 2)})
+        for i in range(args.messages)
+    ]
+    started = time.perf_counter()
+    for loan_id, reading in readings:
+        engine.observe(loan_id, reading)
+    observe_s = time.perf_counter() - started
+    engine.stop()
+    emitter.stop()
+
+    metrics = engine.metrics()
+    results = {
+        'loans': args.loans,
+        'milestones': total,
+        'index_load_ms': load_s * 1000,
+        'readings': args.messages,
+        'observe_per_s': args.messages / observe_s,
+        'observe_us': observe_s / args.messages * 1e6,
+        'achieved': metrics['achieved'],
+        'room_emits': len(socketio.events('milestone_achieved')),
+        'progress_written': metrics['progress_written'],
+        'flushes': metrics['flushes'],
+        'avg_flush_ms': metrics['flush_ms']['avg'],
+    }
+    print(f"milestones: {results['observe_per_s']:,.0f} readings/s checked against {total:,} milestones "
+          f"({results['observe_us']:.1f} us each), {results['achieved']:,} achieved, "
+          f"avg flush {results['avg_flush_ms']:.1f} ms")
+    return results
+
+
+# --- inference ----------------------------------------------------------------
+
+def bench_inference(args):
+    import numpy as np
+    from services.inference import create_backend
+    from services.scoring import ScoringEngine
+
+    backend = create_backend(args.model_backend, args.model_path)
+    backend.warmup()
+    rng = np.random.default_rng(0)
+
+    batches = {}
+    for batch_size in args.batch_sizes:
+        batch = rng.random((batch_size, backend.seq_len, backend.n_features), dtype=np.float32) * 1000
+        backend.predict(batch)
+        samples = []
+        for _ in range(args.iterations):
+            t0 = time.perf_counter()
+            backend.predict(batch)
+            samples.append((time.perf_counter() - t0) * 1000)
+        p50 = percentile(samples, 50)
+        batches[str(batch_size)] = {
+            'p50_ms': p50,
+            'p99_ms': percentile(samples, 99),
+            'samples_per_s': batch_size / (p50 / 1000) if p50 else None,
+        }
+        print(f"inference[batch {batch_size}]: p50 {p50:.2f} ms, {batches[str(batch_size)]['samples_per_s'] or 0:,.0f} samples/s")
+
+    engine_results = {}
+    sequence = rng.random((backend.seq_len, backend.n_features), dtype=np.float32) * 1000
+    for concurrency in args.concurrency:
+        engine = ScoringEngine(backend.predict, max_batch_size=64, max_wait_ms=args.max_wait_ms).start()
+        per_thread = max(1, args.requests // concurrency)
+        latencies = []
+        lock = threading.Lock()
+
+        def worker():
+            local = []
+            for _ in range(per_thread):
+                t0 = time.perf_counter()
+                engine.score(sequence)
+                local.append((time.perf_counter() - t0) * 1000)
+            with lock:
+                latencies.extend(local)
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        engine.stop()
+        engine_results[str(concurrency)] = {
+            'requests_per_s': len(latencies) / elapsed,
+            'p50_ms': percentile(latencies, 50),
+            'p99_ms': percentile(latencies, 99),
+            'avg_batch': engine.batch_size.snapshot()['avg'],
+        }
+        print(f"scoring engine[{concurrency} callers]: {engine_results[str(concurrency)]['requests_per_s']:,.0f} req/s, "
+              f"p99 {engine_results[str(concurrency)]['p99_ms']:.1f} ms")
+
+    return {'backend': backend.name, 'batches': batches, 'scoring_engine': engine_results}
+
+
+# --- loans / score (Postgres) -------------------------------------------------
+
+def ensure_database(name):
+    import psycopg2
+
+    conn = psycopg2.connect(
+        host=os.getenv('POSTGRES_HOST', 'localhost'),
+        port=os.getenv('POSTGRES_PORT', 5432),
+        database='postgres',
+        user=os.getenv('POSTGRES_USER', 'postgres'),
+        password=os.getenv('POSTGRES_PASSWORD', '')
+    )
+    conn.autocommit = True
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM pg_database WHERE datname = %s", (name,))
+    if cursor.fetchone() is None:
+        cursor.execute(f'CREATE DATABASE "{name}"')
+        print(f"Created benchmark database {name}")
+    cursor.close()
+    conn.close()
+
+
+def load_app(args):
+    """Import app.py against the benchmark database, with fakes for everything else"""
+    from dotenv import load_dotenv
+
+    load_dotenv(os.path.join(ROOT, 'backend', '.env'))  # connection settings only; fakes are already set
+    ensure_database(args.postgres_db)
+    from config.database import DatabaseConfig
+    DatabaseConfig.init_postgres_tables()  # what migrate.py does
+    import app as backend_app
+
+    with DatabaseConfig.postgres_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("TRUNCATE loans, incentives, milestones, portfolio_rollups RESTART IDENTITY CASCADE")
+        conn.commit()
+        cursor.close()
+    return backend_app
+
+
+def seed_loans(start, stop, chunk_size=50000):
+    from models.loan import Loan
+
+    rng = random.Random(start)
+    for chunk_start in range(start, stop, chunk_size):
+        rows = [
+            (f'bench-{index}', f'Borrower {index}', round(rng.uniform(10000, 500000), 2),
+             PROJECT_TYPES[index % len(PROJECT_TYPES)], 'benchmark loan',
+             round(rng.uniform(0, 100), 2), round(rng.uniform(1000, 2000), 2), None)
+            for index in range(chunk_start, min(chunk_start + chunk_size, stop))
+        ]
+        Loan.bulk_import(rows)
+
+
+def analyze():
+    from config.database import DatabaseConfig
+
+    with DatabaseConfig.postgres_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("ANALYZE loans")
+        conn.commit()
+        cursor.close()
+
+
+def timed_get(client, url):
+    t0 = time.perf_counter()
+    response = client.get(url)
+    elapsed = (time.perf_counter() - t0) * 1000
+    if response.status_code != 200:
+        raise RuntimeError(f"GET {url} -> {response.status_code}: {response.get_data(as_text=True)[:200]}")
+    return elapsed, response
+
+
+def walk_pages(client, url, pages):
+    samples, cursor = [], None
+    for _ in range(pages):
+        elapsed, response = timed_get(client, url + (f'&cursor={quote(cursor)}' if cursor else ''))
+        samples.append(elapsed)
+        cursor = response.get_json()['next_cursor']
+        if not cursor:
+            break
+    return samples
+
+
+def bench_loans(args, backend_app):
+    client = backend_app.app.test_client()
+    results = {}
+    seeded = 0
+    for size in args.sizes:
+        started = time.perf_counter()
+        seed_loans(seeded, size)
+        analyze()
+        print(f"Seeded {size:,} loans ({time.perf_counter() - started:.1f}s)")
+        seeded = size
+
+        first_cold, _ = timed_get(client, f'/api/loans?limit={args.page_size}')
+        cached = [timed_get(client, f'/api/loans?limit={args.page_size}')[0] for _ in range(args.iterations)]
+        walk = walk_pages(client, f'/api/loans?limit={args.page_size}', args.pages)
+        filtered = walk_pages(client, f'/api/loans?limit={args.page_size}&project_type=solar&min_score=50', args.pages)
+
+        level = {
+            'first_page_cold_ms': first_cold,
+            'first_page_cached': latency_summary(cached),
+            'keyset_walk': latency_summary(walk),
+            'filtered_walk': latency_summary(filtered),
+        }
+        if size <= args.export_max:
+            t0 = time.perf_counter()
+            response = client.get('/api/loans?format=ndjson&fields=loan_id,eco_score')
+            rows = sum(1 for line in response.response if line.strip())
+            elapsed = time.perf_counter() - t0
+            level['export'] = {'rows': rows, 'rows_per_s': rows / elapsed}
+        results[str(size)] = level
+        print(f"loans[{size:,}]: walk p50 {level['keyset_walk']['p50_ms']:.1f} ms / p99 {level['keyset_walk']['p99_ms']:.1f} ms, "
+              f"filtered p50 {level['filtered_walk']['p50_ms'] or 0:.1f} ms")
+    return results
+
+
+def bench_score(args, backend_app):
+    loan_count = max(1, args.sizes[-1] if args.sizes else 1000)
+    rng = random.Random(1)
+
+    def run(requests, concurrency):
+        latencies, lock = [], threading.Lock()
+
+        def worker():
+            client = backend_app.app.test_client()
+            local = []
+            for _ in range(requests // concurrency):
+                loan_id = f'bench-{rng.randrange(loan_count)}'
+                t0 = time.perf_counter()
+                response = client.post(f'/api/loans/{loan_id}/score')
+                local.append((time.perf_counter() - t0) * 1000)
+                if response.status_code not in (200, 404):
+                    raise RuntimeError(f"score {loan_id} -> {response.status_code}")
+            with lock:
+                latencies.extend(local)
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        return {
+            'requests_per_s': len(latencies) / elapsed,
+            'p50_ms': percentile(latencies, 50),
+            'p99_ms': percentile(latencies, 99),
+        }
+
+    results = {str(concurrency): run(args.score_requests, concurrency) for concurrency in args.concurrency}
+    for concurrency, level in results.items():
+        print(f"score[{concurrency} clients]: {level['requests_per_s']:,.0f} req/s, "
+              f"p50 {level['p50_ms']:.1f} ms, p99 {level['p99_ms']:.1f} ms")
+    return results
+
+
+# --- results ------------------------------------------------------------------
+
+def flatten(tree, prefix=''):
+    flat = {}
+    for key, value in tree.items():
+        path = f'{prefix}{key}'
+        if isinstance(value, dict):
+            flat.update(flatten(value, path + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+
+def compare(results, baseline, tolerance):
+    """Metrics that got worse by more than `tolerance`; higher is better for
+    *_per_s, lower is better for *_ms"""
+    current, previous = flatten(results['benchmarks']), flatten(baseline['benchmarks'])
+    regressions = []
+    for key, value in sorted(current.items()):
+        before = previous.get(key)
+        if not before:
+            continue
+        change = value / before - 1
+        if key.endswith('_per_s') and change < -tolerance or key.endswith('_ms') and change > tolerance:
+            regressions.append({'metric': key, 'baseline': before, 'current': value, 'change': change})
+    return regressions
+
+
+def metadata():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--only', default='ingest,inference', help=f"comma-separated subset of {','.join(BENCHMARKS)}")
+    parser.add_argument('--output', help='write JSON results here')
+    parser.add_argument('--baseline', help='compare against a previous --output file')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='allowed relative regression')
+    parser.add_argument('--model-backend', default='fake', help='fake, keras, torchscript or onnx')
+    parser.add_argument('--model-path')
+    parser.add_argument('--model-latency-ms', type=float, default=2.0, help='fake model cost per call')
+    parser.add_argument('--model-per-sample-us', type=float, default=20.0, help='fake model cost per row')
+    parser.add_argument('--max-wait-ms', type=float, default=5.0, help='ScoringEngine batching window')
+    parser.add_argument('--messages', type=int, default=100000)
+    parser.add_argument('--loans', type=int, default=10000, help='loans in the fake store (ingest, milestones)')
+    parser.add_argument('--workers', type=int, default=16, help='ingestion workers')
+    parser.add_argument('--milestones-per-loan', type=int, default=3)
+    parser.add_argument('--milestone-flush-ms', type=float, default=500)
+    parser.add_argument('--drain-timeout', type=float, default=120.0)
+    parser.add_argument('--batch-sizes', default='1,8,32,128,512,1024')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=4000, help='scoring engine requests per level')
+    parser.add_argument('--concurrency', default='1,8,64')
+    parser.add_argument('--postgres-db', default='ecoscore_bench', help='throwaway database (TRUNCATED)')
+    parser.add_argument('--sizes', default='10000,100000,1000000', help='loan table sizes')
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--pages', type=int, default=200, help='pages per keyset walk')
+    parser.add_argument('--export-max', type=int, default=1000000, help='largest table to time NDJSON export on')
+    parser.add_argument('--score-requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    selected = [name.strip() for name in args.only.split(',') if name.strip()]
+    unknown = [name for name in selected if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+    args.batch_sizes = [int(size) for size in args.batch_sizes.split(',')]
+    args.concurrency = [int(level) for level in args.concurrency.split(',')]
+    args.sizes = sorted(int(size) for size in args.sizes.split(','))
+    configure_environment(args)
+
+    results = {'meta': metadata(), 'config': vars(args), 'benchmarks': {}}
+    if 'ingest' in selected:
+        results['benchmarks']['ingest'] = bench_ingest(args)
+    if 'inference' in selected:
+        results['benchmarks']['inference'] = bench_inference(args)
+    if 'milestones' in selected:
+        results['benchmarks']['milestones'] = bench_milestones(args)
+    if 'loans' in selected or 'score' in selected:
+        backend_app = load_app(args)
+        if 'loans' in selected:
+            results['benchmarks']['loans'] = bench_loans(args, backend_app)
+        else:
+            seed_loans(0, args.sizes[-1])
+        if 'score' in selected:
+            results['benchmarks']['score'] = bench_score(args, backend_app)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} metrics regressed by more than {args.tolerance:.0%}:")
+            for item in regressions:
+                print(f"  {item['metric']}: {item['baseline']:.3f} -> {item['current']:.3f} ({item['change']:+.1%})")
+            sys.exit(1)
+        print(f"\n✅ No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Import-time budget for backend/app.py.
+
+Imports app.py in fresh interpreters (the module-level create_app() included)
+and fails when the median exceeds --budget-ms or when a heavy dependency is
+imported eagerly. By default background services are not started
+(BACKEND_AUTOSTART=0); --autostart measures import + runtime.start(), which
+must also return without waiting on MQTT, Mongo or the model.
+
+Usage:
+    python benchmarks/startup.py                          # 5 runs, 1500 ms budget
+    python benchmarks/startup.py --runs 10 --budget-ms 800 --top 15 --output startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND = os.path.join(ROOT, 'backend')
+
+# Must only be imported on first use, never by importing the app
+LAZY_MODULES = ['tensorflow', 'keras', 'torch', 'onnxruntime', 'hedera', 'pymongo', 'paho']
+
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import app
+elapsed_ms = (time.perf_counter() - started) * 1000
+lazy = %r
+print(json.dumps({'import_ms': elapsed_ms, 'eager': [m for m in lazy if m in sys.modules]}))
+"""
+
+
+def parse_importtime(stderr):
+    """{module: cumulative_us} from `python -X importtime` output"""
+    cumulative = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = [part.strip() for part in line[len('import time:'):].split('|')]
+        if len(fields) != 3 or not fields[1].isdigit():
+            continue  # header
+        cumulative[fields[2]] = max(cumulative.get(fields[2], 0), int(fields[1]))
+    return cumulative
+
+
+def run_once(args):
+    env = dict(os.environ)
+    env.update({
+        'BACKEND_AUTOSTART': '1' if args.autostart else '0',
+        'MQTT_FAKE': env.get('MQTT_FAKE', '1'),
+        'HEDERA_FAKE': env.get('HEDERA_FAKE', '1'),
+        'IOT_STORE_ENABLED': env.get('IOT_STORE_ENABLED', '0'),
+    })
+    if args.mqtt_paho:
+        env['MQTT_FAKE'] = '0'
+    lazy = [module for module in LAZY_MODULES if not (module == 'paho' and args.mqtt_paho)]
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CHILD % (lazy,)],
+        cwd=BACKEND, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"importing app.py failed:\n{result.stderr[-4000:]}")
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    report['modules'] = parse_importtime(result.stderr)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=1500.0, help='maximum median import time')
+    parser.add_argument('--autostart', action='store_true', help='also start background services')
+    parser.add_argument('--mqtt-paho', action='store_true', help='use the real paho client instead of MQTT_FAKE')
+    parser.add_argument('--top', type=int, default=10, help='slowest top-level imports to list')
+    parser.add_argument('--output', help='write JSON results here')
+    args = parser.parse_args()
+
+    runs = [run_once(args) for _ in range(args.runs)]
+    import_ms = [run['import_ms'] for run in runs]
+    median_ms = statistics.median(import_ms)
+    eager = sorted({module for run in runs for module in run['eager']})
+
+    # Cumulative time of top-level packages, from the last (warm page cache) run
+    top_level = {}
+    for name, cumulative_us in runs[-1]['modules'].items():
+        root = name.split('.')[0]
+        top_level[root] = max(top_level.get(root, 0), cumulative_us)
+    slowest = sorted(top_level.items(), key=lambda item: -item[1])[:args.top]
+
+    results = {
+        'runs': args.runs,
+        'autostart': args.autostart,
+        'import_ms': {'median': median_ms, 'min': min(import_ms), 'max': max(import_ms)},
+        'budget_ms': args.budget_ms,
+        'eager_heavy_imports': eager,
+        'slowest_imports_ms': {name: us / 1000 for name, us in slowest},
+    }
+    print(f"import app: median {median_ms:.0f} ms (min {min(import_ms):.0f}, max {max(import_ms):.0f}) "
+          f"over {args.runs} runs, budget {args.budget_ms:.0f} ms")
+    for name, us in slowest:
+        print(f"  {name:<24} {us / 1000:8.1f} ms")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {args.output}")
+
+    failed = False
+    if eager:
+        print(f"❌ Imported eagerly (must be lazy): {', '.join(eager)}")
+        failed = True
+    if median_ms > args.budget_ms:
+        print(f"❌ Import time {median_ms:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print("✅ Within budget")
+
+
+if __name__ == '__main__':
+    main()
@@ -6,12 +6,24 @@ contract EcoLoanCertifier {
     event LoanCertified(uint indexed loanId, uint ecoScore, address borrower);
 
     function certifyLoan(uint loanId, uint ecoScore, address borrower) public {
-        require(ecoScore > 80, "EcoScore must be above 80 to certify");
-        loanEcoScores[loanId] = ecoScore;
-        emit LoanCertified(loanId, ecoScore, borrower);
+        _certify(loanId, ecoScore, borrower);
+    }
+
+    // Certifies every loan or none: one failing score reverts the whole batch
+    function certifyLoans(uint[] calldata loanIds, uint[] calldata ecoScores, address[] calldata borrowers) external {
+        require(loanIds.length == ecoScores.length && loanIds.length == borrowers.length, "Array lengths differ");
+        for (uint i = 0; i < loanIds.length; i++) {
+            _certify(loanIds[i], ecoScores[i], borrowers[i]);
+        }
     }
 
     function getEcoScore(uint loanId) public view returns (uint) {
         return loanEcoScores[loanId];
     }
+
+    function _certify(uint loanId, uint ecoScore, address borrower) internal {
+        require(ecoScore > 80, "EcoScore must be above 80 to certify");
+        loanEcoScores[loanId] = ecoScore;
+        emit LoanCertified(loanId, ecoScore, borrower);
+    }
 }
@@ -1,12 +1,15 @@
 import React, { useEffect } from 'react';
 import io from 'socket.io-client';
 
-const RealTimeUpdates = () => {
+// loanId: follow one loan; otherwise follow a portfolio ('all' by default)
+const RealTimeUpdates = ({ loanId, portfolio = 'all' }) => {
   useEffect(() => {
     const socket = io('http://localhost:5000');
+    const subscription = loanId ? { loan_id: loanId } : { portfolio };
+    socket.on('connect', () => socket.emit('subscribe', subscription));
     socket.on('loan_certified', data => alert(`Loan ${data.loan_id} certified! Tx: ${data.tx_id}`));
     return () => socket.disconnect();
-  }, []);
+  }, [loanId, portfolio]);
 
   return <div>Listening for real-time updates...</div>;
 };